@@ -1,34 +1,56 @@
-from fastapi import FastAPI, HTTPException, Depends, Form, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, Response, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import select, delete
+from sqlalchemy.orm import joinedload
 
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
 import uuid
 import os
 import jwt
 
 # Import modules
-from Back.core.models import User, Shot, Comment, Like
-from Back.core.database import create_db_and_tables, get_db
-from Back.core.storage import save_file
+from Back.core.models import User, Shot
+from Back.core.database import create_db_and_tables, get_db, get_read_db, stick_to_primary
+from Back.core.storage import UploadsStaticFiles
 from Back.core.redis_client import get_redis
-from Back.services.rate_limiter import check_user_cooldown
-from Back.services.handle import check_daily_limit
-from Back.services.auth import hash_password, verify_password, create_access_token, SECRET_KEY, ALGORITHM, is_token_blacklisted, add_token_to_blacklist
+from Back.core.schemas import FastJSONResponse, CommentCreate, UserRegister, UserLogin, CommentOut, ShotOut, TokenOut
+from Back.core.broadcast import start_listener, stop_listener
+from Back.core.jobs import start_consumer, stop_consumer
+from Back.core.metrics import MetricsMiddleware, render_metrics, worker_exit
+from Back.core.profiler import ProfilerMiddleware
+from Back.services.rate_limiter import check_rate_limit
+from Back.services.quota import daily_quota
+from Back.services.pagination import paginate, next_cursor
+from Back.services.interactions import add_like, add_comment, shot_exists
+from Back.services.comments import latest_comments, comments_page
+from Back.services.feed_cache import get_feed_page, bump_feed_version, feed_version, feed_validators, is_not_modified, replica_may_lag
+from Back.services.images import shutdown_image_pool, InvalidImage, AVATAR_WIDTHS
+from Back.services.stored_images import store_image, release_image, delete_later, discard_on_failure
+from Back.services.intake import read_form, form_openapi, AVATAR_MAX_BYTES
+from Back.services.live_feed import publish_event, event_stream
+from Back.services.principal_cache import get_cached_principal, cache_principal, invalidate_principal
+from Back.services.auth import hash_password_async, verify_password_async, create_access_token, SECRET_KEY, ALGORITHM, is_token_blacklisted, add_token_to_blacklist
+from Back.services.revocation import start_refresher, stop_refresher
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_tables()
+    start_listener() # pub/sub between workers (cache invalidation)
+    start_consumer() # job queue, unless JOB_WORKER_IN_APP=0 (worker.py only)
+    start_refresher() # revoked tokens filter, rebuilt once its jtis expired
     yield
+    await stop_refresher()
+    await stop_consumer()
+    await stop_listener()
+    shutdown_image_pool()
+    worker_exit()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 origins = [
   "http://localhost:5173",                  # for local testing
@@ -41,10 +63,24 @@ app.add_middleware(
   allow_credentials=True,
   allow_methods=["*"],
   allow_headers=["*"],
+  expose_headers=["X-Next-Cursor", "ETag"], # so the frontend can read the cursor and the feed validator
 )
 
+# Queries per request (debug headers, slow request and N+1 logs)
+app.add_middleware(ProfilerMiddleware)
+
+# Outermost: times everything, including CORS and errors
+app.add_middleware(MetricsMiddleware)
+
 os.makedirs("Back/uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="Back/uploads"), name="uploads")
+app.mount("/uploads", UploadsStaticFiles(directory="Back/uploads"), name="uploads") # hashed names are sent as immutable
+
+""" Prometheus scrape endpoint """
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+  body, content_type = render_metrics()
+  return Response(content=body, media_type=content_type)
+
 
 """ HELPER FUNCTION TO GET THE CURRENT USER"""
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -61,58 +97,57 @@ async def get_current_user(
     headers={"WWW-Authenticate": "Bearer"},
   )
 
-  # 1- Check Blacklist
-  # If the token is in the trash, reject it immediately.
-  if await is_token_blacklisted(token, redis):
-    raise HTTPException(status_code=401, detail="Token is invalid (Logged out)")
-
   try:
-    # 2- Decode the Token
+    # 1- Decode the Token
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     username: str = payload.get("sub")
+    user_id = uuid.UUID(payload["uid"]) if payload.get("uid") else None # older tokens don't have it
 
     if username is None:
       raise credentials_exception
 
-  except jwt.PyJWTError:
+  except (jwt.PyJWTError, ValueError):
     raise credentials_exception
 
-  # 3- Find User in DB
-  result = await db.execute(select(User).where(User.username == username))
-  user = result.scalars().first()
+  # 2- Check Blacklist
+  # If the token is in the trash, reject it (the local filter skips Redis for most tokens)
+  if await is_token_blacklisted(payload, token, redis):
+    raise HTTPException(status_code=401, detail="Token is invalid (Logged out)")
+
+  # 3- Find User
+  # 3.1- In this worker's cache (no database round trip)
+  if user_id:
+    cached_user = get_cached_principal(user_id)
+    if cached_user:
+      return await db.merge(cached_user, load=False)
+
+  # 3.2- In DB (by primary key when the token has the id)
+  if user_id:
+    user = await db.get(User, user_id)
+  else:
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
 
   if user is None:
     raise credentials_exception
 
+  cache_principal(user)
   return user
 
-""" Base Models """
-class CommentCreate(BaseModel):
-  content: str
-
-class UserRegister(BaseModel):
-  username: str
-  password: str
-
-class UserLogin(BaseModel):
-  username: str
-  password: str
-
-
 """ CREATE POST (SHOT) """
-@app.post("/post")
+@app.post("/post", openapi_extra=form_openapi("image", "caption"))
 async def create_post(
-  caption: str = Form(...),
-  image: UploadFile | None = File(default=None),
+  request: Request, # form read by the route: caption + optional image, streamed (see intake)
   user: User = Depends(get_current_user),
   db: AsyncSession = Depends(get_db),
   redis = Depends(get_redis)
 ):
 
   """
-  1- Get caption, image and current user (in the arguments)
-  2- Check if the user already posted for the day
-  3- Process image if it exists
+  1- Current user (in the arguments), the body isn't read yet
+  2- Check if the user already posted for the day (Redis quota, users column as fallback)
+  3- Read the form: size limit, real image format and hash while it arrives
+  3.1- Store image if it exists (named after its hash, same bytes -> same file, stored once)
   4- Create the shot
   5- Update user's last_post
   6- Save to database
@@ -121,122 +156,219 @@ async def create_post(
 
   # 2- Check Limits
   # 2.1- With redis
-  await check_user_cooldown(user.id, redis)
+  await check_rate_limit("post", user.id, redis)
+
+  # 2.2- Daily quota (atomic in Redis), given back if anything below fails (so are the uploaded files)
+  async with daily_quota(user, "post", redis), discard_on_failure(redis) as uploaded:
+
+    # 3- Read the form (413 past the size limit, 400 if the bytes aren't JPEG/PNG/WebP)
+    fields, image = await read_form(request, "image")
+
+    caption = fields.get("caption")
+    if caption is None:
+      raise HTTPException(status_code=422, detail="caption is required")
+
+    # 3.1- Store the image (if it exists): processed and uploaded only the first time these bytes are seen
+    image_url = None
+    image_variants = None
+    image_placeholder = None
+    if image:
+      try:
+        image_url, image_variants, image_placeholder = await store_image(db, image, uploaded=uploaded)
+      except InvalidImage:
+        raise HTTPException(status_code=400, detail="The file is not a valid image.")
+
+
+    # 4- Create the shot
+    new_shot = Shot(
+      caption=caption,
+      user_id=user.id,
+      image_url = image_url,
+      image_variants = image_variants,
+      image_placeholder = image_placeholder
+    )
+    db.add(new_shot)
+
+    # 5- Update user's last_post
+    user.last_post_at = datetime.now(timezone.utc).replace(tzinfo=None)
 
-  # 2.2- With database
-  can_post = check_daily_limit(user.last_post_at)
-  if not can_post:
-    raise HTTPException(status_code=429, detail="You have already made your post for the day.")
+    # 6- Save to db
+    await db.commit()
+    await db.refresh(new_shot)
+  await bump_feed_version(redis) # new shot -> cached feed pages are stale
+  await stick_to_primary(user.username, redis) # their next reads see the write (replica lag)
+  await invalidate_principal(user.id, redis) # last_post_at changed
+  await publish_event(redis, "shot_created", new_shot_out(new_shot, user).model_dump(mode="json")) # live feed
 
-  # 3- Process image (if it exists)
+  # 6- Return shot's JSON
+  return {
+    "status": "Post successful!",
+    "shot_id": str(new_shot.id),
+    "content": new_shot.caption,
+    "image_url": new_shot.image_url,
+    "image_variants": new_shot.image_variants,
+    "owner": user.username
+  }
 
-  image_url = None
-  if image:
 
-    # ============== Security check ============
-    ALLOWED_TYPES = ["image/jpeg", "image/png", "image/webp", "image/jpg"]
+""" Response helpers """
+def comment_out(c) -> CommentOut:
+  return CommentOut(id=c.id, owner=c.owner.username, content=c.content, created_at=c.created_at)
 
-    if image.content_type not in ALLOWED_TYPES:
-      raise HTTPException(
-        status_code=400,
-        detail="Invalid file type. Only JPEG, PNG, and WEBP images are allowed."
-      )
+def shot_out(shot: Shot, comments: list) -> ShotOut:
+  return ShotOut(
+    id=shot.id,
+    caption=shot.caption,
+    created_at=shot.created_at,
 
-    # ============== Saving image ==============
-    # File name will be: user_timestamp to prevent overwrite
-    file_extension = image.filename.split(".")[-1]
-    unique_name = f"{user.id}+{datetime.now().timestamp()}.{file_extension}"
+    owner=shot.owner.username,
+    owner_id=shot.owner.id,
+    owner_avatar=shot.owner.avatar_url,
+    owner_avatar_variants=shot.owner.avatar_variants,
 
-    image_url = save_file(image, unique_name) # Decide weather to save into Cloud or local
+    like_count=shot.like_count, # denormalized, no Like rows loaded
+    comment_count=shot.comment_count,
 
+    comments=[comment_out(c) for c in comments],
 
-  # 4- Create the shot
-  new_shot = Shot(
-    caption=caption,
-    user_id=user.id,
-    image_url = image_url
+    image_url=shot.image_url,
+    image_variants=shot.image_variants,
+    image_placeholder=shot.image_placeholder,
   )
-  db.add(new_shot)
 
-  # 5- Update user's last_post
-  user.last_post_at = datetime.now(timezone.utc).replace(tzinfo=None)
+def new_shot_out(shot: Shot, owner: User) -> ShotOut:
+  """A shot that was just created: no likes or comments, owner already loaded"""
+  return ShotOut(
+    id=shot.id,
+    caption=shot.caption,
+    created_at=shot.created_at,
+
+    owner=owner.username,
+    owner_id=owner.id,
+    owner_avatar=owner.avatar_url,
+    owner_avatar_variants=owner.avatar_variants,
+
+    like_count=0,
+    comment_count=0,
+    comments=[],
+
+    image_url=shot.image_url,
+    image_variants=shot.image_variants,
+    image_placeholder=shot.image_placeholder,
+  )
 
-  # 6- Save to db
-  await db.commit()
-  await db.refresh(new_shot)
 
-  # 6- Return shot's JSON
-  return {
-    "status": "Post successful!",
-    "shot_id": str(new_shot.id),
-    "content": new_shot.caption,
-    "image_url": new_shot.image_url,
-    "owner": user.username
-  }
+"""Live feed: new shots, likes, comments and deletions as Server-Sent Events"""
+@app.get("/shots/stream")
+async def shots_stream(
+  last_event_id: str | None = Header(None), # sent by EventSource when it reconnects
+  redis = Depends(get_redis)
+):
+  """
+  1- Missed events replayed from Last-Event-ID (or a "reset" event: refetch /shots)
+  2- Then every feed change as it happens, heartbeat comments when idle
+  """
+  return StreamingResponse(
+    event_stream(redis, last_event_id),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # no proxy buffering (nginx)
+  )
 
 
 """Home page for all the shots for everyone"""
-@app.get("/shots")
+@app.get("/shots", response_model=list[ShotOut])
 async def shots(
-  page: int = 1, # default one page
-  limit: int = 10, # 10 items per page
-  db: AsyncSession = Depends(get_db)):
+  cursor: str | None = None, # opaque cursor from the X-Next-Cursor header
+  page: int = Query(1, ge=1), # default one page (used only when there is no cursor)
+  limit: int = Query(10, ge=1, le=100), # 10 items per page
+  if_none_match: str | None = Header(None),
+  db: AsyncSession = Depends(get_read_db),
+  redis = Depends(get_redis)):
 
   """
-  1-Grab 10 shots from the database by the created_at
-  2-link Shot with User db to avoid N+1 problem
+  0-Nothing changed since the client's copy (same feed version) -> 304, no query
+  1-Grab 10 shots from the database by the created_at (after the cursor if given)
+  2-link Shot with User db to avoid N+1 problem + latest comments only (rest in /shot/{id}/comments)
   3-Load shots data in as a JSON in an array
+  4-Send the next page cursor in the X-Next-Cursor header
+  The whole page is cached in Redis until the next write (see feed_cache)
   """
 
-  # 1- Calculate how many items to skip
-  # page 1 -> skip 0 || page 2 -> skip 10 || page 3 -> skip 20 || etc...
-  offset = (page - 1) * limit
+  # 0- Conditional GET (skipped if Redis is down)
+  version = await feed_version(redis)
+  validators = feed_validators(version) if version is not None else {}
 
+  if validators and is_not_modified(if_none_match, validators["ETag"]):
+    return Response(status_code=304, headers=validators)
 
-  # 2-Grab 10 shots
-  # 3-Join User db to the shots
-  query = (
-        select(Shot)
-        .options(
-    joinedload(Shot.owner), # Load Shot owner
-            joinedload(Shot.likes), # Load Likes
-            selectinload(Shot.comments).joinedload(Comment.owner)) # Load Comments AND the User who wrote each comment
-        .order_by(Shot.created_at.desc())
-        .offset(offset)
-        .limit(limit)
+  async def build_page():
+    # 1-Grab 10 shots
+    # 2-Join User db to the shots
+    query = (
+      select(Shot)
+      .options(joinedload(Shot.owner)) # Load Shot owner
     )
+    query = paginate(query, Shot, cursor, page, limit)
 
-  result = await db.execute(query)
-  shots_list = result.scalars().unique().all()
+    result = await db.execute(query)
+    shots_list = result.scalars().unique().all()
+
+    # 2.1- Only the latest comments of each shot (+ the User who wrote each comment), one query
+    previews = await latest_comments(db, [shot.id for shot in shots_list])
+
+    # 3- Typed items, turned into JSON once by the response (or the cache)
+    shots_data = [shot_out(shot, previews.get(shot.id, [])) for shot in shots_list]
+
+    return {"items": shots_data, "next_cursor": next_cursor(shots_list, limit)}
+
+  # Read from a replica right after a write: it may not have it yet -> not cached, no ETag
+  store = not (db.info.get("replica") and version is not None and replica_may_lag(version))
+  if not store:
+    validators = {}
 
-  # Load shots data as a JSON in an array
-  shots_data = []
+  feed_page = await get_feed_page(redis, cursor, page, limit, build_page, version, store)
 
-  for shot in shots_list:
-    shots_data.append({
-      "id": str(shot.id),
-      "caption": shot.caption,
-      "created_at": shot.created_at.isoformat(),
+  # 4- Next page cursor
+  headers = dict(validators)
+  if feed_page["next_cursor"]:
+    headers["X-Next-Cursor"] = feed_page["next_cursor"]
 
-      "owner": shot.owner.username,
-      "owner_id": str(shot.owner.id), # For frontend part to check if the user owns the shot
+  return FastJSONResponse(feed_page["items"], headers=headers)
 
-      "like_count": len(shot.likes),
 
-      # Array of comments
-      "comments": [
-        {
-          "id": str(c.id),
-          "owner": c.owner.username, # Uses the new relationship
-          "content": c.content
-        }
-        for c in shot.comments
-      ],
+""" All the comments of a shot """
+@app.get("/shot/{shot_id}/comments", response_model=list[CommentOut])
+async def get_shot_comments(
+  shot_id: str,
+  cursor: str | None = None, # opaque cursor from the X-Next-Cursor header
+  limit: int = Query(20, ge=1, le=100),
+  db: AsyncSession = Depends(get_read_db)
+):
+  """
+  1- Check the shot ID
+  2- Grab a page of comments, newest first (after the cursor if given)
+  3- Empty first page -> 404 if the shot doesn't exist
+  4- Send the next page cursor in the X-Next-Cursor header
+  """
+
+  # 1- Check the shot ID
+  try:
+    shot_uuid = uuid.UUID(shot_id)
+  except ValueError:
+    raise HTTPException(status_code=400, detail="Invalid Shot ID format")
+
+  # 2- Page of comments
+  comments = await comments_page(db, shot_uuid, cursor, limit)
+
+  # 3- Only checked when there is nothing to show
+  if not comments and not cursor and not await shot_exists(db, shot_uuid):
+    raise HTTPException(status_code=404, detail="Shot not found")
 
-      "image_url": shot.image_url
-    })
+  # 4- Next page cursor
+  cursor_value = next_cursor(comments, limit)
+  headers = {"X-Next-Cursor": cursor_value} if cursor_value else None
 
-  return shots_data
+  return FastJSONResponse([comment_out(c) for c in comments], headers=headers)
 
 
 @app.post("/shot/{shot_id}/like")
@@ -249,60 +381,44 @@ async def like_shot(
 
   """
   1- Check limits (if user already liked today)
-  2- Check if Shot exists
-  3- Check if shot is already liked by the current user
-  4- Update "Like" db
-  5- Update last_like_at for the user
-  6- Return status and number of likes left for the user
+  2- Like the shot: one INSERT that also checks the shot exists and isn't liked yet
+     + counts it on the shot and updates last_like_at for the user
+  3- Nothing written -> find out why (404 or 400)
+  4- Return status and number of likes left for the user
   """
 
   # 1- Check limits
   # 1.1- With redis
-  await check_user_cooldown(user.id, redis)
+  await check_rate_limit("like", user.id, redis)
 
-  # 1.2- With database
-  can_like = check_daily_limit(user.last_like_at)
-  if not can_like:
-    raise HTTPException(status_code=429, detail="You already used your One Like for today.")
-
-  # 1.5- Check if the provided shot ID is valid
+  # 1.2- Check if the provided shot ID is valid
   try:
     shot_uuid = uuid.UUID(shot_id) # convert from str to uuid
   except ValueError:
     raise HTTPException(status_code=400, detail="Invalid Shot ID format")
 
-  # 2- Check if shot exists
-  result = await db.execute(select(Shot).where(Shot.id == shot_uuid))
-  target_shot = result.scalars().first()
-
-  if not target_shot:
-    raise HTTPException(status_code=404, detail="This Shot doesn't even exist...")
+  # 1.3- Daily quota (atomic in Redis), given back if anything below fails
+  async with daily_quota(user, "like", redis):
 
-  # 3- Check if already liked
-  # We look for a Like entry that matches BOTH this user AND this shot
-  result = await db.execute(
-    select(Like).where(
-      Like.user_id == user.id,
-      Like.shot_id == target_shot.id
-    )
-  )
-  existing_like = result.scalars().first()
+    # 2- Like (duplicates are prevented by the unique (user_id, shot_id) index)
+    liked = await add_like(db, user, shot_uuid)
 
-  if existing_like:
-    # Raise an error (Prevent duplicates)
-    raise HTTPException(status_code=400, detail="You already liked this shot! Are you trying to support it that much?")
+    # 3- Only on failure: one more query to pick the error
+    if not liked:
+      if not await shot_exists(db, shot_uuid):
+        raise HTTPException(status_code=404, detail="This Shot doesn't even exist...")
 
-  """ TO DO: ADD OPTION TO UNLIKE """
+      raise HTTPException(status_code=400, detail="You already liked this shot! Are you trying to support it that much?")
 
-  # 4- Create like + add like to db and updated last act
-  new_like = Like(user_id= user.id, shot_id = target_shot.id)
-  db.add(new_like)
+    """ TO DO: ADD OPTION TO UNLIKE """
 
-  user.last_like_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    await db.commit()
+  await bump_feed_version(redis)
+  await stick_to_primary(user.username, redis)
+  await invalidate_principal(user.id, redis)
+  await publish_event(redis, "shot_liked", {"shot_id": str(shot_uuid)})
 
-  await db.commit()
-
-  return {"status": f"Liked! the post with the id {target_shot.id}",
+  return {"status": f"Liked! the post with the id {shot_uuid}",
           "remaining likes for the user": 0}
 
 
@@ -317,51 +433,40 @@ async def post_comment(
 
   """
   1- Check limits
-  2- Check if shot exists
-  3- Update "Comment" db
-  4- Update last_comment_at for the user
-  5- Return status and content of the comment and the shot that was commented on
+  2- Comment: one INSERT that also checks the shot exists
+     + counts it on the shot and updates last_comment_at for the user
+  3- Return status and content of the comment and the shot that was commented on
   """
 
   # 1- Check limits
   # 1.1- With redis
-  await check_user_cooldown(user.id, redis)
-
-  # 1.2- With database
-  can_comment = check_daily_limit(user.last_comment_at)
-  if not can_comment:
-    raise HTTPException(status_code=429, detail="You already used your One Comment for today.")
+  await check_rate_limit("comment", user.id, redis)
 
-  # 1.5- Check if the provided shot ID is valid
+  # 1.2- Check if the provided shot ID is valid
   try:
     shot_uuid = uuid.UUID(shot_id) # convert from str to uuid
   except ValueError:
     raise HTTPException(status_code=400, detail="Invalid Shot ID")
 
-  # 2- Check if shot exists
-  result = await db.execute(select(Shot).where(Shot.id == shot_uuid))
-  target_shot = result.scalars().first()
+  # 1.3- Daily quota (atomic in Redis), given back if anything below fails
+  async with daily_quota(user, "comment", redis):
 
-  if not target_shot:
-    raise HTTPException(status_code=404, detail="Shot not found")
-
-  # 3- Create comment + add comment to db and updated last act
-  new_comment = Comment(
-    content=comment.content,
-    user_id=user.id,
-    shot_id=target_shot.id
-  )
-  db.add(new_comment)
+    # 2- Comment (nothing inserted = no such shot)
+    if not await add_comment(db, user, shot_uuid, comment.content):
+      raise HTTPException(status_code=404, detail="Shot not found")
 
-  user.last_comment_at = datetime.now(timezone.utc).replace(tzinfo=None)
-  await db.commit()
+    await db.commit()
+  await bump_feed_version(redis)
+  await stick_to_primary(user.username, redis)
+  await invalidate_principal(user.id, redis)
+  await publish_event(redis, "comment_added", {"shot_id": str(shot_uuid), "owner": user.username, "content": comment.content})
 
   return {"status": "Commented!",
           "content": comment.content,
           "shot_id with the comment": shot_uuid}
 
 
-@app.post("/auth/register")
+@app.post("/auth/register", response_model=TokenOut)
 async def register(
   user_data: UserRegister,
   db: AsyncSession = Depends(get_db)
@@ -380,8 +485,8 @@ async def register(
   if existing_user:
     raise HTTPException(status_code=400, detail="Username already taken.")
 
-  # 2- Hash password
-  hashed_pwd = hash_password(user_data.password)
+  # 2- Hash password (in the hashing pool, not on the event loop)
+  hashed_pwd = await hash_password_async(user_data.password)
 
   # 3- Create the user
   new_user = User(
@@ -395,14 +500,14 @@ async def register(
 
 
   # 4- Generate the JWT
-  access_token = create_access_token(data={"sub": new_user.username})
+  access_token = create_access_token(data={"sub": new_user.username, "uid": str(new_user.id)})
 
-  return {"access_token": access_token, "token_type": "bearer", "username": new_user.username}
+  return TokenOut(access_token=access_token, token_type="bearer", username=new_user.username)
 
 
 
 
-@app.post("/auth/login")
+@app.post("/auth/login", response_model=TokenOut)
 async def login(
   form_data: OAuth2PasswordRequestForm = Depends(),
   db: AsyncSession = Depends(get_db)
@@ -411,7 +516,8 @@ async def login(
   """
   1- Find the user
   2- Check if User exists AND Password match
-  3- Create (JWT)
+  3- Upgrade the hash if the bcrypt cost changed
+  4- Create (JWT)
   """
 
   # 1- Find the user
@@ -419,19 +525,28 @@ async def login(
   user = result.scalars().first()
 
   # 2- Check credentials
-  if not user or not verify_password(form_data.password, user.hashed_password):
+  is_valid, new_hash = False, None
+  if user:
+    is_valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+
+  if not is_valid:
     raise HTTPException(
       status_code=401,
       detail=["Incorrect username or password"],
       headers={"WWW-Authenticate": "Bearer"}
     )
 
-  # 3- Create JWT
-  access_token = create_access_token(data={"sub": user.username})
+  # 3- Rehash with the current cost
+  if new_hash:
+    user.hashed_password = new_hash
+    await db.commit()
+
+  # 4- Create JWT
+  access_token = create_access_token(data={"sub": user.username, "uid": str(user.id)})
 
-  return {"access_token": access_token, "token_type": "bearer", "username": user.username}
+  return TokenOut(access_token=access_token, token_type="bearer", username=user.username)
 
-@app.post("auth/logout")
+@app.post("/auth/logout")
 async def logout(
   token: str = Depends(oauth2_scheme),
   redis = Depends(get_redis)
@@ -443,10 +558,8 @@ async def logout(
   try:
     # 1- Decode just to find out when this token was supposed to expire
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    expiration = payload.get("exp")
-
-    # 2- Blacklist the token
-    await add_token_to_blacklist(token, expiration, redis)
+    # 2- Blacklist the token (by its jti)
+    await add_token_to_blacklist(payload, token, redis)
 
   except jwt.PyJWTError:
     pass
@@ -455,70 +568,62 @@ async def logout(
 
 
 """ Endpoint to fetch current user shots """
-@app.get("/myshots")
+@app.get("/myshots", response_model=list[ShotOut])
 async def get_my_shots(
-  page: int = 1, # default one page
-  limit: int = 10, # 10 items per page
+  cursor: str | None = None, # opaque cursor from the X-Next-Cursor header
+  page: int = Query(1, ge=1), # default one page (used only when there is no cursor)
+  limit: int = Query(10, ge=1, le=100), # 10 items per page
+  if_none_match: str | None = Header(None),
   user: User = Depends(get_current_user),
-  db: AsyncSession = Depends(get_db)
+  db: AsyncSession = Depends(get_read_db),
+  redis = Depends(get_redis)
 ):
   """
   Fetch ONLY the shots belonging to the currently logged in user.
-  10 shots per load
+  10 shots per load, next page cursor in the X-Next-Cursor header
+  Only the latest comments are embedded (rest in /shot/{id}/comments)
+  Same feed version as the client's copy -> 304, the ETag is per user
   """
-  offset = (page -1) * limit
+  version = await feed_version(redis)
+  validators = feed_validators(version, user.id) if version is not None else {}
+
+  if validators and is_not_modified(if_none_match, validators["ETag"]):
+    return Response(status_code=304, headers=validators)
 
   query = (
     select(Shot)
-    .options(
-      joinedload(Shot.owner),
-      joinedload(Shot.likes),
-      selectinload(Shot.comments).joinedload(Comment.owner)) # Load Comments AND the User who wrote each comment
+    .options(joinedload(Shot.owner))
     .where(Shot.user_id == user.id)
-    .order_by(Shot.created_at.desc())
-    .offset(offset)
-    .limit(limit)
   )
+  query = paginate(query, Shot, cursor, page, limit)
 
   result = await db.execute(query)
   user_shots_list = result.scalars().unique().all()
 
-  shots_data = []
-
-  for shot in user_shots_list:
-    shots_data.append({
-      "id": str(shot.id),
-      "caption": shot.caption,
-      "created_at": shot.created_at.isoformat(),
-
-      "owner": shot.owner.username,
-      "owner_id": str(shot.owner.id),
+  # Latest comments only (+ the User who wrote each comment), one query
+  previews = await latest_comments(db, [shot.id for shot in user_shots_list])
 
-      "owner_avatar": shot.owner.avatar_url,
+  shots_data = [shot_out(shot, previews.get(shot.id, [])) for shot in user_shots_list]
 
-      "like_count": len(shot.likes),
+  # Replica right after a write: no ETag, the next poll must read again
+  if db.info.get("replica") and version is not None and replica_may_lag(version):
+    validators = {}
 
-      # Array of comments
-      "comments": [
-        {
-          "id": str(c.id),
-          "owner": c.owner.username,
-          "content": c.content
-        }
-        for c in shot.comments
-      ],
+  cursor_value = next_cursor(user_shots_list, limit)
+  headers = dict(validators)
+  if cursor_value:
+    headers["X-Next-Cursor"] = cursor_value
 
-      "image_url": shot.image_url
-    })
-
-  return shots_data
+  return FastJSONResponse(shots_data, headers=headers)
 
 
 @app.delete("/shot/{shot_id}/delete")
 async def delete_shot(
   shot_id: str,
+  background_tasks: BackgroundTasks,
   user: User = Depends(get_current_user),
-  db: AsyncSession = Depends(get_db)
+  db: AsyncSession = Depends(get_db),
+  redis = Depends(get_redis)
 ):
 
   # 1- Convert string to UUID
@@ -527,51 +632,79 @@ async def delete_shot(
   except ValueError:
     raise HTTPException(status_code=400, detail="Invalid Shot ID format")
 
-  # 2- Find shot
-  result = await db.execute(select(Shot).where(Shot.id == shot_uuid))
-  shot_to_delete = result.scalars().first()
+  # 2- Delete the shot if it belongs to the user (likes/comments go with it: ON DELETE CASCADE)
+  result = await db.execute(
+    delete(Shot)
+    .where(Shot.id == shot_uuid, Shot.user_id == user.id)
+    .returning(Shot.image_url, Shot.image_variants)
+    .execution_options(synchronize_session=False)
+  )
+  deleted = result.first()
+
+  # 3- Nothing deleted -> find out why
+  if deleted is None:
+    owner_id = await db.scalar(select(Shot.user_id).where(Shot.id == shot_uuid))
 
-  # 3- Check if shot exists
-  if not shot_to_delete:
-    raise HTTPException(status_code=404, detail="Shot doesn't exist")
+    # 3.1- Check if shot exists
+    if owner_id is None:
+      raise HTTPException(status_code=404, detail="Shot doesn't exist")
 
-  # 4- Check if the shot belongs to the user
-  if shot_to_delete.user_id != user.id:
+    # 3.2- It belongs to someone else
     raise HTTPException(status_code=403, detail="Not authorized to delete this shot")
 
-  # 5- Delete the shot
-  await db.delete(shot_to_delete)
+  # 4- One reference less on the image, its files are removed after the response if nobody else uses them
+  image_url, image_variants = deleted
+  unused = await release_image(db, image_url, image_variants)
+
   await db.commit()
+  await bump_feed_version(redis)
+  await stick_to_primary(user.username, redis)
+  await publish_event(redis, "shot_deleted", {"shot_id": str(shot_uuid)})
+
+  await delete_later(unused, redis, background_tasks, db)
 
   return {"message": "Shot has been deleted successfully"}
 
 
-@app.post("/profile/avatar")
+@app.post("/profile/avatar", openapi_extra=form_openapi("pfp_image", file_required=True))
 async def upload_avatar(
-  pfp_image: UploadFile = File(...),
+  request: Request, # form read by the route: pfp_image, streamed (see intake)
+  background_tasks: BackgroundTasks,
   user: User = Depends(get_current_user),
-  db: AsyncSession = Depends(get_db)
+  db: AsyncSession = Depends(get_db),
+  redis = Depends(get_redis)
 ):
   """
   Upload a profile picture
-  1- Validate image
-  2- Save image in R2
-  3- Update user db with the avatar_url
+  1- Read and validate the image (size limit, real format)
+  2- Store it: WebP variants + upload, skipped if these bytes are already stored
+  3- Release the previous avatar (files removed after the response if nobody else uses them)
+  4- Update user db with the avatar_url
   """
 
-  # 1- Validate image
-  ALLOWED_TYPES = ["image/jpeg", "image/png", "image/webp", "image/jpg"]
-  if pfp_image.content_type not in ALLOWED_TYPES:
-    raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WEBP images are allowed.")
+  # 1- Read + validate
+  _, pfp_image = await read_form(request, "pfp_image", AVATAR_MAX_BYTES)
+  if pfp_image is None:
+    raise HTTPException(status_code=422, detail="pfp_image is required")
 
-  # 2- save image
-  file_extension = pfp_image.filename.split(".")[-1]
-  unique_name = f"avatar_{user.id}_{int(datetime.now().timestamp())}.{file_extension}"
+  # 2- Store (the uploaded files are deleted again if anything below fails)
+  async with discard_on_failure(redis) as uploaded:
+    try:
+      avatar_url, avatar_variants, _ = await store_image(db, pfp_image, AVATAR_WIDTHS, prefix="avatar_", uploaded=uploaded)
+    except InvalidImage:
+      raise HTTPException(status_code=400, detail="The file is not a valid image.")
 
-  avatar_url = save_file(pfp_image, unique_name)
+    # 3- Previous avatar
+    unused = await release_image(db, user.avatar_url, user.avatar_variants)
 
-  # 3- update user db
-  user.avatar_url = avatar_url
-  await db.commit()
+    # 4- update user db
+    user.avatar_url = avatar_url
+    user.avatar_variants = avatar_variants
+    await db.commit()
+  await bump_feed_version(redis) # /myshots shows the avatar
+  await stick_to_primary(user.username, redis)
+  await invalidate_principal(user.id, redis)
+
+  await delete_later(unused, redis, background_tasks, db)
 
-  return {"message": "Avatar updated", "avatar_url": avatar_url}
+  return {"message": "Avatar updated", "avatar_url": avatar_url, "avatar_variants": avatar_variants}
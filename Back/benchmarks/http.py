@@ -0,0 +1,344 @@
+"""
+HTTP latency / throughput of the main routes, through the ASGI app (no server, no network).
+
+  python -m Back.benchmarks.http                        -> run, save results, compare with the baseline
+  python -m Back.benchmarks.http --save-baseline        -> run and store the results as the new baseline
+  python -m Back.benchmarks.http --only shots,myshots   -> some scenarios only
+
+1- Seeds a SQLite file database: users, shots, likes and comments (BENCH_USERS / BENCH_SHOTS)
+2- Each scenario sends BENCH_REQUESTS requests, BENCH_CONCURRENCY at a time, after a few warmup requests
+3- Reports p50/p95/p99 latency and requests/sec, written as JSON (--output)
+4- Exits with 1 when a scenario is slower than the baseline by more than --tolerance
+
+Redis is fakeredis unless BENCH_REDIS_URL is set. Uploads stay in memory.
+Numbers depend on the machine: store the baseline on the machine that compares against it.
+Post (image processing) and login/register (bcrypt, AUTH_BCRYPT_ROUNDS) use fewer requests.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import fakeredis.aioredis
+import redis.asyncio as redis
+from fastapi import Depends
+from httpx import AsyncClient, ASGITransport
+from PIL import Image
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from Back.app import app
+from Back.core.database import get_db, get_read_db, engine_options, enable_sqlite_foreign_keys
+from Back.core.models import Base, User, Shot, Like, Comment
+from Back.core.redis_client import get_redis
+from Back.core.storage import MemoryStorage, set_storage
+from Back.services.auth import hash_password, create_access_token
+from Back.services.revocation import rebuild_filter, reset_filter
+from Back.services.principal_cache import clear_principal_cache
+
+# Config
+USERS = int(os.getenv("BENCH_USERS", "200"))
+SHOTS = int(os.getenv("BENCH_SHOTS", "1000"))
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "300"))
+POST_REQUESTS = int(os.getenv("BENCH_POST_REQUESTS", "60")) # image processing bound
+AUTH_REQUESTS = int(os.getenv("BENCH_AUTH_REQUESTS", "20")) # bcrypt bound
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "20"))
+WARMUP = int(os.getenv("BENCH_WARMUP", "5"))
+POST_IMAGE = os.getenv("BENCH_POST_IMAGE", "1") == "1"
+REDIS_URL = os.getenv("BENCH_REDIS_URL")
+
+BENCH_DIR = os.path.dirname(__file__)
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "http.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "http.json")
+
+PASSWORD = "benchmark-password"
+
+
+# ============== Seed ==============
+
+class Seed:
+  """What the scenarios need: tokens, shot ids and users that still have their daily actions"""
+
+  def __init__(self):
+    self.tokens: list[str] = []       # users that already acted today (feed readers)
+    self.shot_ids: list[uuid.UUID] = []
+    self.fresh: list[str] = []        # tokens of users that can post/like/comment once
+    self.login_names: list[str] = []
+
+
+async def seed(session_maker) -> Seed:
+  data = Seed()
+  rng = random.Random(42)
+  password_hash = hash_password(PASSWORD) # one hash for everyone, bcrypt is slow
+  now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+  async with session_maker() as db:
+    # 1- Readers (with shots) + fresh users for the write scenarios (one action per day each)
+    readers = [User(username=f"reader{i}", hashed_password=password_hash) for i in range(USERS)]
+    fresh = [User(username=f"fresh{i}", hashed_password=password_hash) for i in range(POST_REQUESTS + 2 * REQUESTS + 3 * WARMUP)]
+    db.add_all(readers + fresh)
+    await db.flush()
+
+    # 2- Shots over the last days, with likes and comments
+    for i in range(SHOTS):
+      owner = readers[i % USERS]
+      shot = Shot(
+        id=uuid.uuid4(),
+        caption=f"benchmark shot {i}",
+        user_id=owner.id,
+        created_at=now - timedelta(minutes=i * 7),
+        image_url=f"/memory/{i}.png",
+        image_variants={str(w): f"/memory/{i}_{w}.webp" for w in (320, 640, 1080)},
+      )
+      fans = rng.sample(readers, k=min(USERS, rng.randint(0, 30)))
+      commenters = fans[: rng.randint(0, 15)]
+      shot.like_count, shot.comment_count = len(fans), len(commenters)
+
+      db.add(shot)
+      db.add_all([Like(user_id=fan.id, shot_id=shot.id) for fan in fans])
+      db.add_all([
+        Comment(content=f"comment {j}", user_id=fan.id, shot_id=shot.id, created_at=shot.created_at + timedelta(minutes=j))
+        for j, fan in enumerate(commenters)
+      ])
+      data.shot_ids.append(shot.id)
+
+    await db.commit()
+
+  data.tokens = [create_access_token({"sub": u.username, "uid": str(u.id)}) for u in readers]
+  data.fresh = [create_access_token({"sub": u.username, "uid": str(u.id)}) for u in fresh]
+  data.login_names = [u.username for u in readers]
+  return data
+
+
+def make_png() -> bytes:
+  buffer = io.BytesIO()
+  Image.new("RGB", (1280, 960), "orange").save(buffer, format="PNG")
+  return buffer.getvalue()
+
+
+# ============== Scenarios ==============
+
+def scenarios(data: Seed) -> dict:
+  """name -> (number of requests, function(client, i) -> response)"""
+  fresh = iter(data.fresh)
+  image = make_png() if POST_IMAGE else None
+  bearer = lambda token: {"Authorization": f"Bearer {token}"}
+
+  async def shots(client, i):
+    return await client.get("/shots", params={"limit": 10, "page": 1 + i % 5})
+
+  async def myshots(client, i):
+    return await client.get("/myshots", headers=bearer(data.tokens[i % len(data.tokens)]))
+
+  async def post(client, i):
+    files = {"image": ("bench.png", image, "image/png")} if image else None
+    return await client.post("/post", data={"caption": f"bench post {i}"}, files=files, headers=bearer(next(fresh)))
+
+  async def like(client, i):
+    return await client.post(f"/shot/{data.shot_ids[i % len(data.shot_ids)]}/like", headers=bearer(next(fresh)))
+
+  async def comment(client, i):
+    shot_id = data.shot_ids[i % len(data.shot_ids)]
+    return await client.post(f"/shot/{shot_id}/comment", json={"content": "nice"}, headers=bearer(next(fresh)))
+
+  async def login(client, i):
+    username = data.login_names[i % len(data.login_names)]
+    return await client.post("/auth/login", data={"username": username, "password": PASSWORD})
+
+  async def register(client, i):
+    return await client.post("/auth/register", json={"username": f"new{uuid.uuid4().hex[:12]}", "password": PASSWORD})
+
+  return {
+    "shots": (REQUESTS, shots),
+    "myshots": (REQUESTS, myshots),
+    "post": (POST_REQUESTS, post),
+    "like": (REQUESTS, like),
+    "comment": (REQUESTS, comment),
+    "login": (AUTH_REQUESTS, login),
+    "register": (AUTH_REQUESTS, register),
+  }
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+  """Nearest rank percentile"""
+  if not sorted_values:
+    return 0.0
+  rank = max(1, round(p / 100 * len(sorted_values)))
+  return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, requests: int, send) -> dict:
+  """`requests` calls of send(), CONCURRENCY at a time"""
+
+  # 1- Warmup (image pool start, first queries...)
+  for i in range(WARMUP):
+    await send(client, requests + i)
+
+  latencies, errors = [], 0
+  semaphore = asyncio.Semaphore(CONCURRENCY)
+
+  async def one(i):
+    nonlocal errors
+    async with semaphore:
+      start = time.perf_counter()
+      response = await send(client, i)
+      latencies.append((time.perf_counter() - start) * 1000)
+      if response.status_code >= 400:
+        errors += 1
+
+  # 2- Measured run
+  start = time.perf_counter()
+  await asyncio.gather(*[one(i) for i in range(requests)])
+  elapsed = time.perf_counter() - start
+
+  latencies.sort()
+  return {
+    "requests": requests,
+    "errors": errors,
+    "p50_ms": round(percentile(latencies, 50), 3),
+    "p95_ms": round(percentile(latencies, 95), 3),
+    "p99_ms": round(percentile(latencies, 99), 3),
+    "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+    "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+  }
+
+
+async def run_suite(only: set[str] | None = None) -> dict:
+  """Seeds a fresh database, runs the scenarios, returns the results"""
+  directory = tempfile.mkdtemp(prefix="oneshot-bench-")
+  url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+  engine = create_async_engine(url, **engine_options(url)) # pool and SQLite lock wait of the app
+  enable_sqlite_foreign_keys(engine)
+  session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+  redis_client = redis.Redis.from_url(REDIS_URL) if REDIS_URL else fakeredis.aioredis.FakeRedis()
+  await redis_client.flushdb()
+
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+
+  data = await seed(session_maker)
+
+  # Same wiring as a running worker, with our database/redis
+  async def override_get_db():
+    async with session_maker() as session:
+      yield session
+
+  async def override_get_read_db(db = Depends(get_db)):
+    yield db # no replica: the request's session, like get_read_db (a second one per request starves the pool)
+
+  async def override_get_redis():
+    yield redis_client
+
+  app.dependency_overrides[get_db] = override_get_db
+  app.dependency_overrides[get_read_db] = override_get_read_db
+  app.dependency_overrides[get_redis] = override_get_redis
+  set_storage(MemoryStorage())
+  await rebuild_filter(redis_client)
+
+  results = {}
+  try:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+      for name, (requests, send) in scenarios(data).items():
+        if only and name not in only:
+          continue
+
+        results[name] = await run_scenario(client, requests, send)
+        print(f"{name:<10} {results[name]}")
+
+  finally:
+    app.dependency_overrides.clear()
+    set_storage(None)
+    reset_filter()
+    clear_principal_cache()
+    await redis_client.aclose()
+    await engine.dispose()
+
+  return {
+    "meta": {
+      "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "users": USERS, "shots": SHOTS, "concurrency": CONCURRENCY,
+      "redis": "real" if REDIS_URL else "fakeredis",
+    },
+    "scenarios": results,
+  }
+
+
+# ============== Baseline ==============
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+  """
+  Regressions of `results` against `baseline`:
+  p95 higher than baseline * (1 + tolerance), throughput lower than baseline / (1 + tolerance), new errors
+  """
+  regressions = []
+
+  for name, now in results["scenarios"].items():
+    before = baseline.get("scenarios", {}).get(name)
+    if not before:
+      continue
+
+    if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+      regressions.append(f"{name}: p95 {now['p95_ms']}ms > baseline {before['p95_ms']}ms")
+
+    if now["rps"] < before["rps"] / (1 + tolerance):
+      regressions.append(f"{name}: {now['rps']} req/s < baseline {before['rps']} req/s")
+
+    if now["errors"] > before["errors"]:
+      regressions.append(f"{name}: {now['errors']} errors (baseline {before['errors']})")
+
+  return regressions
+
+
+def write_json(path: str, data: dict):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, "w") as f:
+    json.dump(data, f, indent=2)
+    f.write("\n")
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="HTTP benchmark of the main routes")
+  parser.add_argument("--output", default=DEFAULT_OUTPUT)
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+  parser.add_argument("--save-baseline", action="store_true")
+  parser.add_argument("--tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", "0.25")))
+  parser.add_argument("--only", default="", help="comma separated scenarios")
+  args = parser.parse_args()
+
+  only = set(filter(None, args.only.split(",")))
+  results = asyncio.run(run_suite(only or None))
+
+  write_json(args.output, results)
+  print(f"\nResults written to {args.output}")
+
+  if args.save_baseline:
+    write_json(args.baseline, results)
+    print(f"Baseline saved to {args.baseline}")
+    return 0
+
+  if not os.path.exists(args.baseline):
+    print("No baseline yet, run with --save-baseline")
+    return 0
+
+  with open(args.baseline) as f:
+    regressions = compare(results, json.load(f), args.tolerance)
+
+  for regression in regressions:
+    print(f"⚠️ Regression: {regression}")
+
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Rate limiter throughput, ops/sec for each policy.
+
+  python -m Back.benchmarks.rate_limiter
+
+Runs against fakeredis, and against the real Redis at REDIS_URL when it answers.
+"legacy cooldown" is the old EXISTS -> TTL -> SETEX sequence for comparison.
+fakeredis has no network and emulates Lua in Python, so its numbers only show
+client overhead; the round trip savings show up against a real Redis.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+
+import fakeredis.aioredis
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from Back.services.rate_limiter import FixedWindow, SlidingWindow, TokenBucket
+
+OPS = int(os.getenv("BENCH_OPS", "5000"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+
+
+async def legacy_cooldown(redis_client, key):
+  if await redis_client.exists(key):
+    await redis_client.ttl(key)
+    return False
+  await redis_client.setex(name=key, time=5, value="locked")
+  return True
+
+
+def policies():
+  return {
+    "legacy cooldown (3 round trips)": legacy_cooldown,
+    "fixed window": FixedWindow(1, 5).hit,
+    "sliding window": SlidingWindow(10, 60).hit,
+    "token bucket": TokenBucket(10, 1).hit,
+  }
+
+
+async def run(redis_client, hit) -> float:
+  """ops/sec with CONCURRENCY tasks, one key per simulated user"""
+  keys = [f"bench:{uuid.uuid4().hex}" for _ in range(CONCURRENCY)]
+  per_task = OPS // CONCURRENCY
+
+  async def worker(key):
+    for _ in range(per_task):
+      await hit(redis_client, key)
+
+  start = time.perf_counter()
+  await asyncio.gather(*[worker(key) for key in keys])
+  elapsed = time.perf_counter() - start
+
+  await redis_client.delete(*keys)
+  return per_task * CONCURRENCY / elapsed
+
+
+async def bench(label, redis_client):
+  print(f"\n=== {label} ({OPS} ops, {CONCURRENCY} concurrent) ===")
+  for name, hit in policies().items():
+    print(f"{name:<34} {await run(redis_client, hit):>10,.0f} ops/sec")
+
+
+async def main():
+  await bench("fakeredis", fakeredis.aioredis.FakeRedis())
+
+  url = os.getenv("REDIS_URL")
+  if not url:
+    print("\nREDIS_URL not set, skipping real Redis")
+    return
+
+  client = redis.Redis.from_url(url)
+  try:
+    await client.ping()
+  except RedisError as e:
+    print(f"\nReal Redis at {url} not reachable ({e}), skipping")
+    return
+
+  await bench(f"redis {url}", client)
+  await client.aclose()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Feed page serialization time, before and after the response models.
+
+  python -m Back.benchmarks.serialization
+
+Builds a 100 shot page (with comment previews) from in-memory ORM objects and
+times turning it into response bytes:
+  before -> dicts with str(uuid)/.isoformat(), jsonable_encoder, json.dumps (old FastAPI path)
+  after  -> ShotOut models rendered by FastJSONResponse (pydantic-core)
+  cached -> the page read back from the feed cache and rendered again
+No database or Redis involved.
+"""
+
+import os
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from pydantic_core import to_json, from_json
+
+from Back.core.models import User, Shot, Comment
+from Back.core.schemas import FastJSONResponse
+
+# Imported for the helpers only, the app itself is not started
+from Back.app import shot_out
+
+PAGE_SIZE = int(os.getenv("BENCH_PAGE_SIZE", "100"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "200"))
+
+
+def make_page() -> tuple[list[Shot], dict]:
+  owner = User(id=uuid.uuid4(), username="photographer", hashed_password="x", avatar_url="/uploads/a.png")
+  start = datetime(2025, 1, 1)
+
+  shots, previews = [], {}
+  for i in range(PAGE_SIZE):
+    shot = Shot(
+      id=uuid.uuid4(), caption=f"shot number {i}", created_at=start + timedelta(minutes=i),
+      user_id=owner.id, like_count=i, comment_count=3, image_url=f"/uploads/{i}.png",
+      image_variants={str(w): f"/uploads/{i}_{w}.webp" for w in (320, 640, 1080)},
+      image_placeholder="data:image/webp;base64," + "A" * 120,
+    )
+    shot.owner = owner
+    previews[shot.id] = [
+      Comment(id=uuid.uuid4(), content=f"comment {j}", created_at=start, owner=owner) for j in range(3)
+    ]
+    shots.append(shot)
+
+  return shots, previews
+
+
+def before(shots, previews) -> bytes:
+  """What /shots did: plain dicts, then FastAPI's jsonable_encoder + json.dumps"""
+  data = [{
+    "id": str(shot.id),
+    "caption": shot.caption,
+    "created_at": shot.created_at.isoformat(),
+    "owner": shot.owner.username,
+    "owner_id": str(shot.owner.id),
+    "like_count": shot.like_count,
+    "comment_count": shot.comment_count,
+    "comments": [
+      {"id": str(c.id), "owner": c.owner.username, "content": c.content, "created_at": c.created_at.isoformat()}
+      for c in previews[shot.id]
+    ],
+    "image_url": shot.image_url,
+    "image_variants": shot.image_variants,
+    "image_placeholder": shot.image_placeholder,
+  } for shot in shots]
+
+  return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def after(shots, previews) -> bytes:
+  items = [shot_out(shot, previews[shot.id]) for shot in shots]
+  return FastJSONResponse(items).body
+
+
+def timed(func, *args) -> float:
+  """Best average over 5 runs of ROUNDS calls, in ms per page"""
+  best = float("inf")
+  for _ in range(5):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+      func(*args)
+    best = min(best, (time.perf_counter() - start) / ROUNDS)
+  return best * 1000
+
+
+def main():
+  shots, previews = make_page()
+  cached = to_json({"items": [shot_out(shot, previews[shot.id]) for shot in shots], "next_cursor": None})
+
+  results = {
+    "before (dicts + jsonable_encoder)": timed(before, shots, previews),
+    "after (models + pydantic-core)": timed(after, shots, previews),
+    "feed cache hit (from_json + render)": timed(lambda: FastJSONResponse(from_json(cached)["items"]).body),
+  }
+
+  print(f"\n=== {PAGE_SIZE} shot page, best of 5 x {ROUNDS} ===")
+  baseline = next(iter(results.values()))
+  for name, ms in results.items():
+    print(f"{name:<38} {ms:>8.3f} ms/page  {baseline / ms:>5.1f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,117 @@
+"""
+Redis pub/sub between the workers of the app.
+
+A module registers a handler for a channel with @on_message("channel"), and
+every worker runs one listener task (started in the app lifespan) that calls
+the handlers when something is published.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from Back.core.redis_client import get_redis_client
+
+Handler = Callable[[str], Awaitable[None] | None]
+
+_handlers: dict[str, list[Handler]] = {}
+_listener: asyncio.Task | None = None
+
+# Called every time the listener (re)subscribes / loses Redis,
+# for modules that must resync what they missed in between
+_on_connected: list[Callable[[object], Awaitable[None]]] = []
+_on_disconnected: list[Callable[[], None]] = []
+
+RECONNECT_DELAY = 1 # seconds, after losing the Redis connection
+
+
+def on_message(channel: str):
+  """Decorator: call the function with the message (str) of every publish on `channel`"""
+  def register(handler: Handler) -> Handler:
+    _handlers.setdefault(channel, []).append(handler)
+    return handler
+
+  return register
+
+
+def on_connected(callback):
+  """Decorator: `await callback(redis_client)` after every (re)subscribe"""
+  _on_connected.append(callback)
+  return callback
+
+
+def on_disconnected(callback):
+  """Decorator: `callback()` when the listener loses Redis"""
+  _on_disconnected.append(callback)
+  return callback
+
+
+async def publish(redis_client, channel: str, message: str):
+  """Sends the message to every worker (including this one)"""
+  try:
+    await redis_client.publish(channel, message)
+  except RedisError as e:
+    print(f"⚠️ Broadcast on {channel} failed: {e}")
+
+
+async def dispatch(channel, message):
+  """Runs the handlers of a channel (also used by tests to fake a publish)"""
+  if isinstance(channel, bytes):
+    channel = channel.decode()
+  if isinstance(message, bytes):
+    message = message.decode()
+
+  for handler in _handlers.get(channel, []):
+    try:
+      result = handler(message)
+      if asyncio.iscoroutine(result):
+        await result
+    except Exception as e:
+      print(f"⚠️ Broadcast handler for {channel} failed: {e}")
+
+
+async def _listen():
+  """Subscribes to every registered channel, reconnects if Redis goes away"""
+  while True:
+    client = get_redis_client()
+    pubsub = client.pubsub()
+
+    try:
+      await pubsub.subscribe(*_handlers)
+
+      for callback in _on_connected:
+        await callback(client)
+
+      async for message in pubsub.listen():
+        if message["type"] == "message":
+          await dispatch(message["channel"], message["data"])
+
+    except RedisError as e:
+      print(f"⚠️ Broadcast listener lost Redis: {e}")
+      for callback in _on_disconnected:
+        callback()
+      await asyncio.sleep(RECONNECT_DELAY)
+
+    finally:
+      await pubsub.aclose()
+      await client.aclose()
+
+
+def start_listener():
+  global _listener
+
+  if _listener is None and _handlers:
+    _listener = asyncio.create_task(_listen())
+
+
+async def stop_listener():
+  global _listener
+
+  if _listener is not None:
+    _listener.cancel()
+    try:
+      await _listener
+    except asyncio.CancelledError:
+      pass
+    _listener = None
@@ -1,27 +1,158 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from fastapi import Depends, Request
+from redis.exceptions import RedisError
+import jwt
 import os
 from dotenv import load_dotenv
 from Back.core.models import Base
+from Back.core.migrations import run_migrations
+from Back.core.metrics import TimedQueuePool, instrument_pool
+from Back.core.redis_client import get_redis
 
 load_dotenv()
 
-DB_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./oneshot.db")
+def normalize_url(url: str) -> str:
+  """postgres:// and postgresql:// (Render, Heroku...) -> the asyncpg driver"""
+  if url.startswith("postgres://"):
+    return url.replace("postgres://", "postgresql+asyncpg://", 1)
 
-if DB_URL.startswith("postgres://"):
-  DB_URL = DB_URL.replace("postgres://", "postgresql+asyncpg://", 1)
+  if url.startswith("postgresql://") and "+asyncpg" not in url:
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-elif DB_URL.startswith("postgresql://") and "+asyncpg" not in DB_URL:
-  DB_URL = DB_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+  return url
+
+DB_URL = normalize_url(os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./oneshot.db"))
+
+# Optional replica for read-only endpoints (/shots, /myshots, comments), same schema as the primary
+READ_DB_URL = normalize_url(os.getenv("DATABASE_READ_URL", "")) or None
+
+# After a user's own write, their reads stay on the primary this long (covers the replication lag)
+READ_STICKY_SECONDS = int(os.getenv("DATABASE_READ_STICKY_SECONDS", "5"))
+STICKY_PREFIX = "db:sticky:"
 
 print(f"Connecting to Database: {DB_URL.split('@')[-1]}")
+if READ_DB_URL:
+  print(f"Read replica: {READ_DB_URL.split('@')[-1]}")
+
+def enable_sqlite_foreign_keys(async_engine):
+  """SQLite ignores foreign keys (and ON DELETE CASCADE) unless each connection turns them on"""
+  if async_engine.dialect.name != "sqlite":
+    return
+
+  @event.listens_for(async_engine.sync_engine, "connect")
+  def _foreign_keys_on(dbapi_connection, _):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def engine_options(url: str) -> dict:
+  """
+  Pool settings from the environment (SQLAlchemy defaults otherwise):
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT   connections kept / extra under load / wait before erroring
+    DB_POOL_RECYCLE                                  seconds before a connection is replaced (-1 = never)
+    DB_POOL_PRE_PING=1                               checks each connection before use (dropped by the server/proxy)
+    DB_STATEMENT_CACHE_SIZE                          asyncpg prepared statements per connection (0 behind pgbouncer)
+    DB_SQLITE_BUSY_TIMEOUT                           seconds a SQLite writer waits for the lock (one writer at a time)
+  """
+  options = {
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "0") == "1",
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+  }
+
+  # In memory SQLite uses a single connection, no pool to size
+  if ":memory:" not in url:
+    options["poolclass"] = TimedQueuePool # checkout wait in the metrics
+    options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "5"))
+    options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    options["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
 
-engine = create_async_engine(DB_URL)
+  if url.startswith("postgresql+asyncpg://"):
+    options["connect_args"] = {"prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))}
+
+  # sqlite3 gives up after 5s, a burst of writes queues longer than that
+  if url.startswith("sqlite"):
+    options["connect_args"] = {"timeout": float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "30"))}
+
+  return options
+
+def create_engine_for(url: str):
+  """Engine with the pool settings, SQLite foreign keys and pool metrics"""
+  new_engine = create_async_engine(url, **engine_options(url))
+  enable_sqlite_foreign_keys(new_engine)
+  instrument_pool(new_engine.sync_engine)
+  return new_engine
+
+engine = create_engine_for(DB_URL)
 get_async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+# Without a replica every read goes to the primary
+read_engine = create_engine_for(READ_DB_URL) if READ_DB_URL else None
+get_read_async_session = async_sessionmaker(read_engine, expire_on_commit=False) if read_engine else None
+
 async def create_db_and_tables():
   async with engine.begin() as conn:
+    # 1- New tables (fresh database gets the full schema here)
     await conn.run_sync(Base.metadata.create_all)
 
+    # 2- Changes to existing tables (columns, indexes, constraints)
+    await conn.run_sync(run_migrations)
+
 async def get_db():
+  # Lazy: the connection is taken from the pool by the first query (cache hits and 304s never take one)
   async with get_async_session() as session:
     yield session
+
+
+""" READ REPLICA """
+
+def has_replica() -> bool:
+  return get_read_async_session is not None
+
+async def stick_to_primary(username: str, redis_client):
+  """Called after a user's write: their next reads see it even if the replica is behind"""
+  if not has_replica():
+    return
+
+  try:
+    await redis_client.set(f"{STICKY_PREFIX}{username}", "1", ex=READ_STICKY_SECONDS)
+  except RedisError as e:
+    print(f"⚠️ Read stickiness failed: {e}")
+
+def _token_subject(request: Request) -> str | None:
+  """Username of the bearer token, only to pick the database (the routes still verify the token)"""
+  scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+  if scheme.lower() != "bearer" or not token:
+    return None
+
+  try:
+    return jwt.decode(token, options={"verify_signature": False}).get("sub")
+  except jwt.PyJWTError:
+    return None
+
+async def _reads_from_primary(request: Request, redis_client) -> bool:
+  username = _token_subject(request)
+  if username is None:
+    return False
+
+  try:
+    return bool(await redis_client.exists(f"{STICKY_PREFIX}{username}"))
+  except RedisError:
+    return True # can't tell -> the primary is always right
+
+async def get_read_db(request: Request, redis_client = Depends(get_redis), primary = Depends(get_db)):
+  """
+  Session for read-only endpoints:
+  1- No replica configured -> the request's primary session (the one get_current_user uses too)
+  2- The user wrote in the last READ_STICKY_SECONDS -> same (read-your-writes)
+  3- Everyone else -> replica
+  One primary session per request, so a request never holds two primary connections.
+  """
+  if not has_replica() or await _reads_from_primary(request, redis_client):
+    primary.info["replica"] = False
+    yield primary
+    return
+
+  async with get_read_async_session() as session:
+    session.info["replica"] = True # the feed doesn't cache what a lagging replica returned
+    yield session
@@ -0,0 +1,230 @@
+"""
+Durable job queue on Redis Streams, for side effects that can run after the response.
+
+A module registers a handler with @job("name"), a route commits and calls
+`await enqueue(redis, "name", **payload)`, and a worker runs the handler later:
+  - python worker.py                  dedicated process (as many as needed, one consumer group)
+  - JOB_WORKER_IN_APP=1 (default)     one consumer task in each app worker as well
+
+  stream "jobs", group "workers"      pending jobs, each delivered to one consumer
+  a handler fails / a worker dies     the job stays pending, claimed again after JOB_RETRY_SECONDS
+  JOB_MAX_ATTEMPTS deliveries         moved to the "jobs:dead" stream with the last error
+  "jobs:done:{id}" (JOB_DONE_TTL)     a job redelivered after it succeeded is not run again
+
+Handlers still have to be idempotent: a worker can die between the work and the ack.
+"""
+
+import os
+import json
+import uuid
+import socket
+import asyncio
+from typing import Awaitable, Callable
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from Back.core.database import get_async_session
+from Back.core.redis_client import get_redis_client
+
+JOB_STREAM = "jobs"
+DEAD_STREAM = "jobs:dead"
+GROUP = "workers"
+DONE_PREFIX = "jobs:done:"
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "30")) # pending that long -> claimed again
+JOB_DONE_TTL = int(os.getenv("JOB_DONE_TTL", str(24 * 3600)))
+JOB_WORKER_IN_APP = os.getenv("JOB_WORKER_IN_APP", "1") == "1"
+
+STREAM_MAXLEN = 100_000 # approximate cap, done jobs are deleted anyway
+BATCH = 10
+BLOCK_MS = 5000 # XREADGROUP wait, the stop flag is checked in between
+RECONNECT_DELAY = 1 # seconds, after losing Redis
+
+Handler = Callable[..., Awaitable[None]]
+
+_handlers: dict[str, Handler] = {}
+_consumer_task: asyncio.Task | None = None
+_session_factory: async_sessionmaker | None = None
+
+
+def job(name: str):
+  """Decorator: `await handler(**payload)` for every job enqueued under `name`"""
+  def register(handler: Handler) -> Handler:
+    _handlers[name] = handler
+    return handler
+
+  return register
+
+
+def job_session():
+  """Database session for handlers (no request around them)"""
+  return (_session_factory or get_async_session)()
+
+
+def set_job_session_factory(factory: async_sessionmaker | None):
+  """Swap the database of the handlers (tests), None -> the app database"""
+  global _session_factory
+  _session_factory = factory
+
+
+def _text(value) -> str:
+  return value.decode() if isinstance(value, bytes) else value
+
+
+async def enqueue(redis_client, name: str, **payload) -> str | None:
+  """
+  Adds a job (payload must be JSON), returns its id.
+  Redis down -> logged, None: the side effect is lost, the request isn't.
+  """
+  job_id = uuid.uuid4().hex
+
+  try:
+    await redis_client.xadd(
+      JOB_STREAM,
+      {"id": job_id, "name": name, "payload": json.dumps(payload)},
+      maxlen=STREAM_MAXLEN,
+      approximate=True,
+    )
+  except RedisError as e:
+    print(f"⚠️ Could not enqueue job {name}: {e}")
+    return None
+
+  return job_id
+
+
+async def ensure_group(redis_client):
+  """Consumer group (and stream) created once, BUSYGROUP = already there"""
+  try:
+    await redis_client.xgroup_create(JOB_STREAM, GROUP, id="0", mkstream=True)
+  except ResponseError as e:
+    if "BUSYGROUP" not in str(e):
+      raise
+
+
+async def _finish(redis_client, message_id, job_id: str):
+  """Done marker + ack + delete in one round trip"""
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.set(f"{DONE_PREFIX}{job_id}", "1", ex=JOB_DONE_TTL)
+    pipe.xack(JOB_STREAM, GROUP, message_id)
+    pipe.xdel(JOB_STREAM, message_id)
+    await pipe.execute()
+
+
+async def _dead_letter(redis_client, message_id, fields: dict, attempts: int, error: str):
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.xadd(DEAD_STREAM, {**fields, "attempts": str(attempts), "error": error[:500]}, maxlen=STREAM_MAXLEN, approximate=True)
+    pipe.xack(JOB_STREAM, GROUP, message_id)
+    pipe.xdel(JOB_STREAM, message_id)
+    await pipe.execute()
+
+
+async def process(redis_client, message_id, fields: dict, attempts: int):
+  """
+  Runs one delivered job:
+  1- Already done (redelivered after success) -> only acked
+  2- Unknown name -> dead letter right away, retrying can't help
+  3- Handler fails -> stays pending for a retry, dead letter after JOB_MAX_ATTEMPTS
+  4- Success -> done marker, acked
+  """
+  fields = {_text(key): _text(value) for key, value in fields.items()}
+  job_id, name = fields.get("id", ""), fields.get("name", "")
+
+  # 1- Done
+  if await redis_client.exists(f"{DONE_PREFIX}{job_id}"):
+    await _finish(redis_client, message_id, job_id)
+    return
+
+  # 2- Unknown
+  handler = _handlers.get(name)
+  if handler is None:
+    await _dead_letter(redis_client, message_id, fields, attempts, f"no handler for {name!r}")
+    return
+
+  # 3- Run
+  try:
+    await handler(**json.loads(fields.get("payload") or "{}"))
+  except Exception as e:
+    print(f"⚠️ Job {name} failed (attempt {attempts}/{JOB_MAX_ATTEMPTS}): {e}")
+    if attempts >= JOB_MAX_ATTEMPTS:
+      await _dead_letter(redis_client, message_id, fields, attempts, repr(e))
+    return
+
+  # 4- Done
+  await _finish(redis_client, message_id, job_id)
+
+
+async def run_once(redis_client, consumer: str, block_ms: int | None = None, retry_seconds: float = JOB_RETRY_SECONDS) -> int:
+  """
+  One pass of a worker, returns the number of jobs handled:
+  1- Jobs pending longer than `retry_seconds` (failed, or their worker died) claimed and retried
+  2- New jobs (waits up to `block_ms` for some, None -> doesn't wait)
+  """
+  handled = 0
+
+  # 1- Retries, the delivery count (attempts) comes from the pending list
+  claimed = await redis_client.xautoclaim(JOB_STREAM, GROUP, consumer, min_idle_time=int(retry_seconds * 1000), start_id="0-0", count=BATCH)
+  for message_id, fields in claimed[1]: # [next start, messages, deleted ids (Redis 7)]
+    if not fields: # deleted while pending
+      continue
+
+    pending = await redis_client.xpending_range(JOB_STREAM, GROUP, min=message_id, max=message_id, count=1)
+    attempts = pending[0]["times_delivered"] if pending else JOB_MAX_ATTEMPTS
+    await process(redis_client, message_id, fields, attempts)
+    handled += 1
+
+  # 2- New
+  streams = await redis_client.xreadgroup(GROUP, consumer, {JOB_STREAM: ">"}, count=BATCH, block=block_ms)
+  for _, messages in streams or []:
+    for message_id, fields in messages:
+      await process(redis_client, message_id, fields, attempts=1)
+      handled += 1
+
+  return handled
+
+
+def consumer_name() -> str:
+  return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def run_worker(redis_client, consumer: str | None = None, stop: asyncio.Event | None = None):
+  """Handles jobs until `stop` is set (or the task is cancelled), survives Redis restarts"""
+  consumer = consumer or consumer_name()
+  stop = stop or asyncio.Event()
+  ready = False
+
+  while not stop.is_set():
+    try:
+      if not ready:
+        await ensure_group(redis_client)
+        ready = True
+
+      if not await run_once(redis_client, consumer, block_ms=BLOCK_MS):
+        await asyncio.sleep(0) # lets the loop run if the client answers without blocking
+
+    except RedisError as e:
+      print(f"⚠️ Job worker lost Redis: {e}")
+      ready = False # NOGROUP after a Redis restart without persistence
+      await asyncio.sleep(RECONNECT_DELAY)
+
+
+""" IN APP CONSUMER """
+
+def start_consumer():
+  global _consumer_task
+
+  if _consumer_task is None and JOB_WORKER_IN_APP:
+    _consumer_task = asyncio.create_task(run_worker(get_redis_client()))
+
+
+async def stop_consumer():
+  global _consumer_task
+
+  if _consumer_task is not None:
+    _consumer_task.cancel()
+    try:
+      await _consumer_task
+    except asyncio.CancelledError:
+      pass
+    _consumer_task = None
@@ -0,0 +1,155 @@
+"""
+Prometheus metrics, scraped at GET /metrics.
+
+  http_requests_total{method, route, status}        requests per route template (/shot/{shot_id}/like, not the real ids)
+  http_request_duration_seconds{method, route}      latency histogram
+  http_requests_in_progress                         in-flight requests
+  http_streams_open                                 open long lived responses (/shots/stream), kept out of the two above
+  db_pool_checkout_seconds / db_pool_*              wait for a connection, pool size and connections in use
+  redis_command_duration_seconds{command}           Redis latency per command
+  storage_upload_seconds{backend} / _bytes_total    uploads from save_file
+  feed_cache_total{result}                          feed page cache: hit, miss, rebuild, error
+
+Several workers (gunicorn/uvicorn --workers): set PROMETHEUS_MULTIPROC_DIR to an empty
+folder before starting them. Each worker writes its values to files there and /metrics
+adds them up, whichever worker answers.
+"""
+
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# ============== Metrics ==============
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+  "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being handled", multiprocess_mode="livesum")
+STREAMS_OPEN = Gauge("http_streams_open", "Streaming responses being sent", multiprocess_mode="livesum")
+
+# Open for minutes (SSE): timing them would wreck the latency percentiles
+STREAMING_PATHS = {"/shots/stream"}
+
+DB_CHECKOUT_WAIT = Histogram(
+  "db_pool_checkout_seconds", "Wait for a database connection from the pool",
+  buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections the pool keeps open", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+
+REDIS_LATENCY = Histogram(
+  "redis_command_duration_seconds", "Redis command latency", ["command"],
+  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+
+UPLOAD_LATENCY = Histogram(
+  "storage_upload_seconds", "Upload duration", ["backend"],
+  buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOAD_BYTES = Counter("storage_upload_bytes_total", "Uploaded bytes", ["backend"])
+
+FEED_CACHE = Counter("feed_cache_total", "Feed page cache lookups and rebuilds", ["result"])
+
+
+# ============== HTTP ==============
+
+def _route_of(scope) -> str:
+  """Route template once the router matched it (bounded label values)"""
+  route = scope.get("route")
+  if route is not None:
+    return route.path
+  return scope.get("root_path") or "unmatched" # mounts (/uploads) or 404
+
+
+class MetricsMiddleware:
+  """Pure ASGI (no BaseHTTPMiddleware): one timer and a few counter updates per request"""
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http" or scope["path"] == "/metrics":
+      return await self.app(scope, receive, send)
+
+    status = 500 # if the app crashes before answering
+
+    async def send_with_status(message):
+      nonlocal status
+      if message["type"] == "http.response.start":
+        status = message["status"]
+      await send(message)
+
+    streaming = scope["path"] in STREAMING_PATHS
+    gauge = STREAMS_OPEN if streaming else IN_PROGRESS
+
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+      await self.app(scope, receive, send_with_status)
+    finally:
+      route = _route_of(scope)
+      if not streaming:
+        REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - start)
+      REQUESTS.labels(scope["method"], route, str(status)).inc()
+      gauge.dec()
+
+
+def render_metrics() -> tuple[bytes, str]:
+  """(body, content type) of /metrics, summed over every worker in multiprocess mode"""
+  if MULTIPROCESS:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+  else:
+    registry = REGISTRY
+
+  return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def worker_exit():
+  """Drops the live gauges of this worker (multiprocess mode), call on shutdown"""
+  if MULTIPROCESS:
+    multiprocess.mark_process_dead(os.getpid())
+
+
+# ============== Database ==============
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+  """Pool of the async engines, times each checkout (the wait for a free connection, or opening one)"""
+
+  def connect(self):
+    start = time.perf_counter()
+    try:
+      return super().connect()
+    finally:
+      DB_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_pool(sync_engine):
+  """Pool size + connections in use, kept up to date by pool events"""
+  pool = sync_engine.pool
+  if isinstance(pool, QueuePool): # SQLite memory/static pools have no size
+    DB_POOL_SIZE.inc(pool.size())
+
+  event.listen(pool, "checkout", lambda *args: DB_POOL_CHECKED_OUT.inc())
+  event.listen(pool, "checkin", lambda *args: DB_POOL_CHECKED_OUT.dec())
+
+
+# ============== Redis ==============
+
+def observe_redis(command: str, seconds: float):
+  REDIS_LATENCY.labels(command.upper()).observe(seconds)
+
+
+# ============== Storage ==============
+
+def observe_upload(backend: str, size: int, seconds: float):
+  UPLOAD_LATENCY.labels(backend).observe(seconds)
+  UPLOAD_BYTES.labels(backend).inc(size)
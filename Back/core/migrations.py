@@ -0,0 +1,282 @@
+"""
+Versioned schema migrations.
+
+create_all() only creates missing tables, so anything added to an existing table
+(columns, indexes, constraints) must also be added here as a new migration.
+Every migration has to be idempotent: a fresh database already got the change
+from create_all() and only records the version.
+
+Plain SQL that works on both SQLite (aiosqlite) and PostgreSQL (asyncpg).
+
+Usage:
+  python -m Back.core.migrations            -> apply pending migrations
+  python -m Back.core.migrations explain    -> print query plans of the hot queries
+"""
+
+import sys
+import uuid
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import text, select, inspect, func
+from sqlalchemy import MetaData, Table, Column, Index, ForeignKey, Uuid, String
+from sqlalchemy.orm import joinedload
+
+from Back.core.models import Shot, Comment, Like
+
+# ============== Helpers ==============
+
+def _has_column(conn, table: str, column: str) -> bool:
+  return column in [c["name"] for c in inspect(conn).get_columns(table)]
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+  if not _has_column(conn, table, column):
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_index(conn, name: str, table: str, columns: str, unique: bool = False):
+  kind = "UNIQUE INDEX" if unique else "INDEX"
+  conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _shot_foreign_key(conn, table: str) -> dict | None:
+  for fk in inspect(conn).get_foreign_keys(table):
+    if fk["constrained_columns"] == ["shot_id"]:
+      return fk
+  return None
+
+
+# likes/comments as migration 4 rebuilds them: it must keep producing the same schema
+# whatever the models look like today (comments.created_at came after it, in migration 5)
+_V4_TABLES = MetaData()
+Table("users", _V4_TABLES, Column("id", Uuid, primary_key=True))
+Table("shots", _V4_TABLES, Column("id", Uuid, primary_key=True))
+
+Table(
+  "likes", _V4_TABLES,
+  Column("id", Uuid, primary_key=True),
+  Column("user_id", Uuid, ForeignKey("users.id"), nullable=False),
+  Column("shot_id", Uuid, ForeignKey("shots.id", ondelete="CASCADE"), nullable=False),
+  Index("ix_likes_shot_id", "shot_id"),
+  Index("uq_likes_user_id_shot_id", "user_id", "shot_id", unique=True),
+)
+
+Table(
+  "comments", _V4_TABLES,
+  Column("id", Uuid, primary_key=True),
+  Column("content", String(100), nullable=False),
+  Column("user_id", Uuid, ForeignKey("users.id"), nullable=False),
+  Column("shot_id", Uuid, ForeignKey("shots.id", ondelete="CASCADE"), nullable=False),
+  Index("ix_comments_shot_id", "shot_id"),
+)
+
+
+def _rebuild_sqlite_table(conn, table: str):
+  """
+  SQLite can't ALTER a constraint: the table is recreated from _V4_TABLES and the rows copied over.
+  1- Old table moved aside (its indexes too, the new table reuses their names)
+  2- New table + indexes from its definition
+  3- Copy the columns both have, drop the old one
+  """
+  old = f"_{table}_old"
+
+  # 1- Move aside
+  for index in inspect(conn).get_indexes(table):
+    conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+  conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+
+  # 2- New table
+  _V4_TABLES.tables[table].create(conn)
+
+  # 3- Copy
+  new_columns = {c.name for c in _V4_TABLES.tables[table].columns}
+  columns = ", ".join(c["name"] for c in inspect(conn).get_columns(old) if c["name"] in new_columns)
+  conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}"))
+  conn.execute(text(f"DROP TABLE {old}"))
+
+
+# ============== Migrations ==============
+
+def _001_shot_counters(conn):
+  """like_count / comment_count on shots + backfill"""
+  _add_column(conn, "shots", "like_count", "INTEGER NOT NULL DEFAULT 0")
+  _add_column(conn, "shots", "comment_count", "INTEGER NOT NULL DEFAULT 0")
+
+  conn.execute(text(
+    "UPDATE shots SET "
+    "like_count = (SELECT COUNT(*) FROM likes WHERE likes.shot_id = shots.id), "
+    "comment_count = (SELECT COUNT(*) FROM comments WHERE comments.shot_id = shots.id)"
+  ))
+
+
+def _002_feed_indexes(conn):
+  """Indexes for the feed, likes and comments + one like per user per shot"""
+  _create_index(conn, "ix_shots_created_at_id", "shots", "created_at, id")
+  _create_index(conn, "ix_shots_user_id_created_at_id", "shots", "user_id, created_at, id")
+  _create_index(conn, "ix_likes_shot_id", "likes", "shot_id")
+  _create_index(conn, "ix_comments_shot_id", "comments", "shot_id")
+
+  # 1- Old duplicate likes would block the unique index, keep the first one
+  conn.execute(text(
+    "DELETE FROM likes WHERE EXISTS ("
+    "SELECT 1 FROM likes AS older "
+    "WHERE older.user_id = likes.user_id AND older.shot_id = likes.shot_id AND older.id < likes.id)"
+  ))
+  _create_index(conn, "uq_likes_user_id_shot_id", "likes", "user_id, shot_id", unique=True)
+
+  # 2- Counters may have counted the removed duplicates
+  conn.execute(text(
+    "UPDATE shots SET like_count = (SELECT COUNT(*) FROM likes WHERE likes.shot_id = shots.id)"
+  ))
+
+
+def _003_image_variants(conn):
+  """Resized WebP variants for shots and avatars"""
+  _add_column(conn, "shots", "image_variants", "JSON")
+  _add_column(conn, "shots", "image_placeholder", "VARCHAR")
+  _add_column(conn, "users", "avatar_variants", "JSON")
+
+
+def _004_cascade_deletes(conn):
+  """Likes/comments deleted by the database with their shot (ON DELETE CASCADE)"""
+  for table in ("likes", "comments"):
+    fk = _shot_foreign_key(conn, table)
+    if fk and fk.get("options", {}).get("ondelete", "").upper() == "CASCADE":
+      continue
+
+    # 1- Rows of deleted shots would block the new constraint
+    conn.execute(text(f"DELETE FROM {table} WHERE shot_id NOT IN (SELECT id FROM shots)"))
+
+    # 2- Postgres swaps the constraint, SQLite rebuilds the table
+    if conn.dialect.name == "postgresql":
+      name = fk["name"] if fk else f"{table}_shot_id_fkey"
+      conn.execute(text(
+        f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}, "
+        f"ADD CONSTRAINT {name} FOREIGN KEY (shot_id) REFERENCES shots (id) ON DELETE CASCADE"
+      ))
+    else:
+      _rebuild_sqlite_table(conn, table)
+
+
+def _005_comment_dates(conn):
+  """comments.created_at + index for the latest comments of a shot"""
+  _add_column(conn, "comments", "created_at", "TIMESTAMP")
+
+  # Old comments never had a date: the shot's date keeps them in a stable order
+  conn.execute(text(
+    "UPDATE comments SET created_at = (SELECT shots.created_at FROM shots WHERE shots.id = comments.shot_id) "
+    "WHERE created_at IS NULL"
+  ))
+
+  _create_index(conn, "ix_comments_shot_id_created_at_id", "comments", "shot_id, created_at, id")
+  conn.execute(text("DROP INDEX IF EXISTS ix_comments_shot_id")) # covered by the new one
+
+
+# (version, description, function) -> only append, never edit an applied one
+MIGRATIONS = [
+  (1, "shot counters", _001_shot_counters),
+  (2, "feed indexes", _002_feed_indexes),
+  (3, "image variants", _003_image_variants),
+  (4, "cascade deletes", _004_cascade_deletes),
+  (5, "comment dates", _005_comment_dates),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(conn) -> int:
+  """
+  Applies every pending migration inside the caller's transaction.
+  Runs with conn.run_sync(...) after create_all().
+  Returns the schema version after running.
+
+  1- Lock (Postgres) so parallel workers don't migrate twice
+  2- Read the current version
+  3- Apply what's missing, one version at a time
+  """
+
+  # 1- Only one worker at a time (released at the end of the transaction)
+  if conn.dialect.name == "postgresql":
+    conn.execute(text("SELECT pg_advisory_xact_lock(20240101)"))
+
+  # 2- Current version
+  conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+  current = conn.execute(text("SELECT version FROM schema_version")).scalar()
+
+  if current is None:
+    current = 0
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (0)"))
+
+  # 3- Apply pending migrations
+  for version, description, migrate in MIGRATIONS:
+    if version <= current:
+      continue
+
+    print(f"Applying migration {version}: {description}")
+    migrate(conn)
+    conn.execute(text("UPDATE schema_version SET version = :v"), {"v": version})
+    current = version
+
+  return current
+
+
+# ============== Query plans ==============
+
+def hot_queries() -> dict:
+  """Same shape as the queries in Back/app.py, with dummy values"""
+  from Back.services.pagination import paginate, encode_cursor
+
+  some_id = uuid.uuid4()
+  cursor = encode_cursor(datetime(2025, 1, 1), some_id)
+
+  from Back.services.comments import COMMENT_PREVIEW
+
+  feed = select(Shot).options(joinedload(Shot.owner))
+
+  ranked = (
+    select(Comment.id, func.row_number().over(
+      partition_by=Comment.shot_id, order_by=(Comment.created_at.desc(), Comment.id.desc())
+    ).label("rank"))
+    .where(Comment.shot_id.in_([some_id]))
+    .subquery()
+  )
+
+  return {
+    "feed (first page)": paginate(feed, Shot, None, 1, 10),
+    "feed (cursor)": paginate(feed, Shot, cursor, 1, 10),
+    "my shots (cursor)": paginate(feed.where(Shot.user_id == some_id), Shot, cursor, 1, 10),
+    "duplicate like check": select(Like).where(Like.user_id == some_id, Like.shot_id == some_id),
+    "comment previews": select(Comment).join(ranked, ranked.c.id == Comment.id).where(ranked.c.rank <= COMMENT_PREVIEW),
+    "comments of a shot (cursor)": paginate(select(Comment).where(Comment.shot_id == some_id), Comment, cursor, 1, 20),
+  }
+
+
+async def print_query_plans():
+  from Back.core.database import engine
+
+  async with engine.connect() as conn:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+
+    for name, query in hot_queries().items():
+      # dummy values inlined, the plan is what matters here
+      sql = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+      result = await conn.exec_driver_sql(prefix + str(sql))
+
+      print(f"\n=== {name} ===")
+      for row in result:
+        print(" | ".join(str(col) for col in row))
+
+
+async def main():
+  from Back.core.database import create_db_and_tables
+
+  if len(sys.argv) > 1 and sys.argv[1] == "explain":
+    await print_query_plans()
+    return
+
+  await create_db_and_tables()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
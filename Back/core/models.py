@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import String, DateTime, Uuid, ForeignKey
+from sqlalchemy import String, DateTime, Uuid, ForeignKey, Index, Integer, JSON
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime, timezone
 
@@ -18,6 +18,9 @@ class User(Base):
   # PFP url, nullable = true so old users don't crash the app
   avatar_url: Mapped[str | None] = mapped_column(String, nullable=True)
 
+  # Resized WebP copies of the avatar {"96": url, "256": url}
+  avatar_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
   # Hashed password
   hashed_password: Mapped[str] = mapped_column(String, nullable=False)
 
@@ -33,6 +36,14 @@ class User(Base):
 class Shot(Base):
   __tablename__ = "shots"
 
+  # Keyset pagination indexes, match ORDER BY created_at DESC, id DESC
+  # 1- Home feed (/shots)
+  # 2- User's own shots (/myshots)
+  __table_args__ = (
+    Index("ix_shots_created_at_id", "created_at", "id"),
+    Index("ix_shots_user_id_created_at_id", "user_id", "created_at", "id"),
+  )
+
   # Shot ID
   id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
 
@@ -41,6 +52,15 @@ class Shot(Base):
   created_at: Mapped[datetime] = mapped_column(DateTime, default= lambda : datetime.now(timezone.utc).replace(tzinfo=None))
   image_url: Mapped[str | None] = mapped_column(String, nullable=True)
 
+  # Resized WebP copies {"320": url, "640": url, ...} + tiny blurred preview (data URI)
+  image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+  image_placeholder: Mapped[str | None] = mapped_column(String, nullable=True)
+
+  # Denormalized counters so the feed never has to load the Like/Comment rows
+  # Kept in sync by the like/comment handlers, fixed by Back.services.counters if they drift
+  like_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+  comment_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
   # User ID who owns the shot
   user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"))
 
@@ -48,18 +68,25 @@ class Shot(Base):
   owner = relationship("User", back_populates="shots")
 
   # For Cascade Delete
-  comments = relationship("Comment", back_populates="shot", cascade="all, delete-orphan")
-  likes = relationship("Like", back_populates="shot", cascade="all, delete-orphan")
+  # Done by the database (ON DELETE CASCADE), passive_deletes -> the ORM never loads the children to delete them
+  comments = relationship("Comment", back_populates="shot", cascade="all, delete-orphan", passive_deletes=True)
+  likes = relationship("Like", back_populates="shot", cascade="all, delete-orphan", passive_deletes=True)
 
 class Comment(Base):
   __tablename__ = "comments"
 
+  # Comments of a shot, newest first (feed previews + GET /shot/{id}/comments)
+  __table_args__ = (
+    Index("ix_comments_shot_id_created_at_id", "shot_id", "created_at", "id"),
+  )
+
   id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
   content: Mapped[str] = mapped_column(String(100))
+  created_at: Mapped[datetime] = mapped_column(DateTime, default= lambda : datetime.now(timezone.utc).replace(tzinfo=None))
 
   # Links
   user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"))
-  shot_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("shots.id"))
+  shot_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("shots.id", ondelete="CASCADE"))
 
   shot = relationship("Shot", back_populates="comments")
   owner = relationship("User") # to be able to access the user's name who posted the comment
@@ -68,9 +95,34 @@ class Like(Base):
 
   __tablename__ = "likes"
 
+  # 1- Likes of a shot
+  # 2- One like per user per shot, enforced by the database
+  __table_args__ = (
+    Index("ix_likes_shot_id", "shot_id"),
+    Index("uq_likes_user_id_shot_id", "user_id", "shot_id", unique=True),
+  )
+
   id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
 
   user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"))
-  shot_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("shots.id"))
+  shot_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("shots.id", ondelete="CASCADE"))
 
   shot = relationship("Shot", back_populates="likes")
+
+class StoredObject(Base):
+  """
+  Content addressed image (original + WebP variants), named after the sha256 of its bytes.
+  Shared by every shot/avatar with the same bytes, the files go when ref_count reaches 0.
+  """
+  __tablename__ = "stored_objects"
+
+  # sha256 hex, "avatar_" prefix for avatars (different variant widths)
+  key: Mapped[str] = mapped_column(String(80), primary_key=True)
+
+  image_url: Mapped[str] = mapped_column(String)
+  image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+  image_placeholder: Mapped[str | None] = mapped_column(String, nullable=True)
+
+  # Shots/avatars using it
+  ref_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+  created_at: Mapped[datetime] = mapped_column(DateTime, default= lambda : datetime.now(timezone.utc).replace(tzinfo=None))
@@ -0,0 +1,152 @@
+"""
+SQL profiler: the queries of each request, to catch N+1 before they reach production.
+
+Every statement run by any engine (so the get_db sessions of the routes) is counted on the
+profile of the current request: number of queries, total DB time, slowest statements.
+
+  DB_PROFILE_HEADERS=1        adds X-DB-Queries / X-DB-Time-Ms to every response (debug only)
+  DB_SLOW_REQUEST_MS=500      logs the slowest statements of requests slower than that
+  DB_REPEATED_QUERY_WARN=5    logs statements run that many times in one request (N+1 pattern)
+
+In tests: `with profile_queries() as profile: ...` then `profile.count`, or the max_queries fixture.
+"""
+
+import os
+import time
+import heapq
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADERS = os.getenv("DB_PROFILE_HEADERS", "0") == "1"
+SLOW_REQUEST_MS = float(os.getenv("DB_SLOW_REQUEST_MS", "500"))
+REPEATED_QUERY_WARN = int(os.getenv("DB_REPEATED_QUERY_WARN", "5"))
+
+SLOWEST_KEPT = 3
+
+# Not requests worth profiling: the scrape, and the live feed (open for minutes, no queries)
+UNPROFILED_PATHS = {"/metrics", "/shots/stream"}
+
+
+class QueryProfile:
+  """Queries of one request (or one `profile_queries` block), also counted on the enclosing one"""
+
+  def __init__(self, parent: "QueryProfile | None" = None):
+    self.parent = parent
+    self.count = 0
+    self.seconds = 0.0
+    self.statements = Counter() # SQL text -> times run, bound parameters keep it the same for every id
+    self._slowest = [] # min-heap of (seconds, statement), SLOWEST_KEPT long
+
+  def record(self, statement: str, seconds: float):
+    self.count += 1
+    self.seconds += seconds
+    self.statements[statement] += 1
+
+    if len(self._slowest) < SLOWEST_KEPT:
+      heapq.heappush(self._slowest, (seconds, statement))
+    elif seconds > self._slowest[0][0]:
+      heapq.heapreplace(self._slowest, (seconds, statement))
+
+    if self.parent is not None: # a test block around a request sees the request's queries
+      self.parent.record(statement, seconds)
+
+  @property
+  def slowest(self) -> list[tuple[float, str]]:
+    return sorted(self._slowest, reverse=True)
+
+  def repeated(self, threshold: int = REPEATED_QUERY_WARN) -> list[tuple[str, int]]:
+    """Statements run at least `threshold` times: one query per row of a list, N+1"""
+    return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+  def report(self) -> str:
+    lines = [f"{self.count} queries, {self.seconds * 1000:.1f} ms in the database"]
+    for statement, times in self.statements.most_common():
+      lines.append(f"  {times}x {_short(statement)}")
+    return "\n".join(lines)
+
+
+_current: ContextVar[QueryProfile | None] = ContextVar("query_profile", default=None)
+
+
+def _short(statement: str, length: int = 200) -> str:
+  statement = " ".join(statement.split())
+  return statement if len(statement) <= length else statement[:length] + "..."
+
+
+# ============== Engine events ==============
+# Listening on the Engine class covers every engine (app, tests, scripts), the cost
+# outside a profile is one ContextVar lookup per statement.
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  if _current.get() is not None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  profile = _current.get()
+  starts = conn.info.get("query_start")
+  if profile is not None and starts:
+    profile.record(statement, time.perf_counter() - starts.pop())
+
+
+@contextmanager
+def profile_queries():
+  """Profiles the queries run inside the block (an outer block sees those of the inner ones too)"""
+  profile = QueryProfile(parent=_current.get())
+  token = _current.set(profile)
+  try:
+    yield profile
+  finally:
+    _current.reset(token)
+
+
+# ============== Requests ==============
+
+class ProfilerMiddleware:
+  """
+  Pure ASGI, one profile per request:
+  1- Profile the request
+  2- Debug headers (DB_PROFILE_HEADERS=1), added when the response starts
+  3- Log slow requests and repeated statements
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http" or scope["path"] in UNPROFILED_PATHS:
+      return await self.app(scope, receive, send)
+
+    # 1- Profile
+    with profile_queries() as profile:
+
+      # 2- Headers
+      async def send_with_headers(message):
+        if PROFILE_HEADERS and message["type"] == "http.response.start":
+          message["headers"] = list(message.get("headers", [])) + [
+            (b"x-db-queries", str(profile.count).encode()),
+            (b"x-db-time-ms", f"{profile.seconds * 1000:.2f}".encode()),
+          ]
+        await send(message)
+
+      start = time.perf_counter()
+      try:
+        await self.app(scope, receive, send_with_headers)
+      finally:
+        # 3- Logs
+        _log(f"{scope['method']} {scope['path']}", profile, time.perf_counter() - start)
+
+
+def _log(request: str, profile: QueryProfile, seconds: float):
+  if seconds * 1000 >= SLOW_REQUEST_MS:
+    print(f"⚠️ Slow request {request}: {seconds * 1000:.0f} ms, {profile.count} queries ({profile.seconds * 1000:.0f} ms)")
+    for query_seconds, statement in profile.slowest:
+      print(f"   {query_seconds * 1000:.1f} ms  {_short(statement)}")
+
+  for statement, times in profile.repeated():
+    print(f"⚠️ Possible N+1 in {request}: {times}x {_short(statement)}")
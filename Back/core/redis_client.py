@@ -1,15 +1,32 @@
 import redis.asyncio as redis
+import time
 import os
 from dotenv import load_dotenv
 
+from Back.core.metrics import observe_redis
+
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL")
 
 redis_pool = redis.ConnectionPool.from_url(REDIS_URL)
 
+class InstrumentedRedis(redis.Redis):
+  """Times every command for the metrics (pipelines are timed as one EXEC by Redis, not here)"""
+
+  async def execute_command(self, *args, **options):
+    start = time.perf_counter()
+    try:
+      return await super().execute_command(*args, **options)
+    finally:
+      observe_redis(str(args[0]), time.perf_counter() - start)
+
+def get_redis_client():
+  """Client for code that runs outside a request (background tasks, listeners)"""
+  return InstrumentedRedis(connection_pool=redis_pool)
+
 async def get_redis():
-  client = redis.Redis(connection_pool=redis_pool)
+  client = InstrumentedRedis(connection_pool=redis_pool)
   try:
     yield client
   finally:
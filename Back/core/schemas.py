@@ -0,0 +1,70 @@
+"""
+Request / response models of the API.
+
+Responses are written by FastJSONResponse: pydantic-core turns the models
+(and plain dicts, UUIDs, datetimes) into JSON bytes in one pass in Rust,
+without FastAPI's generic jsonable_encoder and json.dumps.
+Routes on the hot path return FastJSONResponse(...) themselves, their
+response_model is only there for validation in tests and the docs.
+"""
+
+import uuid
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+
+  def render(self, content) -> bytes:
+    return to_json(content)
+
+
+""" Requests """
+class CommentCreate(BaseModel):
+  content: str
+
+class UserRegister(BaseModel):
+  username: str
+  password: str
+
+class UserLogin(BaseModel):
+  username: str
+  password: str
+
+
+""" Responses """
+class CommentOut(BaseModel):
+  id: uuid.UUID
+  owner: str
+  content: str
+  created_at: datetime
+
+class ShotOut(BaseModel):
+  id: uuid.UUID
+  caption: str
+  created_at: datetime
+
+  owner: str
+  owner_id: uuid.UUID # For frontend part to check if the user owns the shot
+
+  # None when the owner has no avatar
+  owner_avatar: str | None = None
+  owner_avatar_variants: dict[str, str] | None = None
+
+  like_count: int
+  comment_count: int
+
+  # Latest comments only, comment_count has the total
+  comments: list[CommentOut]
+
+  image_url: str | None
+  image_variants: dict[str, str] | None # {"320": url, "640": url, "1080": url}
+  image_placeholder: str | None
+
+class TokenOut(BaseModel):
+  access_token: str
+  token_type: str
+  username: str
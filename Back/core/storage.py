@@ -1,9 +1,25 @@
 import os
+import io
+import re
+import sys
+import time
+import hashlib
 import shutil
+import asyncio
+from abc import ABC, abstractmethod
 from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from dotenv import load_dotenv
 
+from Back.core.metrics import observe_upload
+
 load_dotenv()
 
 # Configuration
@@ -13,53 +29,404 @@ SECRET_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
 PUBLIC_URL = os.getenv("R2_PUBLIC_URL")
 
-def get_s3_client():
-  """Create a Boto3 client for Cloudflare R2"""
-  if not all([ACCOUNT_ID, ACCESS_KEY, SECRET_KEY]):
-    return None
+# Optional: point the S3 client somewhere else (MinIO, moto server...) instead of R2
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
+# "s3", "local" or "memory". Empty -> s3 if the keys exist, local otherwise
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "")
+
+LOCAL_UPLOAD_DIR = "Back/uploads"
+
+# Local files live in two levels of 256 folders (ab/cd/{key}), urls stay /uploads/{key}
+SHARD_LEVELS = 2
 
-  return boto3.client(
-    service_name="s3",
-    endpoint_url=f"https://{ACCOUNT_ID}.r2.cloudflarestorage.com",
-    aws_access_key_id=ACCESS_KEY,
-    aws_secret_access_key=SECRET_KEY,
-  )
+# Max uploads running at the same time per worker
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "8"))
 
-def save_file(file: UploadFile, unique_name: str) -> str:
+# Files bigger than this are sent in parts
+MULTIPART_THRESHOLD = int(os.getenv("STORAGE_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+
+# Content addressed keys: {sha256}.{ext} and {sha256}_{width}.webp ("avatar_" prefix for avatars)
+# The bytes behind such a key never change -> cached forever by browsers and CDNs
+CONTENT_KEY = re.compile(r"^(?P<base>(?:avatar_)?[0-9a-f]{64})(?:_\d+)?\.[a-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageBackend(ABC):
   """
-  Saves file to Cloudflare R2 if keys exist.
-  Fallback: Saves to local 'uploads' folder.
+  Async interface for where uploaded files live.
+  Every method is safe to await from a request handler (never blocks the event loop).
   """
-  s3_client = get_s3_client()
-
-  # --- STRATEGY 1: CLOUD UPLOAD ---
-  if s3_client and BUCKET_NAME and PUBLIC_URL:
-    try:
-      # Upload the file
-      # ExtraArgs={'ContentType': ...} ensures browser displays it as image, not download
-      s3_client.upload_fileobj(
-        file.file,
-        BUCKET_NAME,
-        unique_name,
-        ExtraArgs={'ContentType': file.content_type}
-      )
-
-      # Return the Public Cloud URL
-      return f"{PUBLIC_URL}/{unique_name}"
-
-    except Exception as e:
-      print(f"⚠️ Cloud Upload Failed: {e}")
-      print("Falling back to local storage...")
+  name = "" # label in the metrics
+
+  def __init__(self):
+    # Bounded concurrency, extra uploads wait their turn instead of piling up threads
+    self._slots = asyncio.Semaphore(STORAGE_MAX_CONCURRENCY)
+
+  async def save(self, fileobj, key: str, content_type: str | None = None) -> str:
+    """Stores the file under `key` and returns its public URL"""
+    async with self._slots:
+      return await self._save(fileobj, key, content_type)
+
+  @abstractmethod
+  async def _save(self, fileobj, key: str, content_type: str | None) -> str:
+    """Writes the file, called inside a concurrency slot"""
+
+  @abstractmethod
+  async def read(self, key: str) -> bytes:
+    """Content of the file stored under `key`"""
+
+  @abstractmethod
+  async def delete(self, key: str):
+    """Removes the file, a missing one is not an error"""
+
+  @abstractmethod
+  def url_for(self, key: str) -> str:
+    """Public URL of `key`"""
+
+
+class S3Storage(StorageBackend):
+  """Cloudflare R2 (or any S3 compatible server) with one long lived client per worker"""
+  name = "s3"
+
+  def __init__(self, bucket: str, public_url: str, endpoint_url: str,
+               access_key: str | None = None, secret_key: str | None = None):
+    super().__init__()
+
+    self.bucket = bucket
+    self.public_url = public_url.rstrip("/")
+
+    # boto3 clients are thread safe, one client = one HTTP connection pool
+    self.client = boto3.client(
+      service_name="s3",
+      endpoint_url=endpoint_url,
+      aws_access_key_id=access_key,
+      aws_secret_access_key=secret_key,
+      config=Config(max_pool_connections=STORAGE_MAX_CONCURRENCY * 2),
+    )
+
+    self.transfer_config = TransferConfig(
+      multipart_threshold=MULTIPART_THRESHOLD,
+      multipart_chunksize=MULTIPART_THRESHOLD,
+      max_concurrency=4,
+    )
+
+  async def _save(self, fileobj, key, content_type):
+    # ExtraArgs={'ContentType': ...} ensures browser displays it as image, not download
+    extra_args = {"ContentType": content_type} if content_type else {}
+    if is_content_addressed(key):
+      extra_args["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+
+    # boto3 is blocking -> run it in a thread, the event loop keeps serving requests
+    await asyncio.to_thread(
+      self.client.upload_fileobj,
+      fileobj,
+      self.bucket,
+      key,
+      ExtraArgs=extra_args,
+      Config=self.transfer_config,
+    )
+    return self.url_for(key)
+
+  async def read(self, key):
+    response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key)
+    return await asyncio.to_thread(response["Body"].read)
+
+  async def delete(self, key):
+    await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+  def url_for(self, key):
+    return f"{self.public_url}/{key}"
+
+
+class LocalStorage(StorageBackend):
+  """Local 'uploads' folder, served by the app under /uploads"""
+  name = "local"
+
+  def __init__(self, directory: str = LOCAL_UPLOAD_DIR, url_prefix: str = "/uploads"):
+    super().__init__()
+    self.directory = directory
+    self.url_prefix = url_prefix
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.directory, shard_of(key), key)
+
+  def _flat_path(self, key: str) -> str:
+    """Where files were written before the sharded layout (until migrate_layout moves them)"""
+    return os.path.join(self.directory, key)
+
+  def _write(self, fileobj, key: str):
+    path = self._path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "wb") as buffer:
+      shutil.copyfileobj(fileobj, buffer)
+
+  async def _save(self, fileobj, key, content_type):
+    # Disk writes happen in a thread so a slow disk doesn't freeze the worker
+    await asyncio.to_thread(self._write, fileobj, key)
+    return self.url_for(key)
+
+  async def read(self, key):
+    def _read():
+      for path in (self._path(key), self._flat_path(key)):
+        try:
+          with open(path, "rb") as f:
+            return f.read()
+        except FileNotFoundError:
+          continue
+
+      raise FileNotFoundError(key)
+
+    return await asyncio.to_thread(_read)
+
+  async def delete(self, key):
+    for path in (self._path(key), self._flat_path(key)):
+      try:
+        await asyncio.to_thread(os.remove, path)
+      except FileNotFoundError:
+        pass
+
+  def url_for(self, key):
+    return f"{self.url_prefix}/{key}"
+
+
+class UploadsStaticFiles(StaticFiles):
+  """
+  The local /uploads folder, same urls whatever the layout on disk:
+  1- /uploads/{key} -> sharded path first, then the flat one (files not migrated yet)
+  2- ?w=640 on a content addressed original -> its precomputed WebP variant (original if there is none)
+  3- Content addressed files: immutable Cache-Control + strong ETag from the hash (same on every server)
+  Ranges and If-None-Match/If-Range come from FileResponse/StaticFiles.
+  """
+
+  async def get_response(self, path: str, scope):
+    # 2- Precomputed variant
+    width = QueryParams(scope["query_string"]).get("w", "")
+    match = CONTENT_KEY.match(path)
+    if width.isdigit() and match and path.removeprefix(match["base"]).startswith("."):
+      try:
+        return await super().get_response(f"{match['base']}_{width}.webp", scope)
+      except StarletteHTTPException as e:
+        if e.status_code != 404:
+          raise
+
+    return await super().get_response(path, scope)
+
+  def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+    # 1- Sharded, flat, sharded again (moved by migrate_layout in between)
+    key = os.path.basename(path)
+    sharded = os.path.join(shard_of(key), key)
+
+    for candidate in (sharded, path, sharded):
+      full_path, stat_result = super().lookup_path(candidate)
+      if stat_result is not None:
+        return full_path, stat_result
+
+    return "", None
+
+  def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+    # 3- Headers set before the conditional check so a 304 carries them too
+    name = os.path.basename(full_path)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{name}"'} if is_content_addressed(name) else None
+
+    response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+    if self.is_not_modified(response.headers, Headers(scope=scope)):
+      return NotModifiedResponse(response.headers)
+    return response
+
+
+class MemoryStorage(StorageBackend):
+  """Keeps files in a dict, for tests"""
+  name = "memory"
+
+  def __init__(self):
+    super().__init__()
+    self.files: dict[str, tuple[bytes, str | None]] = {}
+
+  async def _save(self, fileobj, key, content_type):
+    self.files[key] = (fileobj.read(), content_type)
+    return self.url_for(key)
+
+  async def read(self, key):
+    return self.files[key][0]
+
+  async def delete(self, key):
+    self.files.pop(key, None)
+
+  def url_for(self, key):
+    return f"/memory/{key}"
+
+
+_storage: StorageBackend | None = None
+_local_storage = LocalStorage()
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+  """Picks the backend from the environment"""
+
+  has_cloud_keys = all([ACCOUNT_ID or S3_ENDPOINT_URL, ACCESS_KEY, SECRET_KEY, BUCKET_NAME, PUBLIC_URL])
+
+  if backend == "memory":
+    return MemoryStorage()
+
+  if backend == "s3" or (not backend and has_cloud_keys):
+    return S3Storage(
+      bucket=BUCKET_NAME,
+      public_url=PUBLIC_URL,
+      endpoint_url=S3_ENDPOINT_URL or f"https://{ACCOUNT_ID}.r2.cloudflarestorage.com",
+      access_key=ACCESS_KEY,
+      secret_key=SECRET_KEY,
+    )
+
+  return _local_storage
+
+
+def get_storage() -> StorageBackend:
+  """The storage of this worker (created once, reused by every request)"""
+  global _storage
+
+  if _storage is None:
+    _storage = create_storage()
+
+  return _storage
+
+
+def set_storage(storage: StorageBackend | None):
+  """Swap the backend (tests), None -> back to the environment default"""
+  global _storage
+  _storage = storage
+
+
+def _size_of(fileobj) -> int:
+  position = fileobj.tell()
+  size = fileobj.seek(0, io.SEEK_END)
+  fileobj.seek(position)
+  return size
+
+
+async def _timed_save(storage: StorageBackend, fileobj, unique_name: str, content_type: str | None) -> str:
+  """storage.save + upload duration/bytes in the metrics"""
+  size = _size_of(fileobj)
+  start = time.perf_counter()
+
+  url = await storage.save(fileobj, unique_name, content_type)
+
+  observe_upload(storage.name, size, time.perf_counter() - start)
+  return url
+
+
+async def _save_with_fallback(fileobj, unique_name: str, content_type: str | None) -> str:
+  storage = get_storage()
+
+  # --- STRATEGY 1: CONFIGURED BACKEND (R2 / local / memory) ---
+  try:
+    return await _timed_save(storage, fileobj, unique_name, content_type)
+
+  except Exception as e:
+    if storage is _local_storage:
+      raise
+
+    print(f"⚠️ Cloud Upload Failed: {e}")
+    print("Falling back to local storage...")
 
   # --- STRATEGY 2: LOCAL FALLBACK ---
-  # This runs if keys are missing OR if cloud upload fails
-  os.makedirs("Back/uploads", exist_ok=True)
-  local_path = f"Back/uploads/{unique_name}"
+  # This runs if the cloud upload fails
 
   # Reset file pointer to 0 (crucial if upload_fileobj read some of it!)
-  file.file.seek(0)
+  fileobj.seek(0)
+
+  return await _timed_save(_local_storage, fileobj, unique_name, content_type)
+
+
+async def save_file(file: UploadFile, unique_name: str) -> str:
+  """
+  Saves file to Cloudflare R2 if keys exist.
+  Fallback: Saves to local 'uploads' folder.
+  """
+  return await _save_with_fallback(file.file, unique_name, file.content_type)
+
+
+async def save_bytes(data: bytes, unique_name: str, content_type: str) -> str:
+  """Same as save_file for data already in memory (processed images)"""
+  return await _save_with_fallback(io.BytesIO(data), unique_name, content_type)
+
+
+def is_content_addressed(key: str) -> bool:
+  return CONTENT_KEY.match(key) is not None
+
+
+def shard_of(key: str) -> str:
+  """
+  Folder of a local file: "ab/cd" from a hash, spreads files evenly over 65536 folders.
+  Content addressed keys use their own hash (original and variants end up together),
+  other names the sha256 of the name.
+  """
+  match = CONTENT_KEY.match(key)
+  digest = match["base"].removeprefix("avatar_") if match else hashlib.sha256(key.encode()).hexdigest()
+  return os.path.join(*(digest[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)))
+
+
+def content_base_of(url: str) -> str | None:
+  """Hash part of a content addressed url (original or variant), None for older file names"""
+  for storage in (get_storage(), _local_storage):
+    key = _key_of(storage, url)
+    if key is not None:
+      match = CONTENT_KEY.match(key)
+      return match["base"] if match else None
+
+  return None
+
+
+def _key_of(storage: StorageBackend, url: str) -> str | None:
+  """Back from a saved url to the key of that backend (None if it isn't one of its urls)"""
+  prefix = storage.url_for("")
+  return url[len(prefix):] if url.startswith(prefix) else None
+
+
+async def delete_files(urls: list[str]):
+  """
+  Removes saved files by their url (shot deleted...).
+  Meant to run after the response (BackgroundTasks): failures are only logged.
+  Files can be in the configured backend or in the local fallback.
+  """
+  for url in urls:
+    for storage in (get_storage(), _local_storage):
+      key = _key_of(storage, url)
+      if key is None:
+        continue
+
+      try:
+        await storage.delete(key)
+      except Exception as e:
+        print(f"⚠️ Could not delete {url}: {e}")
+      break
+
+
+def migrate_layout(directory: str = LOCAL_UPLOAD_DIR) -> int:
+  """
+  Moves the flat files of `directory` into their shard folder, returns how many moved.
+  Safe while the app serves them (rename on the same disk, the lookup tries both places)
+  and to run again (files already sharded are left alone).
+  """
+  moved = 0
+  with os.scandir(directory) as entries:
+    for entry in entries:
+      if not entry.is_file() or entry.name.startswith("."): # .gitkeep and co stay
+        continue
+
+      target = os.path.join(directory, shard_of(entry.name), entry.name)
+      os.makedirs(os.path.dirname(target), exist_ok=True)
+      os.replace(entry.path, target)
+      moved += 1
+
+  return moved
+
 
-  with open(local_path, "wb") as buffer:
-    shutil.copyfileobj(file.file, buffer)
+if __name__ == "__main__":
+  # python -m Back.core.storage migrate [directory]
+  if sys.argv[1:2] != ["migrate"]:
+    sys.exit("usage: python -m Back.core.storage migrate [directory]")
 
-  return f"/uploads/{unique_name}"
+  directory = sys.argv[2] if len(sys.argv) > 2 else LOCAL_UPLOAD_DIR
+  print(f"Moved {migrate_layout(directory)} file(s) into the sharded layout of {directory}")
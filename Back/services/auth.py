@@ -1,14 +1,38 @@
 from passlib.context import CryptContext
+from fastapi import HTTPException
 import jwt
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import uuid
 
 import os
 from dotenv import load_dotenv
 
+from Back.core.broadcast import publish
+from Back.services.revocation import BLACKLIST_PREFIX, REVOKED_CHANNEL, might_be_revoked, remember_revoked
+
 load_dotenv()
 
 # Hash config
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cost of one bcrypt hash (2^rounds), hashes with another cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+  schemes=["bcrypt"],
+  deprecated="auto",
+  bcrypt__default_rounds=BCRYPT_ROUNDS,
+  bcrypt__min_rounds=BCRYPT_ROUNDS,
+  bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Hashing pool config
+# bcrypt releases the GIL, so threads run it in parallel without touching the event loop
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+HASH_MAX_QUEUE = int(os.getenv("AUTH_HASH_MAX_QUEUE", "32")) # waiting jobs before answering 503
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_jobs = 0 # running + waiting jobs of this worker
 
 # Secret config
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
@@ -22,34 +46,93 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
   return pwd_context.verify(plain_password, hashed_password)
 
 
+async def _run_in_hash_pool(func, *args):
+  """
+  Runs a bcrypt call in the hashing pool.
+  When the pool is full (login burst) -> fast 503 instead of an ever growing queue.
+  """
+  global _hash_jobs
+
+  if _hash_jobs >= HASH_WORKERS + HASH_MAX_QUEUE:
+    raise HTTPException(
+      status_code=503,
+      detail="Too many logins right now, try again in a moment.",
+      headers={"Retry-After": "1"}
+    )
+
+  _hash_jobs += 1
+  try:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, func, *args)
+  finally:
+    _hash_jobs -= 1
+
+
+async def hash_password_async(password: str) -> str:
+  return await _run_in_hash_pool(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+  """
+  Returns (is_valid, new_hash).
+  new_hash is set when the stored hash uses another cost than AUTH_BCRYPT_ROUNDS,
+  the caller should save it.
+  """
+  return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 def create_access_token(data: dict):
   to_encode = data.copy()
 
   # expire time
   expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-  to_encode.update({"exp": expire})
+  # jti: short unique id of this token, what the blacklist stores instead of the whole token
+  to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
 
   encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
   return encoded_jwt
 
 
-async def is_token_blacklisted(token: str, redis_client) -> bool:
-  """Returns True if the token is found in the Redis blacklist."""
+async def is_token_blacklisted(payload: dict, token: str, redis_client) -> bool:
+  """
+  Returns True if the (decoded) token was logged out.
+
+  1- Token with a jti -> the local filter says "not revoked" for almost every token without Redis,
+     only a "maybe" is checked against the Redis key
+  2- Older token without jti -> blacklisted by its full value
+  """
+  jti = payload.get("jti")
+
+  # 1- By jti
+  if jti:
+    if not might_be_revoked(jti):
+      return False
+    return await redis_client.exists(f"{BLACKLIST_PREFIX}{jti}")
+
+  # 2- Older tokens
   return await redis_client.exists(f"blacklist:token:{token}")
 
 
-async def add_token_to_blacklist(token: str, expiration_timestamp: float, redis_client):
+async def add_token_to_blacklist(payload: dict, token: str, redis_client):
   """
-  Calculates remaining time and adds token to Redis blacklist.
+  Calculates remaining time and adds the token to the Redis blacklist
+  (then tells every worker to add it to its local filter).
   """
 
   current_time = datetime.now(timezone.utc).timestamp()
-  time_left = int(expiration_timestamp - current_time)
-
-  if time_left > 0:
-    # Key: "blacklist:token:{token}"
-    await redis_client.setex(
-      name=f"blacklist:token:{token}",
-      time=time_left,
-      value="blacklisted"
-    )
+  time_left = int(payload.get("exp", 0) - current_time)
+
+  if time_left <= 0:
+    return
+
+  jti = payload.get("jti")
+
+  if jti:
+    # Key: "blacklist:jti:{jti}"
+    await redis_client.setex(name=f"{BLACKLIST_PREFIX}{jti}", time=time_left, value=1)
+
+    remember_revoked(jti)
+    await publish(redis_client, REVOKED_CHANNEL, jti)
+
+  else:
+    # Key: "blacklist:token:{token}" (tokens issued before the jti)
+    await redis_client.setex(name=f"blacklist:token:{token}", time=time_left, value=1)
@@ -0,0 +1,67 @@
+import os
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from Back.core.models import Comment
+from Back.services.pagination import paginate
+
+# Comments embedded with each shot of the feed, the rest is behind GET /shot/{id}/comments
+COMMENT_PREVIEW = int(os.getenv("FEED_COMMENT_PREVIEW", "3"))
+
+
+async def latest_comments(db: AsyncSession, shot_ids: list[uuid.UUID], per_shot: int = COMMENT_PREVIEW) -> dict[uuid.UUID, list[Comment]]:
+  """
+  The latest `per_shot` comments of each shot, in ONE query whatever the number of comments.
+
+  1- Rank the comments of each shot, newest first (row_number() OVER (PARTITION BY shot_id ...))
+  2- Keep rank <= per_shot, with the owner joined
+  3- Group by shot, oldest first (reading order, new comments are added at the end)
+  """
+  if not shot_ids or per_shot <= 0:
+    return {}
+
+  # 1- Rank (uses the (shot_id, created_at, id) index)
+  ranked = (
+    select(
+      Comment.id,
+      func.row_number().over(
+        partition_by=Comment.shot_id,
+        order_by=(Comment.created_at.desc(), Comment.id.desc())
+      ).label("rank")
+    )
+    .where(Comment.shot_id.in_(shot_ids))
+    .subquery()
+  )
+
+  # 2- Keep the top of each shot
+  result = await db.execute(
+    select(Comment)
+    .join(ranked, ranked.c.id == Comment.id)
+    .where(ranked.c.rank <= per_shot)
+    .options(joinedload(Comment.owner))
+    .order_by(Comment.shot_id, Comment.created_at, Comment.id)
+  )
+
+  # 3- Group
+  previews = defaultdict(list)
+  for comment in result.scalars():
+    previews[comment.shot_id].append(comment)
+
+  return previews
+
+
+async def comments_page(db: AsyncSession, shot_id: uuid.UUID, cursor: str | None, limit: int) -> list[Comment]:
+  """Comments of one shot, newest first, keyset paginated like the feed"""
+  query = (
+    select(Comment)
+    .where(Comment.shot_id == shot_id)
+    .options(joinedload(Comment.owner))
+  )
+  query = paginate(query, Comment, cursor, 1, limit)
+
+  result = await db.execute(query)
+  return list(result.scalars())
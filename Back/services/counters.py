@@ -0,0 +1,62 @@
+import asyncio
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Back.core.models import Shot, Like, Comment
+
+async def increment_counter(db: AsyncSession, shot_id, column, amount: int = 1):
+  """
+  Atomic "counter = counter + amount" done by the database itself,
+  so two parallel likes can't overwrite each other.
+  """
+  await db.execute(
+    update(Shot)
+    .where(Shot.id == shot_id)
+    .values({column: column + amount})
+  )
+
+
+async def reconcile_counters(db: AsyncSession) -> int:
+  """
+  Recounts like_count and comment_count from the likes/comments tables.
+  Used as a backfill for old rows and to repair any drift.
+  Returns the number of shots that were fixed.
+  """
+
+  # 1- Real numbers from the child tables
+  real_likes = (
+    select(func.count(Like.id))
+    .where(Like.shot_id == Shot.id)
+    .scalar_subquery()
+  )
+  real_comments = (
+    select(func.count(Comment.id))
+    .where(Comment.shot_id == Shot.id)
+    .scalar_subquery()
+  )
+
+  # 2- Only touch the rows that drifted
+  result = await db.execute(
+    update(Shot)
+    .where((Shot.like_count != real_likes) | (Shot.comment_count != real_comments))
+    .values(like_count=real_likes, comment_count=real_comments)
+    .execution_options(synchronize_session=False)
+  )
+  await db.commit()
+
+  return result.rowcount
+
+
+async def main():
+  from Back.core.database import get_async_session
+
+  async with get_async_session() as db:
+    fixed = await reconcile_counters(db)
+
+  print(f"Reconciled counters for {fixed} shot(s)")
+
+
+if __name__ == "__main__":
+  # python -m Back.services.counters
+  asyncio.run(main())
@@ -0,0 +1,219 @@
+import time
+import asyncio
+import random
+import hashlib
+from email.utils import formatdate
+
+from pydantic_core import to_json, from_json
+from redis.exceptions import RedisError, NoScriptError
+
+from Back.core.database import READ_STICKY_SECONDS
+from Back.core.metrics import FEED_CACHE
+
+# Config
+FEED_VERSION_KEY = "feed:version"
+FEED_PAGE_TTL = 60 # seconds, old versions just expire
+FEED_LOCK_TTL_MS = 5000 # max time one worker is allowed to rebuild a page
+FEED_LOCK_WAIT = 0.05 # seconds between polls while another worker rebuilds
+FEED_LOCK_POLLS = 20
+
+# max(now in µs, current + 1): always grows, and starts from the clock again if Redis lost the key,
+# so an old ETag can't match a new feed. Doubles as the Last-Modified date.
+BUMP_VERSION_LUA = """
+local now = tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if now <= current then
+  now = current + 1
+end
+now = string.format('%.0f', now) -- Lua numbers are doubles, µs still fit exactly
+redis.call('SET', KEYS[1], now)
+return now
+"""
+_BUMP_VERSION_SHA = hashlib.sha1(BUMP_VERSION_LUA.encode()).hexdigest()
+
+# Cache hits/misses/rebuilds/errors, in /metrics (summed over the workers)
+_hits, _misses, _rebuilds, _errors = (FEED_CACHE.labels(result) for result in ("hit", "miss", "rebuild", "error"))
+
+# In-flight rebuilds of this worker: page key -> Future
+_in_flight: dict[str, asyncio.Future] = {}
+
+
+async def _bump(redis_client):
+  """EVALSHA (script cached by Redis), EVAL the first time"""
+  now = time.time_ns() // 1000
+  try:
+    return await redis_client.evalsha(_BUMP_VERSION_SHA, 1, FEED_VERSION_KEY, now)
+  except NoScriptError:
+    return await redis_client.eval(BUMP_VERSION_LUA, 1, FEED_VERSION_KEY, now)
+
+
+def _page_key(version: int, cursor: str | None, page: int, limit: int) -> str:
+  position = f"c:{cursor}" if cursor else f"p:{page}"
+  return f"feed:page:v{version}:{position}:{limit}"
+
+
+async def bump_feed_version(redis_client):
+  """
+  Called after every write that changes the feed (post, like, comment, delete, avatar).
+  All cached pages become unreachable at once, they expire on their own.
+  """
+  try:
+    await _bump(redis_client)
+  except RedisError as e:
+    _errors.inc()
+    print(f"⚠️ Feed cache invalidation failed: {e}")
+
+
+async def feed_version(redis_client) -> int | None:
+  """Current feed version (set on first use), None if Redis is down"""
+  try:
+    version = await redis_client.get(FEED_VERSION_KEY)
+    if version is None:
+      version = await _bump(redis_client)
+    return int(version)
+
+  except RedisError as e:
+    _errors.inc()
+    print(f"⚠️ Feed version read failed: {e}")
+    return None
+
+
+async def get_feed_page(redis_client, cursor: str | None, page: int, limit: int, build, version: int | None = None, store: bool = True):
+  """
+  Returns a feed page from Redis, or builds it with `build()` on a miss.
+
+  1- Read the current feed version (unless the route already did, for its ETag)
+  2- Try the cached page for that version
+  3- Miss: only one rebuild per page per worker (single-flight)
+  4- Across workers: only the lock holder runs the query, others wait for its result
+  store=False: the page is built but not cached (read from a replica that may be behind)
+  If Redis is down the feed is still served straight from the database.
+  """
+
+  try:
+    # 1- Current version
+    if version is None:
+      version = int(await redis_client.get(FEED_VERSION_KEY) or 0)
+    key = _page_key(version, cursor, page, limit)
+
+    # 2- Cached page
+    cached = await redis_client.get(key)
+    if cached is not None:
+      _hits.inc()
+      return from_json(cached)
+
+  except RedisError as e:
+    _errors.inc()
+    print(f"⚠️ Feed cache read failed: {e}")
+    return await build()
+
+  _misses.inc()
+
+  # 3- Single-flight inside this worker (replica builds apart, a primary reader must not get them)
+  flight = key if store else f"{key}:unstored"
+  if flight in _in_flight:
+    try:
+      return await asyncio.shield(_in_flight[flight])
+    except asyncio.CancelledError:
+      if asyncio.current_task().cancelling():
+        raise # this request went away
+
+      # only the leader's request went away (its Redis lock may still be held): query here
+      return await build()
+
+  future = asyncio.get_running_loop().create_future()
+  _in_flight[flight] = future
+
+  try:
+    data = await _rebuild(redis_client, key, build) if store else await build()
+    future.set_result(data)
+    return data
+
+  except Exception as e:
+    future.set_exception(e)
+    future.exception() # mark as retrieved when nobody else was waiting
+    raise
+
+  except BaseException:
+    # cancelled request, its waiters build the page themselves
+    future.cancel()
+    raise
+
+  finally:
+    del _in_flight[flight]
+
+
+def replica_may_lag(version: int) -> bool:
+  """
+  The last write was less than READ_STICKY_SECONDS ago (the version is its time):
+  a replica may not have it yet, what is read from it must not be cached or get an ETag
+  """
+  return time.time() - version / 1e6 < READ_STICKY_SECONDS
+
+
+async def _rebuild(redis_client, key: str, build):
+  """Stampede protection between workers with a short Redis lock"""
+
+  lock_key = f"{key}:lock"
+
+  try:
+    got_lock = await redis_client.set(lock_key, "1", nx=True, px=FEED_LOCK_TTL_MS)
+
+    # 4- Someone else is rebuilding, wait for the result instead of hitting the db
+    if not got_lock:
+      for _ in range(FEED_LOCK_POLLS):
+        await asyncio.sleep(FEED_LOCK_WAIT)
+        cached = await redis_client.get(key)
+        if cached is not None:
+          return from_json(cached)
+
+  except RedisError as e:
+    _errors.inc()
+    print(f"⚠️ Feed cache lock failed: {e}")
+    return await build()
+
+  # Lock holder (or the other worker took too long)
+  _rebuilds.inc()
+  data = await build()
+
+  try:
+    # small jitter so pages written together don't expire together
+    ttl = FEED_PAGE_TTL + random.randint(0, 10)
+    await redis_client.set(key, to_json(data), ex=ttl) # response models or plain dicts
+    await redis_client.delete(lock_key)
+
+  except RedisError as e:
+    _errors.inc()
+    print(f"⚠️ Feed cache write failed: {e}")
+
+  return data
+
+
+# ============== Conditional GET ==============
+# Every write that changes a feed response bumps the version, so it is a validator for
+# /shots and /myshots: an unchanged poll is answered 304 after one GET, no query, no body.
+
+def feed_validators(version: int, *scope) -> dict:
+  """ETag (+ what else must make it differ, e.g. the user of /myshots) and Last-Modified"""
+  tag = f"{version}:{':'.join(str(part) for part in scope)}"
+  digest = hashlib.blake2b(tag.encode(), digest_size=8).hexdigest()
+
+  return {
+    "ETag": f'W/"{digest}"', # weak: same data, not promised byte for byte
+    "Last-Modified": formatdate(version / 1e6, usegmt=True),
+    "Cache-Control": "private, no-cache", # keep it, but ask every time
+  }
+
+
+def is_not_modified(if_none_match: str | None, etag: str) -> bool:
+  """If-None-Match check (weak comparison, list of tags or *)"""
+  if not if_none_match:
+    return False
+
+  if if_none_match.strip() == "*":
+    return True
+
+  def opaque(tag: str) -> str:
+    return tag.strip().removeprefix("W/")
+
+  return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
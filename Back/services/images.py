@@ -0,0 +1,146 @@
+import io
+import os
+import base64
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from Back.core.storage import save_bytes
+
+# Widths generated for every upload (never upscaled)
+SHOT_WIDTHS = (320, 640, 1080)
+AVATAR_WIDTHS = (96, 256)
+
+PLACEHOLDER_WIDTH = 16 # blurred preview, inlined in the JSON
+WEBP_QUALITY = 80
+
+# Processes resizing images (CPU heavy, kept off the event loop)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class InvalidImage(ValueError):
+  pass
+
+
+def _to_webp(img: Image.Image, quality: int = WEBP_QUALITY) -> bytes:
+  buffer = io.BytesIO()
+  # No exif= argument -> metadata (GPS, camera...) is not copied
+  img.save(buffer, format="WEBP", quality=quality, method=4)
+  return buffer.getvalue()
+
+
+def _clean_original(img: Image.Image, image_format: str) -> bytes:
+  """
+  Full size copy in the uploaded format, without the metadata (EXIF/GPS, XMP, text chunks).
+  The rotation is already applied to the pixels, only the color profile is kept.
+  """
+  buffer = io.BytesIO()
+  options = {"icc_profile": img.info.get("icc_profile")} if img.info.get("icc_profile") else {}
+
+  if image_format == "JPEG":
+    img.convert("RGB").save(buffer, format="JPEG", quality=95, **options)
+  elif image_format == "PNG":
+    img.save(buffer, format="PNG", optimize=True, **options)
+  else:
+    img.save(buffer, format="WEBP", quality=95, method=4, **options)
+
+  return buffer.getvalue()
+
+
+def _resize(img: Image.Image, width: int) -> Image.Image:
+  if img.width <= width:
+    return img.copy()
+
+  height = max(1, round(img.height * width / img.width))
+  return img.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def process_image(data: bytes, widths: tuple[int, ...] = SHOT_WIDTHS) -> dict:
+  """
+  Runs inside the process pool.
+
+  1- Decode and apply the EXIF rotation (phones store photos sideways)
+  2- Original re-encoded without its metadata (the uploaded bytes are never stored)
+  3- One WebP per width, EXIF stripped
+  4- Tiny placeholder as a data URI
+
+  Returns {"original": bytes, "variants": {width: bytes}, "placeholder": "data:image/webp;base64,..."}
+  """
+
+  # 1- Decode
+  try:
+    img = Image.open(io.BytesIO(data))
+    image_format = img.format
+    img.load()
+    img = ImageOps.exif_transpose(img)
+  except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+    raise InvalidImage(str(e))
+
+  if img.mode not in ("RGB", "RGBA"):
+    img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+  # 2- Original
+  original = _clean_original(img, image_format)
+
+  # 3- Variants (a small original gives the same width twice -> only keep one)
+  variants = {}
+  seen_widths = set()
+  for width in widths:
+    resized = _resize(img, width)
+    if resized.width in seen_widths:
+      continue
+
+    seen_widths.add(resized.width)
+    variants[width] = _to_webp(resized)
+
+  # 4- Placeholder
+  placeholder = _to_webp(_resize(img, PLACEHOLDER_WIDTH), quality=30)
+
+  return {
+    "original": original,
+    "variants": variants,
+    "placeholder": "data:image/webp;base64," + base64.b64encode(placeholder).decode(),
+  }
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+  global _pool
+
+  if _pool is None:
+    # fork() from a threaded server can deadlock -> fresh processes instead
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context(start_method))
+
+  return _pool
+
+
+def shutdown_image_pool():
+  global _pool
+
+  if _pool is not None:
+    _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+async def process_image_async(data: bytes, widths: tuple[int, ...] = SHOT_WIDTHS) -> dict:
+  """Same as process_image, without blocking the event loop"""
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(get_image_pool(), process_image, data, widths)
+
+
+async def save_variants(processed: dict, base_name: str) -> dict[str, str]:
+  """
+  Uploads the WebP variants next to the original (in parallel).
+  Returns {"320": url, ...}, string keys so it round-trips through JSON.
+  """
+  widths = list(processed["variants"])
+  urls = await asyncio.gather(*[
+    save_bytes(processed["variants"][width], f"{base_name}_{width}.webp", "image/webp")
+    for width in widths
+  ])
+
+  return {str(width): url for width, url in zip(widths, urls)}
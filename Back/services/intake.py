@@ -0,0 +1,227 @@
+"""
+Streaming intake for the image forms (POST /post, POST /profile/avatar).
+
+The routes read the body themselves, after auth and rate limits ran (a form parameter
+would make FastAPI read and spool the whole upload before anything else):
+  - the size limit is enforced while reading, an oversized upload stops at the limit
+  - the real format comes from the first bytes, not from the client's content type or file name
+  - sha256 is computed on the way
+  - the image is kept once in memory, the same bytes go to the image pool and to the storage
+"""
+
+import os
+import hashlib
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, MultipartParseError, parse_options_header
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(2 * 1024 * 1024)))
+
+FIELD_MAX_BYTES = 4096 # text fields (caption)
+FORM_OVERHEAD = 16 * 1024 # boundaries, part headers and text fields on top of the file
+
+SNIFF_BYTES = 12 # enough for every signature below
+
+
+def sniff_image(head: bytes) -> tuple[str, str] | None:
+  """(extension, content type) from the magic bytes, None if it isn't an allowed image"""
+  if head.startswith(b"\xff\xd8\xff"):
+    return "jpg", "image/jpeg"
+
+  if head.startswith(b"\x89PNG\r\n\x1a\n"):
+    return "png", "image/png"
+
+  if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+    return "webp", "image/webp"
+
+  return None
+
+
+def _too_large(max_bytes: int, what: str = "File") -> HTTPException:
+  size = f"{max_bytes // (1024 * 1024)} MB" if max_bytes >= 1024 * 1024 else f"{max_bytes // 1024} KB"
+  return HTTPException(status_code=413, detail=f"{what} too large, the limit is {size}.")
+
+
+class Upload:
+  """An uploaded image, fed chunk by chunk"""
+
+  def __init__(self, max_bytes: int):
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.extension: str | None = None
+    self.content_type: str | None = None
+    self.data = b""
+
+    self._head = b""
+    self._chunks: list[bytes] = []
+    self._hash = hashlib.sha256()
+
+  def feed(self, chunk: bytes):
+    # 1- Size, before keeping anything
+    self.size += len(chunk)
+    if self.size > self.max_bytes:
+      raise _too_large(self.max_bytes)
+
+    # 2- Format, as soon as the first bytes are there
+    if self.content_type is None:
+      self._head += chunk[:SNIFF_BYTES - len(self._head)]
+      if len(self._head) >= SNIFF_BYTES:
+        self._sniff()
+
+    # 3- Hash + bytes
+    self._hash.update(chunk)
+    self._chunks.append(chunk)
+
+  def _sniff(self):
+    kind = sniff_image(self._head)
+    if kind is None:
+      raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WEBP images are allowed.")
+
+    self.extension, self.content_type = kind
+
+  def finish(self):
+    if self.content_type is None: # smaller than SNIFF_BYTES
+      self._sniff()
+
+    self.data = b"".join(self._chunks)
+    self._chunks = []
+
+  @property
+  def sha256(self) -> str:
+    return self._hash.hexdigest()
+
+
+class _MultipartForm:
+  """python-multipart callbacks: text fields in a dict, `file_field` through an Upload"""
+
+  def __init__(self, file_field: str, max_bytes: int):
+    self.file_field = file_field
+    self.max_bytes = max_bytes
+
+    self.fields: dict[str, str] = {}
+    self.upload: Upload | None = None
+
+    self._header_field = b""
+    self._header_value = b""
+    self._headers: dict[bytes, bytes] = {}
+    self._part = None # Upload, bytearray (text field) or None (ignored part)
+    self._name = ""
+
+  def callbacks(self) -> dict:
+    return {
+      "on_part_begin": self.on_part_begin,
+      "on_header_field": self.on_header_field,
+      "on_header_value": self.on_header_value,
+      "on_header_end": self.on_header_end,
+      "on_headers_finished": self.on_headers_finished,
+      "on_part_data": self.on_part_data,
+      "on_part_end": self.on_part_end,
+    }
+
+  def on_part_begin(self):
+    self._headers = {}
+
+  def on_header_field(self, data: bytes, start: int, end: int):
+    self._header_field += data[start:end]
+
+  def on_header_value(self, data: bytes, start: int, end: int):
+    self._header_value += data[start:end]
+
+  def on_header_end(self):
+    self._headers[self._header_field.lower()] = self._header_value
+    self._header_field = self._header_value = b""
+
+  def on_headers_finished(self):
+    _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+    self._name = options.get(b"name", b"").decode("latin-1")
+
+    if b"filename" not in options:
+      self._part = bytearray()
+    elif self._name == self.file_field and self.upload is None:
+      self._part = self.upload = Upload(self.max_bytes)
+    else:
+      self._part = None # other files are read past, not kept
+
+  def on_part_data(self, data: bytes, start: int, end: int):
+    if isinstance(self._part, Upload):
+      self._part.feed(data[start:end])
+
+    elif self._part is not None:
+      self._part += data[start:end]
+      if len(self._part) > FIELD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"The field '{self._name}' is too long.")
+
+  def on_part_end(self):
+    if isinstance(self._part, Upload):
+      if self._part.size == 0: # browsers send an empty part when no file was picked
+        self.upload = None
+      else:
+        self._part.finish()
+
+    elif self._part is not None:
+      self.fields[self._name] = self._part.decode("utf-8", errors="replace")
+
+
+async def read_form(request: Request, file_field: str, max_bytes: int = UPLOAD_MAX_BYTES) -> tuple[dict[str, str], Upload | None]:
+  """
+  Text fields + the image in `file_field` (None if not sent).
+  1- Declared size over the limit -> 413 before reading anything
+  2- Urlencoded form (no file possible): small body read at once
+  3- Multipart: parsed as it arrives, stops at the limit even without Content-Length
+  """
+  content_type, params = parse_options_header(request.headers.get("content-type", ""))
+  urlencoded = content_type == b"application/x-www-form-urlencoded" # text fields only
+  limit = FORM_OVERHEAD if urlencoded else max_bytes + FORM_OVERHEAD
+
+  # 1- Declared size
+  declared = request.headers.get("content-length", "")
+  if declared.isdigit() and int(declared) > limit:
+    raise _too_large(FORM_OVERHEAD, "Form") if urlencoded else _too_large(max_bytes)
+
+  # 2- Urlencoded
+  if urlencoded:
+    chunks, received = [], 0
+    async for chunk in request.stream():
+      chunks.append(chunk)
+      received += len(chunk)
+      if received > FORM_OVERHEAD:
+        raise _too_large(FORM_OVERHEAD, "Form")
+
+    body = b"".join(chunks)
+    return dict(parse_qsl(body.decode("utf-8", errors="replace"), keep_blank_values=True)), None
+
+  # 3- Multipart
+  if content_type != b"multipart/form-data" or b"boundary" not in params:
+    raise HTTPException(status_code=400, detail="Expected a form (multipart/form-data).")
+
+  form = _MultipartForm(file_field, max_bytes)
+  parser = MultipartParser(params[b"boundary"], form.callbacks())
+
+  received = 0
+  try:
+    async for chunk in request.stream():
+      received += len(chunk)
+      if received > limit:
+        raise _too_large(max_bytes)
+
+      parser.write(chunk)
+
+    parser.finalize()
+
+  except MultipartParseError:
+    raise HTTPException(status_code=400, detail="Malformed form data.")
+
+  return form.fields, form.upload
+
+
+def form_openapi(file_field: str, *text_fields: str, file_required: bool = False) -> dict:
+  """requestBody for the docs, FastAPI can't see fields the route reads itself"""
+  properties = {name: {"type": "string"} for name in text_fields}
+  properties[file_field] = {"type": "string", "format": "binary"}
+  required = [*text_fields, file_field] if file_required else list(text_fields)
+
+  return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "properties": properties, "required": required,
+  }}}}}
@@ -0,0 +1,142 @@
+"""
+Likes and comments written in as few statements as possible.
+
+The shot check and the duplicate check are done by the INSERT itself:
+  INSERT INTO likes SELECT ... FROM shots WHERE shots.id = :shot_id   -> nothing inserted if the shot doesn't exist
+  ON CONFLICT (user_id, shot_id) DO NOTHING                           -> nothing inserted if already liked
+  RETURNING ...                                                       -> tells which case happened
+
+Postgres: the insert, the shot counter and the user's last_*_at are ONE statement (data modifying CTEs).
+SQLite: no DML in CTEs, so the same three statements run one after the other (in process, no network).
+
+The caller only runs shot_exists() when nothing was written, to pick 404 or 400.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update, literal, exists, Uuid, String, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from Back.core.models import User, Shot, Like, Comment
+from Back.services.counters import increment_counter
+
+
+def _insert_for(db: AsyncSession):
+  """INSERT construct of the session's dialect (both have ON CONFLICT + RETURNING)"""
+  if db.get_bind().dialect.name == "postgresql":
+    return postgresql.insert
+  return sqlite.insert
+
+
+def _now() -> datetime:
+  return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def shot_exists(db: AsyncSession, shot_id: uuid.UUID) -> bool:
+  return bool(await db.scalar(select(exists().where(Shot.id == shot_id))))
+
+
+def _single_statement(new_row, user_id: uuid.UUID, counter, last_act: str, now: datetime):
+  """
+  Postgres only:
+    WITH inserted AS (INSERT ... RETURNING shot_id),
+         counted AS (UPDATE shots SET counter = counter + 1 WHERE id IN inserted RETURNING id)
+    UPDATE users SET last_act = now WHERE id = :user_id AND EXISTS counted RETURNING id
+  """
+  inserted = new_row.cte("inserted")
+  counted = (
+    update(Shot)
+    .where(Shot.id.in_(select(inserted.c.shot_id)))
+    .values({counter: counter + 1})
+    .returning(Shot.id)
+    .cte("counted")
+  )
+
+  return (
+    update(User)
+    .where(User.id == user_id, select(counted.c.id).exists())
+    .values({last_act: now})
+    .returning(User.id)
+    .execution_options(synchronize_session=False)
+  )
+
+
+async def _write(db: AsyncSession, user: User, new_row, counter, last_act: str) -> bool:
+  """
+  Runs the INSERT ... RETURNING, then counts it on the shot and stamps the user.
+  Returns True if the row was inserted.
+  """
+  now = _now()
+
+  # 1- Postgres: everything in one statement
+  if db.get_bind().dialect.name == "postgresql":
+    stamped = await db.scalar(_single_statement(new_row, user.id, counter, last_act, now))
+    written = stamped is not None
+
+  # 2- SQLite: same statements, one by one
+  else:
+    shot_id = await db.scalar(new_row)
+    written = shot_id is not None
+
+    if written:
+      await increment_counter(db, shot_id, counter)
+      await db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values({last_act: now})
+        .execution_options(synchronize_session=False)
+      )
+
+  # 3- Keep the loaded user in sync without another UPDATE on flush
+  if written:
+    set_committed_value(user, last_act, now)
+
+  return written
+
+
+def like_statement(insert, user_id: uuid.UUID, shot_id: uuid.UUID):
+  """INSERT INTO likes SELECT ... FROM shots WHERE id = :shot_id ON CONFLICT DO NOTHING RETURNING shot_id"""
+  return (
+    insert(Like)
+    .from_select(
+      ["id", "user_id", "shot_id"],
+      select(literal(uuid.uuid4(), Uuid), literal(user_id, Uuid), Shot.id).where(Shot.id == shot_id)
+    )
+    .on_conflict_do_nothing(index_elements=["user_id", "shot_id"])
+    .returning(Like.shot_id)
+  )
+
+
+def comment_statement(insert, user_id: uuid.UUID, shot_id: uuid.UUID, content: str):
+  """INSERT INTO comments SELECT ... FROM shots WHERE id = :shot_id RETURNING shot_id"""
+  return (
+    insert(Comment)
+    .from_select(
+      ["id", "content", "created_at", "user_id", "shot_id"],
+      select(
+        literal(uuid.uuid4(), Uuid), literal(content, String), literal(_now(), DateTime), literal(user_id, Uuid), Shot.id
+      ).where(Shot.id == shot_id)
+    )
+    .returning(Comment.shot_id)
+  )
+
+
+async def add_like(db: AsyncSession, user: User, shot_id: uuid.UUID) -> bool:
+  """
+  Likes the shot, counts it and sets user.last_like_at.
+  Returns False when nothing was written (no such shot, or already liked).
+  """
+  new_like = like_statement(_insert_for(db), user.id, shot_id)
+  return await _write(db, user, new_like, Shot.like_count, "last_like_at")
+
+
+async def add_comment(db: AsyncSession, user: User, shot_id: uuid.UUID, content: str) -> bool:
+  """
+  Comments on the shot, counts it and sets user.last_comment_at.
+  Returns False when the shot doesn't exist.
+  """
+  new_comment = comment_statement(_insert_for(db), user.id, shot_id, content)
+  return await _write(db, user, new_comment, Shot.comment_count, "last_comment_at")
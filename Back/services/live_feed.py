@@ -0,0 +1,208 @@
+"""
+Live feed: GET /shots/stream pushes what changes in the feed (Server-Sent Events) instead of
+clients polling GET /shots.
+
+  publish_event()     XADD to the "feed:events" stream + PUBLISH on "feed:live", in one script
+                      (every worker sees the events in stream order)
+  each worker         one pub/sub listener (broadcast), fanned out to its own connections
+  Last-Event-ID       the missed events are replayed from the stream (last SSE_HISTORY kept),
+                      older than that -> a "reset" event, the client refetches /shots
+
+Events (data is JSON): shot_created, shot_deleted, shot_liked, comment_added.
+Each connection has a bounded queue: a client that can't keep up is disconnected, its
+EventSource reconnects with Last-Event-ID and catches up from the stream.
+"""
+
+import os
+import asyncio
+import hashlib
+
+from pydantic_core import to_json
+from redis.exceptions import RedisError, NoScriptError
+
+from Back.core.broadcast import on_message, on_connected
+
+FEED_EVENTS_STREAM = "feed:events"
+FEED_EVENTS_CHANNEL = "feed:live"
+
+SSE_HISTORY = int(os.getenv("SSE_HISTORY", "1000")) # events kept for Last-Event-ID resumes
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15")) # keeps proxies from closing idle streams
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100")) # events buffered per connection
+SSE_RETRY_MS = 3000 # EventSource reconnect delay
+
+PUBLISH_EVENT_LUA = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[2], 'data', ARGV[3])
+redis.call('PUBLISH', KEYS[2], id .. ' ' .. ARGV[2] .. ' ' .. ARGV[3])
+return id
+"""
+_PUBLISH_EVENT_SHA = hashlib.sha1(PUBLISH_EVENT_LUA.encode()).hexdigest()
+
+Event = tuple[str, str, str] # (stream id, event name, JSON data)
+
+
+def _text(value) -> str:
+  return value.decode() if isinstance(value, bytes) else value
+
+
+def _id_key(event_id: str) -> tuple[int, int]:
+  """Stream ids ("ms-seq") in order, ValueError if it isn't one"""
+  ms, _, seq = event_id.partition("-")
+  return int(ms), int(seq or 0)
+
+
+""" PUBLISH """
+
+async def publish_event(redis_client, event: str, data: dict):
+  """Called after the commit of a feed write, a lost event is only logged (clients resync on reset)"""
+  args = (2, FEED_EVENTS_STREAM, FEED_EVENTS_CHANNEL, SSE_HISTORY, event, to_json(data).decode())
+
+  try:
+    try:
+      await redis_client.evalsha(_PUBLISH_EVENT_SHA, *args)
+    except NoScriptError:
+      await redis_client.eval(PUBLISH_EVENT_LUA, *args)
+  except RedisError as e:
+    print(f"⚠️ Live feed event {event} not published: {e}")
+
+
+""" FAN OUT (per worker) """
+
+class _Subscriber:
+  """One SSE connection: bounded queue, stops taking events once full"""
+
+  def __init__(self):
+    self.queue: asyncio.Queue[Event] = asyncio.Queue(SSE_QUEUE_SIZE)
+    self.overflowed = False
+
+  def offer(self, event: Event):
+    if self.overflowed:
+      return
+
+    try:
+      self.queue.put_nowait(event)
+    except asyncio.QueueFull:
+      self.overflowed = True # the stream ends after what is queued, the client resumes from there
+
+
+_subscribers: set[_Subscriber] = set()
+_last_id: str | None = None # last event this worker received, to catch up after a pub/sub reconnect
+
+
+def _fan_out(event: Event):
+  global _last_id
+  _last_id = event[0]
+
+  for subscriber in list(_subscribers):
+    subscriber.offer(event)
+
+
+@on_message(FEED_EVENTS_CHANNEL)
+def _on_event(message: str):
+  event_id, event, data = message.split(" ", 2)
+  _fan_out((event_id, event, data))
+
+
+@on_connected
+async def _catch_up(redis_client):
+  """Events published while the listener was away (connections skip the ones they already have)"""
+  if _last_id is None or not _subscribers:
+    return
+
+  for event in await _events_after(redis_client, _last_id):
+    _fan_out(event)
+
+
+""" STREAM """
+
+async def _events_after(redis_client, event_id: str) -> list[Event]:
+  entries = await redis_client.xrange(FEED_EVENTS_STREAM, min=f"({event_id}", count=SSE_HISTORY)
+  return [
+    (_text(entry_id), _text(fields.get(b"event", fields.get("event"))), _text(fields.get(b"data", fields.get("data"))))
+    for entry_id, fields in entries
+  ]
+
+
+async def _replay(redis_client, last_event_id: str) -> list[Event] | None:
+  """
+  Events after `last_event_id`, None if they can't all be replayed:
+  1- Not a stream id -> None
+  2- Trimmed stream that starts after it -> some were dropped, None
+  """
+  try:
+    _id_key(last_event_id)
+  except ValueError:
+    return None
+
+  oldest = await redis_client.xrange(FEED_EVENTS_STREAM, count=1)
+  if oldest and _id_key(_text(oldest[0][0])) > _id_key(last_event_id) and await redis_client.xlen(FEED_EVENTS_STREAM) >= SSE_HISTORY:
+    return None
+
+  return await _events_after(redis_client, last_event_id)
+
+
+async def _latest_id(redis_client) -> str:
+  latest = await redis_client.xrevrange(FEED_EVENTS_STREAM, count=1)
+  return _text(latest[0][0]) if latest else "0-0"
+
+
+def _format(event: Event) -> str:
+  event_id, name, data = event
+  return f"id: {event_id}\nevent: {name}\ndata: {data}\n\n"
+
+
+async def event_stream(redis_client, last_event_id: str | None = None):
+  """
+  Body of GET /shots/stream:
+  1- Subscribed before the replay, so nothing published in between is missed
+  2- Replay after Last-Event-ID (or reset if too old)
+  3- Live events, without the ones the replay already sent
+  4- Heartbeat comment when idle, ends once a slow client overflowed its queue
+  """
+  subscriber = _Subscriber()
+  _subscribers.add(subscriber)
+  last = None
+
+  try:
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    # 2- Replay
+    if last_event_id:
+      try:
+        missed = await _replay(redis_client, last_event_id)
+        if missed is None:
+          reset = (await _latest_id(redis_client), "reset", "{}")
+          last = _id_key(reset[0])
+          yield _format(reset)
+        else:
+          for event in missed:
+            last = _id_key(event[0])
+            yield _format(event)
+      except RedisError as e:
+        print(f"⚠️ Live feed replay failed: {e}")
+        yield _format(("", "reset", "{}"))
+
+    # 3- Live
+    while True:
+      if subscriber.overflowed and subscriber.queue.empty():
+        return
+
+      try:
+        event = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT_SECONDS)
+      except TimeoutError:
+        # 4- Heartbeat
+        yield ": ping\n\n"
+        continue
+
+      if last is not None and _id_key(event[0]) <= last:
+        continue
+
+      last = _id_key(event[0])
+      yield _format(event)
+
+  finally:
+    _subscribers.discard(subscriber)
+
+
+def connections() -> int:
+  """Open streams on this worker"""
+  return len(_subscribers)
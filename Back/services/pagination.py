@@ -0,0 +1,57 @@
+import base64
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+def encode_cursor(created_at: datetime, item_id: uuid.UUID) -> str:
+  """
+  Builds an opaque cursor from the (created_at, id) of the last item on a page.
+  The client sends it back as-is to get the next page.
+  """
+  raw = f"{created_at.isoformat()}|{item_id.hex}"
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+  """
+  Reverse of encode_cursor.
+  Raises 400 if the cursor was tampered with or is not ours.
+  """
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    created_at, item_id = raw.split("|")
+    return datetime.fromisoformat(created_at), uuid.UUID(item_id)
+
+  except (ValueError, UnicodeDecodeError):
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, model, cursor: str | None, page: int, limit: int):
+  """
+  Applies keyset pagination on (created_at, id) newest first.
+
+  1- With a cursor: seek past the last seen row -> page N costs the same as page 1
+  2- Without a cursor: old "page" offset (kept for old clients)
+  """
+  query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+
+  # 1- Keyset path
+  if cursor:
+    created_at, item_id = decode_cursor(cursor)
+    return query.where(tuple_(model.created_at, model.id) < tuple_(created_at, item_id))
+
+  # 2- Compatibility path
+  # page 1 -> skip 0 || page 2 -> skip 10 || page 3 -> skip 20 || etc...
+  return query.offset((page - 1) * limit)
+
+
+def next_cursor(items: list, limit: int) -> str | None:
+  """Returns the cursor of the next page, None when this was the last one"""
+  if not items or len(items) < limit:
+    return None
+
+  last = items[-1]
+  return encode_cursor(last.created_at, last.id)
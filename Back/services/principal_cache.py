@@ -0,0 +1,78 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from Back.core.models import User
+from Back.core.broadcast import on_message, publish
+
+# Config
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30")) # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+
+INVALIDATE_CHANNEL = "principal:invalidate"
+
+# user id -> (expires_at, column values of the users row)
+_cache: OrderedDict[uuid.UUID, tuple[float, dict]] = OrderedDict()
+
+
+def _columns(user: User) -> dict:
+  return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def cache_principal(user: User):
+  """Remembers the users row after it was loaded from the database"""
+  _cache[user.id] = (time.monotonic() + PRINCIPAL_CACHE_TTL, _columns(user))
+  _cache.move_to_end(user.id)
+
+  # LRU: drop the oldest when full
+  while len(_cache) > PRINCIPAL_CACHE_SIZE:
+    _cache.popitem(last=False)
+
+
+def get_cached_principal(user_id: uuid.UUID) -> User | None:
+  """
+  Returns a detached User built from the cache (no database round trip), or None.
+  The caller attaches it to its session with `await db.merge(user, load=False)`.
+  """
+  entry = _cache.get(user_id)
+  if entry is None:
+    return None
+
+  expires_at, columns = entry
+  if expires_at < time.monotonic():
+    _cache.pop(user_id, None)
+    return None
+
+  # A fresh object per request, as if it was just loaded by a query
+  user = User(**columns)
+  make_transient_to_detached(user)
+  return user
+
+
+def forget_principal(user_id: uuid.UUID):
+  _cache.pop(user_id, None)
+
+
+def clear_principal_cache():
+  _cache.clear()
+
+
+async def invalidate_principal(user_id: uuid.UUID, redis_client):
+  """
+  Call after changing the users row (avatar, last_*_at...).
+  Dropped here right away and in the other workers through pub/sub.
+  """
+  forget_principal(user_id)
+  await publish(redis_client, INVALIDATE_CHANNEL, str(user_id))
+
+
+@on_message(INVALIDATE_CHANNEL)
+def _on_invalidate(message: str):
+  try:
+    forget_principal(uuid.UUID(message))
+  except ValueError:
+    pass
@@ -0,0 +1,92 @@
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from Back.core.models import User
+from Back.services.handle import check_daily_limit
+
+# One of each per UTC day
+DAILY_LIMIT = 1
+
+# action -> (users column kept as durable fallback, message when the quota is used up)
+ACTIONS = {
+  "post": ("last_post_at", "You have already made your post for the day."),
+  "like": ("last_like_at", "You already used your One Like for today."),
+  "comment": ("last_comment_at", "You already used your One Comment for today."),
+}
+
+
+def _now() -> datetime:
+  return datetime.now(timezone.utc)
+
+
+def _quota_key(user: User, action: str, now: datetime) -> str:
+  return f"quota:{action}:{user.id}:{now.date().isoformat()}"
+
+
+def _next_midnight(now: datetime) -> int:
+  tomorrow = (now + timedelta(days=1)).date()
+  return int(datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=timezone.utc).timestamp())
+
+
+async def consume_daily_quota(user: User, action: str, redis_client, now: datetime | None = None) -> bool:
+  """
+  Counts one action of the user for the day of `now` (UTC, default: today).
+  Returns True if the user can act.
+
+  1- INCR + EXPIREAT midnight in one atomic round trip -> parallel requests can't both pass
+  2- First count of the day but the users column says "today" -> Redis lost the key, trust the db
+  3- Redis down -> the users column alone (old behavior)
+  """
+  column, _ = ACTIONS[action]
+  last_action_time = getattr(user, column)
+  now = now or _now()
+  key = _quota_key(user, action, now)
+
+  try:
+    # 1- Atomic counter
+    async with redis_client.pipeline(transaction=True) as pipe:
+      pipe.incr(key)
+      pipe.expireat(key, _next_midnight(now))
+      count, _ = await pipe.execute()
+
+  except RedisError as e:
+    # 3- Durable fallback
+    print(f"⚠️ Daily quota check failed, using the database: {e}")
+    return check_daily_limit(last_action_time)
+
+  # 2- Reconcile with the database
+  if count == 1 and not check_daily_limit(last_action_time):
+    return False
+
+  return count <= DAILY_LIMIT
+
+
+async def refund_daily_quota(user: User, action: str, redis_client, now: datetime):
+  """Gives the action back when the request failed after consuming it, on the day it was counted (`now` of the consume)"""
+  try:
+    await redis_client.decr(_quota_key(user, action, now))
+  except RedisError as e:
+    print(f"⚠️ Daily quota refund failed: {e}")
+
+
+@asynccontextmanager
+async def daily_quota(user: User, action: str, redis_client):
+  """
+  async with daily_quota(user, "like", redis):
+    ... the action ...
+
+  Raises 429 when today's action is already used.
+  If the block fails (404, invalid image...) the action is refunded,
+  to the same day even if the block ends after midnight.
+  """
+  now = _now()
+  if not await consume_daily_quota(user, action, redis_client, now):
+    raise HTTPException(status_code=429, detail=ACTIONS[action][1])
+
+  try:
+    yield
+  except BaseException:
+    await refund_daily_quota(user, action, redis_client, now)
+    raise
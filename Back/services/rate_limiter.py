@@ -1,26 +1,185 @@
+"""
+Atomic rate limiting in Redis.
+
+Every check is ONE round trip: a Lua script runs server side, so two parallel
+requests can never both pass, and it answers [allowed, retry_after_ms].
+
+Policies:
+  FixedWindow(limit, window)      -> `limit` hits per `window` seconds (the old cooldown is FixedWindow(1, 5))
+  SlidingWindow(limit, window)    -> same, but over the last `window` seconds instead of fixed buckets
+  TokenBucket(capacity, rate)     -> bursts up to `capacity`, refilled with `rate` tokens per second
+
+Routes pick a policy in ROUTE_POLICIES, overridable from the environment:
+  RATE_LIMIT_POST="sliding_window:3/60"  or  RATE_LIMIT_LIKE="token_bucket:5/0.5"
+"""
+
+from abc import ABC, abstractmethod
 from fastapi import HTTPException
+from redis.exceptions import NoScriptError
+import hashlib
+import math
+import time
 import uuid
+import os
+
+# ============== Lua scripts ==============
+
+FIXED_WINDOW_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if count > tonumber(ARGV[1]) then
+  return {0, redis.call('PTTL', KEYS[1])}
+end
+return {1, 0}
+"""
+
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[3])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate))
+return {allowed, retry}
+"""
+
+_SHAS = {script: hashlib.sha1(script.encode()).hexdigest() for script in (FIXED_WINDOW_LUA, SLIDING_WINDOW_LUA, TOKEN_BUCKET_LUA)}
+
+
+async def _run_script(redis_client, script: str, key: str, *args):
+  """EVALSHA (script cached by Redis), EVAL the first time"""
+  try:
+    return await redis_client.evalsha(_SHAS[script], 1, key, *args)
+  except NoScriptError:
+    return await redis_client.eval(script, 1, key, *args)
+
+
+# ============== Policies ==============
+
+class RateLimitPolicy(ABC):
+  name = ""
+
+  @abstractmethod
+  async def hit(self, redis_client, key: str) -> tuple[bool, int]:
+    """Counts one hit. Returns (allowed, retry_after_ms)"""
+
+
+class FixedWindow(RateLimitPolicy):
+  name = "fixed_window"
+
+  def __init__(self, limit: int, window: float):
+    self.limit = limit
+    self.window_ms = int(window * 1000)
+
+  async def hit(self, redis_client, key):
+    allowed, retry = await _run_script(redis_client, FIXED_WINDOW_LUA, key, self.limit, self.window_ms)
+    return bool(allowed), int(retry)
+
 
-async def check_user_cooldown(user_id: uuid.UUID, redis_client):
+class SlidingWindow(RateLimitPolicy):
+  name = "sliding_window"
+
+  def __init__(self, limit: int, window: float):
+    self.limit = limit
+    self.window_ms = int(window * 1000)
+
+  async def hit(self, redis_client, key):
+    now_ms = int(time.time() * 1000)
+    allowed, retry = await _run_script(
+      redis_client, SLIDING_WINDOW_LUA, key, self.limit, self.window_ms, now_ms, uuid.uuid4().hex
+    )
+    return bool(allowed), int(retry)
+
+
+class TokenBucket(RateLimitPolicy):
+  name = "token_bucket"
+
+  def __init__(self, capacity: int, rate: float):
+    self.capacity = capacity
+    self.rate = rate # tokens per second
+
+  async def hit(self, redis_client, key):
+    now_ms = int(time.time() * 1000)
+    allowed, retry = await _run_script(redis_client, TOKEN_BUCKET_LUA, key, self.capacity, self.rate, now_ms)
+    return bool(allowed), int(retry)
+
+
+POLICY_TYPES = {policy.name: policy for policy in (FixedWindow, SlidingWindow, TokenBucket)}
+
+
+def parse_policy(value: str) -> RateLimitPolicy:
+  """ "sliding_window:3/60" -> SlidingWindow(3, 60) """
+  try:
+    name, params = value.split(":")
+    first, second = params.split("/")
+    return POLICY_TYPES[name](int(first), float(second))
+  except (ValueError, KeyError):
+    raise ValueError(f"Invalid rate limit policy: {value!r}")
+
+
+# ============== Routes ==============
+
+# One shared 5 seconds cooldown between any two actions of a user
+COOLDOWN = FixedWindow(limit=1, window=5)
+
+ROUTE_POLICIES: dict[str, RateLimitPolicy] = {
+  "post": COOLDOWN,
+  "like": COOLDOWN,
+  "comment": COOLDOWN,
+}
+
+for _route in list(ROUTE_POLICIES):
+  _override = os.getenv(f"RATE_LIMIT_{_route.upper()}")
+  if _override:
+    ROUTE_POLICIES[_route] = parse_policy(_override)
+
+
+async def check_rate_limit(route: str, user_id: uuid.UUID, redis_client):
   """
-    Checks if a user is on cooldown.
-    If YES: Raises an error (Blocks them).
-    If NO: Sets a new cooldown and lets them pass.
-    """
+  Counts one request of the user on this route.
+  Raises 429 (with Retry-After) when the policy says no.
+  """
+  policy = ROUTE_POLICIES.get(route, COOLDOWN)
 
-  # 1- Define the unique user's lock
-  key = f"cooldown:user:{user_id}"
+  # Routes sharing a policy share the counter (the cooldown is for any action)
+  scope = "cooldown" if policy is COOLDOWN else route
+  key = f"ratelimit:{scope}:{policy.name}:{user_id}"
 
-  # 2- Check with Redis if the key exists
-  is_on_cooldown = await redis_client.exists(key)
+  allowed, retry_after_ms = await policy.hit(redis_client, key)
 
-  # 3- Check if the client is on cooldown, if not, set new expiry
-  if is_on_cooldown:
-    ttl = await redis_client.ttl(key)
+  if not allowed:
+    seconds = max(1, math.ceil(retry_after_ms / 1000))
     raise HTTPException(
       status_code=429,
-      detail=f"Whoa, slow down! Try again in {ttl} seconds."
+      detail=f"Whoa, slow down! Try again in {seconds} seconds.",
+      headers={"Retry-After": str(seconds)}
     )
 
-  await redis_client.setex(name=key, time=5, value="locked")
   return True
+
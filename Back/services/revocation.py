@@ -0,0 +1,149 @@
+"""
+Local filter of revoked tokens (by jti).
+
+A bloom filter answers "definitely not revoked" without leaving the process,
+which is the answer for almost every request. "Maybe revoked" falls back to
+the Redis key. Workers stay in sync through pub/sub, and the filter is rebuilt
+from Redis every time the pub/sub listener (re)connects, so revocations sent
+while it was disconnected are not missed. A bloom filter can't forget, so it is
+also rebuilt every FILTER_REBUILD_SECONDS (the token lifetime): the jtis of
+expired tokens drop out instead of raising the false positive rate forever.
+Until the first rebuild (or while Redis is unreachable) the filter is not
+trusted and every check goes to Redis.
+"""
+
+import os
+import math
+import asyncio
+import hashlib
+
+from redis.exceptions import RedisError
+
+from Back.core.broadcast import on_message, on_connected, on_disconnected
+from Back.core.redis_client import get_redis_client
+
+
+REVOKED_CHANNEL = "blacklist:revoked"
+BLACKLIST_PREFIX = "blacklist:jti:"
+
+# Sized for this many revoked (not yet expired) tokens at this false positive rate
+FILTER_CAPACITY = int(os.getenv("AUTH_REVOCATION_FILTER_CAPACITY", "100000"))
+FILTER_ERROR_RATE = float(os.getenv("AUTH_REVOCATION_FILTER_ERROR_RATE", "0.001"))
+
+# Every blacklist key expires with its token, after this long the filter only holds dead jtis
+FILTER_REBUILD_SECONDS = 60 * int(os.getenv("AUTH_ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+
+
+class BloomFilter:
+
+  def __init__(self, capacity: int = FILTER_CAPACITY, error_rate: float = FILTER_ERROR_RATE):
+    # m = -n ln(p) / ln(2)^2 bits, k = m/n ln(2) hashes
+    self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    self.hashes = max(1, round(self.size / capacity * math.log(2)))
+    self.bits = bytearray((self.size + 7) // 8)
+
+  def _positions(self, item: str):
+    # Double hashing: k positions out of one 128 bits digest
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+
+    for i in range(self.hashes):
+      yield (h1 + i * h2) % self.size
+
+  def add(self, item: str):
+    for position in self._positions(item):
+      self.bits[position >> 3] |= 1 << (position & 7)
+
+  def __contains__(self, item: str) -> bool:
+    return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+_filter = BloomFilter()
+_ready = False # True once the filter holds every revoked jti from Redis
+_rebuilding: BloomFilter | None = None # filter being filled by rebuild_filter()
+_refresher: asyncio.Task | None = None
+
+
+def might_be_revoked(jti: str) -> bool:
+  """False -> the token is certainly not revoked, no need to ask Redis"""
+  return not _ready or jti in _filter
+
+
+def remember_revoked(jti: str):
+  _filter.add(jti)
+
+  # Revoked during a rebuild: the scan may already be past its key
+  if _rebuilding is not None:
+    _rebuilding.add(jti)
+
+
+async def rebuild_filter(redis_client):
+  """Fresh filter from every blacklist key still alive in Redis (expired ones drop out)"""
+  global _filter, _ready, _rebuilding
+
+  fresh = _rebuilding = BloomFilter()
+  try:
+    async for key in redis_client.scan_iter(match=f"{BLACKLIST_PREFIX}*", count=1000):
+      if isinstance(key, bytes):
+        key = key.decode()
+      fresh.add(key.removeprefix(BLACKLIST_PREFIX))
+
+  except RedisError as e:
+    print(f"⚠️ Revocation filter rebuild failed: {e}")
+    _ready = False
+    return
+
+  finally:
+    _rebuilding = None
+
+  _filter, _ready = fresh, True
+
+
+def reset_filter():
+  """Back to "not loaded" (tests)"""
+  global _filter, _ready
+  _filter, _ready = BloomFilter(), False
+
+
+async def _refresh_periodically():
+  while True:
+    await asyncio.sleep(FILTER_REBUILD_SECONDS)
+    if _ready: # not loaded / disconnected: the next connection rebuilds it anyway
+      await rebuild_filter(get_redis_client())
+
+
+def start_refresher():
+  global _refresher
+
+  if _refresher is None:
+    _refresher = asyncio.create_task(_refresh_periodically())
+
+
+async def stop_refresher():
+  global _refresher
+
+  if _refresher is not None:
+    _refresher.cancel()
+    try:
+      await _refresher
+    except asyncio.CancelledError:
+      pass
+    _refresher = None
+
+
+@on_message(REVOKED_CHANNEL)
+def _on_revoked(jti: str):
+  remember_revoked(jti)
+
+
+@on_connected
+async def _on_connected(redis_client):
+  await rebuild_filter(redis_client)
+
+
+@on_disconnected
+def _on_disconnected():
+  # Revocations may be missed while disconnected -> ask Redis until the next rebuild
+  global _ready
+  _ready = False
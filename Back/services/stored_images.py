@@ -0,0 +1,156 @@
+"""
+Content addressed images: one stored copy per distinct upload, whoever sends it and how often.
+
+  key = sha256 of the bytes (computed by the intake while the upload arrives)
+  files: {key}.{ext} + {key}_{width}.webp, never overwritten with other bytes
+  stored_objects row: urls, placeholder and ref_count (shots/avatars using it)
+
+The count is kept in the same transaction as the shot/avatar it belongs to, so a rollback
+doesn't leave it wrong. Files are deleted after the commit, once nobody uses them.
+"""
+
+from contextlib import asynccontextmanager
+
+from sqlalchemy import update, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from fastapi import BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Back.core.models import StoredObject
+from Back.core.jobs import job, job_session, enqueue
+from Back.core.storage import save_bytes, content_base_of, delete_files
+from Back.services.images import process_image_async, save_variants, SHOT_WIDTHS
+from Back.services.intake import Upload
+
+
+def _insert_for(db: AsyncSession):
+  """INSERT construct of the session's dialect (both have ON CONFLICT)"""
+  if db.get_bind().dialect.name == "postgresql":
+    return postgresql.insert
+  return sqlite.insert
+
+
+async def store_image(
+  db: AsyncSession, upload: Upload, widths: tuple[int, ...] = SHOT_WIDTHS, prefix: str = "", uploaded: list[str] | None = None
+) -> tuple[str, dict, str | None]:
+  """
+  (image_url, image_variants, image_placeholder) for an upload.
+  1- Same bytes already stored -> one more reference, nothing processed or uploaded
+  2- New -> WebP variants + original without metadata, uploaded under the hash (urls added to `uploaded`)
+  3- Count the reference (two first uploads of the same bytes at once both end up counted)
+  Raises InvalidImage like process_image.
+  """
+  uploaded = [] if uploaded is None else uploaded
+  key = f"{prefix}{upload.sha256}"
+
+  # 1- Known bytes
+  result = await db.execute(
+    update(StoredObject)
+    .where(StoredObject.key == key)
+    .values(ref_count=StoredObject.ref_count + 1)
+    .returning(StoredObject.image_url, StoredObject.image_variants, StoredObject.image_placeholder)
+  )
+  existing = result.first()
+  if existing is not None:
+    return tuple(existing)
+
+  # 2- Process + upload
+  processed = await process_image_async(upload.data, widths)
+  image_url = await save_bytes(processed["original"], f"{key}.{upload.extension}", upload.content_type)
+  uploaded.append(image_url)
+  image_variants = await save_variants(processed, key)
+  uploaded.extend(image_variants.values())
+
+  # 3- Count it
+  insert = _insert_for(db)
+  await db.execute(
+    insert(StoredObject)
+    .values(key=key, image_url=image_url, image_variants=image_variants, image_placeholder=processed["placeholder"], ref_count=1)
+    .on_conflict_do_update(index_elements=["key"], set_={"ref_count": StoredObject.ref_count + 1})
+  )
+
+  return image_url, image_variants, processed["placeholder"]
+
+
+async def release_image(db: AsyncSession, image_url: str | None, image_variants: dict | None) -> list[str]:
+  """
+  One reference less (deleted shot, replaced avatar).
+  Returns the urls nobody uses anymore, to delete_later() after the commit.
+  Files from before content addressing belong to one shot/avatar only -> returned as is.
+  """
+  if not image_url:
+    return []
+
+  urls = [image_url, *(image_variants or {}).values()]
+
+  key = content_base_of(image_url)
+  if key is None:
+    return urls
+
+  result = await db.execute(
+    update(StoredObject)
+    .where(StoredObject.key == key)
+    .values(ref_count=StoredObject.ref_count - 1)
+    .returning(StoredObject.ref_count)
+  )
+  remaining = result.scalar()
+
+  # Not in the index (shouldn't happen): keeping the files is the safe side
+  if remaining is None or remaining > 0:
+    return []
+
+  await db.execute(delete(StoredObject).where(StoredObject.key == key, StoredObject.ref_count <= 0))
+  return urls
+
+
+async def delete_unused(db: AsyncSession, urls: list[str]):
+  """
+  delete_files for released images, after the commit.
+  Same bytes uploaded again since the release -> the new row owns the files, kept.
+  """
+  keys = {key for key in map(content_base_of, urls) if key}
+  in_use = set((await db.scalars(select(StoredObject.key).where(StoredObject.key.in_(keys)))).all()) if keys else set()
+
+  await delete_files([url for url in urls if content_base_of(url) not in in_use])
+
+
+@job("delete_unused")
+async def delete_unused_job(urls: list[str]):
+  async with job_session() as db:
+    await delete_unused(db, urls)
+
+
+async def delete_later(urls: list[str], redis_client, background_tasks: BackgroundTasks, db: AsyncSession):
+  """
+  Queued for the job workers (retried if it fails).
+  Redis can't take it -> in this process after the response (the request's session is still open then).
+  """
+  if not urls:
+    return
+
+  if await enqueue(redis_client, "delete_unused", urls=urls) is None:
+    background_tasks.add_task(delete_unused, db, urls)
+
+
+@asynccontextmanager
+async def discard_on_failure(redis_client):
+  """
+  async with discard_on_failure(redis) as uploaded:
+    ... = await store_image(db, upload, uploaded=uploaded)
+    ... await db.commit()
+
+  Files uploaded in the block have no committed row if it fails (rollback, quota, db error):
+  queued for delete_unused (kept if the same bytes got a row meanwhile), deleted right away
+  when Redis can't take the job.
+  """
+  uploaded: list[str] = []
+
+  try:
+    yield uploaded
+  except BaseException:
+    if uploaded and await enqueue(redis_client, "delete_unused", urls=uploaded) is None:
+      try:
+        await delete_unused_job(uploaded)
+      except Exception as e:
+        print(f"⚠️ Could not delete the files of a failed upload: {e}")
+    raise
@@ -1,4 +1,5 @@
 import pytest
+from contextlib import contextmanager
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
@@ -7,9 +8,14 @@ import fakeredis.aioredis
 
 # import modules
 from Back.app import app
-from Back.core.database import get_db
+from Back.core.database import get_db, get_read_db, enable_sqlite_foreign_keys
 from Back.core.models import Base
 from Back.core.redis_client import get_redis
+from Back.core.storage import MemoryStorage, set_storage
+from Back.core.profiler import profile_queries
+from Back.core.jobs import ensure_group, run_once, set_job_session_factory
+from Back.services.principal_cache import clear_principal_cache
+from Back.services.revocation import reset_filter
 from Back.services.auth import create_access_token
 
 # 1- in memory sqlite db
@@ -20,6 +26,7 @@ engine = create_async_engine(
   connect_args = {"check_same_thread": False},
   poolclass = StaticPool
 )
+enable_sqlite_foreign_keys(engine)
 
 TestingSessionLocal = async_sessionmaker(
   autocommit=False,
@@ -61,12 +68,23 @@ async def client(session):
     yield fake_redis
 
   app.dependency_overrides[get_db] = override_get_db
+  app.dependency_overrides[get_read_db] = override_get_db # same database, no replica in tests
   app.dependency_overrides[get_redis] = override_get_redis
 
+  # 3- uploads stay in memory
+  set_storage(MemoryStorage())
+
+  # 4- job handlers use the test database
+  set_job_session_factory(TestingSessionLocal)
+
   async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
     yield c
 
   app.dependency_overrides.clear()
+  set_storage(None)
+  set_job_session_factory(None)
+  clear_principal_cache()
+  reset_filter()
   await fake_redis.flushall() # Clear redis after test
 
 @pytest.fixture
@@ -75,3 +93,35 @@ def auth_headers():
 
   token = create_access_token(data={"sub": "testuser"})
   return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def max_queries():
+  """
+  Fails the test when the block runs more queries than allowed (N+1 guard):
+
+    with max_queries(3):
+      await client.get("/shots")
+  """
+
+  @contextmanager
+  def check(limit: int):
+    with profile_queries() as profile:
+      yield profile
+    assert profile.count <= limit, f"expected at most {limit} queries, got {profile.report()}"
+
+  return check
+
+@pytest.fixture
+def run_jobs():
+  """
+  Runs the queued jobs like a worker would (no worker runs in tests):
+
+    await client.delete(...)
+    await run_jobs()
+  """
+
+  async def run(retry_seconds: float = 60) -> int:
+    await ensure_group(fake_redis)
+    return await run_once(fake_redis, "test-worker", retry_seconds=retry_seconds)
+
+  return run
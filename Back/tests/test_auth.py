@@ -1,4 +1,14 @@
 import pytest
+import asyncio
+import threading
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+from Back.core.models import User
+from Back.services import auth, revocation
+from Back.services.revocation import BloomFilter
+from Back.tests.conftest import fake_redis
 
 @pytest.mark.asyncio
 async def test_register_user(client):
@@ -31,3 +41,112 @@ async def test_login_user(client):
 
   assert response.status_code == 200
   assert "access_token" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_hash_pool_answers_503_when_full(monkeypatch):
+  # 1 running job allowed, no queue
+  monkeypatch.setattr(auth, "HASH_WORKERS", 1)
+  monkeypatch.setattr(auth, "HASH_MAX_QUEUE", 0)
+
+  release = threading.Event()
+  busy = asyncio.create_task(auth._run_in_hash_pool(release.wait, 5))
+  await asyncio.sleep(0.05)
+
+  # 2- Pool is full -> rejected right away
+  with pytest.raises(HTTPException) as error:
+    await auth.hash_password_async("password")
+  assert error.value.status_code == 503
+
+  release.set()
+  await busy
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_with_new_cost(client, session):
+  # 1- User hashed with a cheaper cost than the configured one
+  old_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("oldpassword")
+  session.add(User(username="olduser", hashed_password=old_hash))
+  await session.commit()
+
+  # 2- Login still works and upgrades the stored hash
+  response = await client.post("/auth/login", data={"username": "olduser", "password": "oldpassword"})
+  assert response.status_code == 200
+
+  user = (await session.execute(select(User).where(User.username == "olduser"))).scalars().one()
+  assert user.hashed_password != old_hash
+  assert f"${auth.BCRYPT_ROUNDS:02d}$" in user.hashed_password
+
+
+@pytest.mark.asyncio
+async def test_logout_blacklists_the_jti(client):
+  response = await client.post("/auth/register", json={"username": "leaving", "password": "password123"})
+  headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+  # 1- Filter loaded (what the pub/sub listener does at startup)
+  await revocation.rebuild_filter(fake_redis)
+  assert (await client.get("/myshots", headers=headers)).status_code == 200
+
+  # 2- Logout -> only the short jti is stored, and the filter knows it
+  assert (await client.post("/auth/logout", headers=headers)).status_code == 200
+
+  keys = await fake_redis.keys("blacklist:*")
+  assert len(keys) == 1 and keys[0].startswith("blacklist:jti:")
+  assert len(keys[0]) < 50
+
+  assert (await client.get("/myshots", headers=headers)).status_code == 401
+
+  # 3- Another worker rebuilding from Redis still rejects it
+  revocation.reset_filter()
+  await revocation.rebuild_filter(fake_redis)
+  assert (await client.get("/myshots", headers=headers)).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_filter_skips_redis_for_valid_tokens(monkeypatch):
+  class NoRedis:
+    async def exists(self, key):
+      raise AssertionError("Redis should not be asked")
+
+  payload = {"jti": "not-revoked", "sub": "someone"}
+
+  # 1- Loaded filter -> answered locally
+  revocation.reset_filter()
+  monkeypatch.setattr(revocation, "_ready", True)
+  assert await auth.is_token_blacklisted(payload, "token", NoRedis()) is False
+
+  # 2- Not loaded (or lost pub/sub) -> Redis is asked
+  revocation.reset_filter()
+  with pytest.raises(AssertionError):
+    await auth.is_token_blacklisted(payload, "token", NoRedis())
+
+
+def test_bloom_filter_has_no_false_negatives():
+  bloom = BloomFilter(capacity=1000, error_rate=0.01)
+  added = [f"jti-{i}" for i in range(1000)]
+  for jti in added:
+    bloom.add(jti)
+
+  assert all(jti in bloom for jti in added)
+
+  false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+  assert false_positives < 300 # ~1% expected
+
+
+@pytest.mark.asyncio
+async def test_filter_forgets_expired_jtis(monkeypatch):
+  monkeypatch.setattr(revocation, "FILTER_REBUILD_SECONDS", 0.01)
+  monkeypatch.setattr(revocation, "get_redis_client", lambda: fake_redis)
+
+  # 1- Revoked, then its blacklist key expired with the token
+  revocation.reset_filter()
+  await revocation.rebuild_filter(fake_redis)
+  revocation.remember_revoked("expired-jti")
+  assert revocation.might_be_revoked("expired-jti")
+
+  # 2- The periodic rebuild drops it
+  revocation.start_refresher()
+  await asyncio.sleep(0.05)
+  await revocation.stop_refresher()
+  assert not revocation.might_be_revoked("expired-jti")
+  revocation.reset_filter()
@@ -0,0 +1,20 @@
+from Back.benchmarks.http import compare, percentile
+
+
+def test_percentile_nearest_rank():
+  values = sorted(float(v) for v in range(1, 101))
+  assert percentile(values, 50) == 50
+  assert percentile(values, 99) == 99
+  assert percentile([7.0], 95) == 7.0
+
+
+def test_compare_flags_regressions():
+  baseline = {"scenarios": {"shots": {"p95_ms": 10.0, "rps": 500.0, "errors": 0}}}
+
+  # 1- Within the tolerance
+  ok = {"scenarios": {"shots": {"p95_ms": 12.0, "rps": 450.0, "errors": 0}}}
+  assert compare(ok, baseline, tolerance=0.25) == []
+
+  # 2- Slower, less throughput, new errors, one line each
+  slow = {"scenarios": {"shots": {"p95_ms": 20.0, "rps": 300.0, "errors": 2}, "new": {"p95_ms": 1, "rps": 1, "errors": 0}}}
+  assert len(compare(slow, baseline, tolerance=0.25)) == 3
@@ -0,0 +1,54 @@
+import pytest
+import uuid
+from datetime import datetime, timedelta
+
+from Back.core.models import User, Shot, Comment
+from Back.services.comments import COMMENT_PREVIEW
+
+
+@pytest.mark.asyncio
+async def test_feed_embeds_latest_comments_only(client, session):
+  # 1- One shot with many comments, one without
+  owner = User(username="popular", hashed_password="x")
+  session.add(owner)
+  await session.flush()
+  busy = Shot(caption="busy", user_id=owner.id, comment_count=12, created_at=datetime(2025, 1, 2))
+  quiet = Shot(caption="quiet", user_id=owner.id, created_at=datetime(2025, 1, 1))
+  session.add_all([busy, quiet])
+  await session.flush()
+
+  start = datetime(2025, 1, 3)
+  session.add_all([
+    Comment(content=f"c{i}", user_id=owner.id, shot_id=busy.id, created_at=start + timedelta(minutes=i))
+    for i in range(12)
+  ])
+  await session.commit()
+
+  # 2- Feed: latest N, in reading order, total in comment_count
+  feed = (await client.get("/shots")).json()
+  assert [c["content"] for c in feed[0]["comments"]] == [f"c{i}" for i in range(12 - COMMENT_PREVIEW, 12)]
+  assert feed[0]["comment_count"] == 12
+  assert feed[1]["comments"] == []
+
+  # 3- The rest, newest first, page by page
+  seen = []
+  cursor = None
+  while True:
+    res = await client.get(f"/shot/{busy.id}/comments", params={"limit": 5, **({"cursor": cursor} if cursor else {})})
+    assert res.status_code == 200
+    seen += [c["content"] for c in res.json()]
+    cursor = res.headers.get("X-Next-Cursor")
+    if not cursor:
+      break
+
+  assert seen == [f"c{i}" for i in reversed(range(12))]
+
+  # 4- Unknown shot
+  assert (await client.get(f"/shot/{uuid.uuid4()}/comments")).status_code == 404
+  assert (await client.get(f"/shot/{quiet.id}/comments")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_comments_reject_bad_limit(client):
+  for limit in [0, 101]:
+    assert (await client.get(f"/shot/{uuid.uuid4()}/comments", params={"limit": limit})).status_code == 422
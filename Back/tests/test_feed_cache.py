@@ -0,0 +1,137 @@
+import pytest
+import asyncio
+import fakeredis.aioredis
+from prometheus_client import REGISTRY
+
+from Back.core.models import User, Shot
+from Back.services.feed_cache import get_feed_page, bump_feed_version, feed_version, is_not_modified
+
+@pytest.mark.asyncio
+async def test_feed_page_is_cached_until_next_write():
+  redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+  calls = []
+
+  async def build():
+    calls.append(1)
+    return {"items": [len(calls)], "next_cursor": None}
+
+  # 1- Miss then hit
+  first = await get_feed_page(redis, None, 1, 10, build)
+  second = await get_feed_page(redis, None, 1, 10, build)
+  assert first == second == {"items": [1], "next_cursor": None}
+  assert len(calls) == 1
+
+  # 2- A write bumps the version -> rebuilt
+  await bump_feed_version(redis)
+  third = await get_feed_page(redis, None, 1, 10, build)
+  assert third["items"] == [2]
+
+
+@pytest.mark.asyncio
+async def test_feed_rebuild_is_single_flight():
+  redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+  calls = []
+
+  async def slow_build():
+    calls.append(1)
+    await asyncio.sleep(0.1)
+    return {"items": ["shot"], "next_cursor": None}
+
+  def misses():
+    return REGISTRY.get_sample_value("feed_cache_total", {"result": "miss"}) or 0
+
+  before = misses()
+
+  # 10 parallel misses on the same page -> one query
+  pages = await asyncio.gather(*[get_feed_page(redis, None, 1, 10, slow_build) for _ in range(10)])
+
+  assert len(calls) == 1
+  assert all(page["items"] == ["shot"] for page in pages)
+  assert misses() - before == 10
+
+
+
+@pytest.mark.asyncio
+async def test_waiters_survive_a_cancelled_leader():
+  redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+  async def slow_build():
+    await asyncio.sleep(0.1)
+    return {"items": ["shot"], "next_cursor": None}
+
+  # 1- First miss leads the rebuild, the others wait for it
+  leader = asyncio.create_task(get_feed_page(redis, None, 1, 10, slow_build))
+  await asyncio.sleep(0.01)
+  waiters = asyncio.gather(*[get_feed_page(redis, None, 1, 10, slow_build) for _ in range(3)])
+  await asyncio.sleep(0.01)
+
+  # 2- Only the leader's client goes away
+  leader.cancel()
+  pages = await waiters
+
+  assert all(page["items"] == ["shot"] for page in pages)
+  with pytest.raises(asyncio.CancelledError):
+    await leader
+
+@pytest.mark.asyncio
+async def test_feed_version_always_grows():
+  redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+  # 1- Starts from the clock (µs), each write moves it forward even within the same µs
+  first = await feed_version(redis)
+  versions = [first]
+  for _ in range(5):
+    await bump_feed_version(redis)
+    versions.append(await feed_version(redis))
+
+  assert first > 1_600_000_000 * 10**6
+  assert versions == sorted(set(versions))
+
+  # 2- Redis lost the key -> back to the clock, never to an old value
+  await redis.flushall()
+  assert await feed_version(redis) > first
+
+
+@pytest.mark.asyncio
+async def test_unchanged_feed_is_answered_304(client, session, max_queries):
+  owner = User(username="poller", hashed_password="x")
+  session.add(owner)
+  await session.flush()
+  shot = Shot(caption="polled", user_id=owner.id)
+  session.add(shot)
+  await session.commit()
+
+  # 1- First load: body + validators
+  res = await client.get("/shots")
+  etag = res.headers["ETag"]
+  assert res.status_code == 200 and res.json()[0]["caption"] == "polled"
+  assert res.headers["Last-Modified"].endswith("GMT")
+
+  # 2- Same version -> 304 without body or query
+  with max_queries(0):
+    res = await client.get("/shots", headers={"If-None-Match": etag})
+  assert res.status_code == 304
+  assert res.content == b""
+  assert res.headers["ETag"] == etag
+
+  # 3- A write changes the ETag
+  await client.post("/auth/register", json={"username": "fan", "password": "password123"})
+  token = (await client.post("/auth/login", data={"username": "fan", "password": "password123"})).json()["access_token"]
+  headers = {"Authorization": f"Bearer {token}"}
+  await client.post(f"/shot/{shot.id}/like", headers=headers)
+
+  res = await client.get("/shots", headers={"If-None-Match": etag})
+  assert res.status_code == 200 and res.json()[0]["like_count"] == 1
+
+  # 4- /myshots: own ETag per user
+  mine = await client.get("/myshots", headers=headers)
+  assert mine.headers["ETag"] != res.headers["ETag"]
+  assert (await client.get("/myshots", headers={**headers, "If-None-Match": mine.headers["ETag"]})).status_code == 304
+
+
+def test_if_none_match_parsing():
+  assert is_not_modified('"a", W/"b"', 'W/"b"')
+  assert is_not_modified('W/"b"', '"b"') # weak comparison
+  assert is_not_modified("*", 'W/"b"')
+  assert not is_not_modified(None, 'W/"b"')
+  assert not is_not_modified('"c"', 'W/"b"')
@@ -0,0 +1,51 @@
+import io
+import pytest
+from PIL import Image
+
+from Back.services.images import process_image, process_image_async, InvalidImage, AVATAR_WIDTHS
+
+def make_jpeg_with_exif(width: int, height: int, orientation: int) -> bytes:
+  img = Image.new("RGB", (width, height), "blue")
+  exif = Image.Exif()
+  exif[0x0112] = orientation # Orientation
+  exif[0x010F] = "SecretPhoneMaker" # Make
+
+  buffer = io.BytesIO()
+  img.save(buffer, format="JPEG", exif=exif)
+  return buffer.getvalue()
+
+
+def test_variants_are_rotated_resized_and_stripped():
+  # 2000x1000 stored sideways (orientation 6 = rotate 90°) -> displayed as 1000x2000
+  processed = process_image(make_jpeg_with_exif(2000, 1000, orientation=6))
+
+  assert list(processed["variants"]) == [320, 640, 1080]
+  assert processed["placeholder"].startswith("data:image/webp;base64,")
+
+  variant = Image.open(io.BytesIO(processed["variants"][320]))
+  assert variant.format == "WEBP"
+  assert variant.size == (320, 640)
+  assert len(variant.getexif()) == 0
+
+  # The full size original too: rotation applied, metadata gone
+  original = Image.open(io.BytesIO(processed["original"]))
+  assert original.format == "JPEG"
+  assert original.size == (1000, 2000)
+  assert len(original.getexif()) == 0
+  assert b"SecretPhoneMaker" not in processed["original"]
+
+
+def test_small_images_are_not_upscaled():
+  buffer = io.BytesIO()
+  Image.new("RGBA", (50, 50)).save(buffer, format="PNG")
+
+  processed = process_image(buffer.getvalue(), AVATAR_WIDTHS)
+
+  assert list(processed["variants"]) == [96] # 256 would be the same 50px image
+  assert Image.open(io.BytesIO(processed["variants"][96])).size == (50, 50)
+
+
+@pytest.mark.asyncio
+async def test_invalid_image_in_process_pool():
+  with pytest.raises(InvalidImage):
+    await process_image_async(b"not an image")
@@ -0,0 +1,113 @@
+import io
+import hashlib
+
+import pytest
+from PIL import Image
+
+from Back.core.storage import get_storage
+from Back.services.intake import Upload, sniff_image, UPLOAD_MAX_BYTES, FORM_OVERHEAD
+
+
+def make_png(width: int = 64, height: int = 48) -> bytes:
+  buffer = io.BytesIO()
+  Image.new("RGB", (width, height), "teal").save(buffer, format="PNG")
+  return buffer.getvalue()
+
+
+async def login(client, username: str) -> dict:
+  register = await client.post("/auth/register", json={"username": username, "password": "password123"})
+  return {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+
+def test_upload_sniffs_and_hashes_while_fed():
+  png = make_png()
+  upload = Upload(max_bytes=len(png))
+
+  # 1- Fed in tiny chunks: format found once 12 bytes are in, hash over everything
+  for i in range(0, len(png), 5):
+    upload.feed(png[i:i + 5])
+  upload.finish()
+
+  assert (upload.extension, upload.content_type) == ("png", "image/png")
+  assert upload.sha256 == hashlib.sha256(png).hexdigest()
+  assert upload.data == png
+
+  # 2- One byte over the limit
+  with pytest.raises(Exception) as error:
+    Upload(max_bytes=len(png) - 1).feed(png)
+  assert error.value.status_code == 413
+
+  assert sniff_image(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == ("webp", "image/webp")
+  assert sniff_image(b"GIF89a......") is None
+
+
+@pytest.mark.asyncio
+async def test_real_format_wins_over_the_client_label(client):
+  headers = await login(client, "labeller")
+
+  # PNG bytes sent as a .jpg "image/jpeg"
+  res = await client.post(
+    "/post",
+    data={"caption": "mislabelled"},
+    files={"image": ("photo.jpg", make_png(), "image/jpeg")},
+    headers=headers
+  )
+  assert res.status_code == 200
+  assert res.json()["image_url"].endswith(".png")
+
+  key = res.json()["image_url"].removeprefix("/memory/")
+  assert get_storage().files[key][1] == "image/png"
+
+  # Text sent as an image (another user, one post a day)
+  res = await client.post(
+    "/post",
+    data={"caption": "fake"},
+    files={"image": ("photo.png", b"<?php echo 'hi'; ?>", "image/png")},
+    headers=await login(client, "faker")
+  )
+  assert res.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_oversized_upload_stops_at_the_limit(client):
+  headers = await login(client, "bigfile")
+  boundary = "limitboundary"
+  chunk = b"\x00" * (256 * 1024)
+  sent = []
+
+  async def body():
+    """Chunked (no Content-Length): only the running count can stop it"""
+    yield (
+      f"--{boundary}\r\nContent-Disposition: form-data; name=\"caption\"\r\n\r\nhuge\r\n"
+      f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"big.png\"\r\n"
+      "Content-Type: image/png\r\n\r\n"
+    ).encode() + make_png()[:16]
+
+    for _ in range(2 * UPLOAD_MAX_BYTES // len(chunk)):
+      sent.append(len(chunk))
+      yield chunk
+
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+  res = await client.post(
+    "/post",
+    content=body(),
+    headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+  )
+
+  assert res.status_code == 413
+  assert sum(sent) <= UPLOAD_MAX_BYTES + 2 * len(chunk) # stopped at the limit, not at 2x
+  assert get_storage().files == {}
+
+  # Declared too big -> rejected before the body
+  res = await client.post(
+    "/profile/avatar",
+    content=b"",
+    headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}", "Content-Length": str(50 * 1024 * 1024)}
+  )
+  assert res.status_code == 413
+
+  # Urlencoded form (no file): its own, smaller limit in the message
+  res = await client.post("/profile/avatar", content=b"caption=" + b"x" * (2 * FORM_OVERHEAD), headers={**headers, "Content-Type": "application/x-www-form-urlencoded"})
+  assert res.status_code == 413
+  assert res.json()["detail"] == f"Form too large, the limit is {FORM_OVERHEAD // 1024} KB."
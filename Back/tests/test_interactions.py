@@ -0,0 +1,82 @@
+import pytest
+import uuid
+from sqlalchemy import select, func, event
+from sqlalchemy.dialects import postgresql
+
+from Back.core.models import User, Shot, Like, Comment
+from Back.services.interactions import add_like, add_comment, shot_exists, like_statement, _single_statement
+from Back.tests.conftest import engine
+
+
+async def _user_and_shot(session):
+  owner = User(username="owner", hashed_password="x")
+  fan = User(username="fan", hashed_password="x")
+  session.add_all([owner, fan])
+  await session.flush()
+  shot = Shot(caption="target", user_id=owner.id)
+  session.add(shot)
+  await session.commit()
+  return fan, shot
+
+
+@pytest.mark.asyncio
+async def test_like_is_written_once(session):
+  fan, shot = await _user_and_shot(session)
+
+  # 1- Count the statements of one like
+  statements = []
+  listener = lambda *args: statements.append(args[2])
+  event.listen(engine.sync_engine, "before_cursor_execute", listener)
+  try:
+    assert await add_like(session, fan, shot.id) is True
+  finally:
+    event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+  # insert ... returning + counter + last_like_at, no SELECT before
+  assert len(statements) == 3
+  assert statements[0].startswith("INSERT INTO likes")
+  assert fan.last_like_at is not None
+
+  # 2- Second like -> nothing written, the shot exists -> 400 for the route
+  assert await add_like(session, fan, shot.id) is False
+  assert await shot_exists(session, shot.id)
+  await session.commit()
+
+  await session.refresh(shot)
+  assert shot.like_count == 1
+  assert await session.scalar(select(func.count(Like.id))) == 1
+
+
+@pytest.mark.asyncio
+async def test_comment_on_missing_shot(session):
+  fan, shot = await _user_and_shot(session)
+
+  assert await add_comment(session, fan, uuid.uuid4(), "hello?") is False
+  assert await add_comment(session, fan, shot.id, "hello!") is True
+  await session.commit()
+
+  await session.refresh(shot)
+  assert shot.comment_count == 1
+  assert await session.scalar(select(Comment.content)) == "hello!"
+
+
+@pytest.mark.asyncio
+async def test_like_missing_shot_is_404(client):
+  register = await client.post("/auth/register", json={"username": "ghostliker", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+  res = await client.post(f"/shot/{uuid.uuid4()}/like", headers=headers)
+  assert res.status_code == 404
+
+
+def test_postgres_like_is_one_statement():
+  statement = _single_statement(
+    like_statement(postgresql.insert, uuid.uuid4(), uuid.uuid4()),
+    uuid.uuid4(), Shot.like_count, "last_like_at", None
+  )
+  sql = str(statement.compile(dialect=postgresql.dialect()))
+
+  assert sql.startswith("WITH inserted AS")
+  assert "ON CONFLICT (user_id, shot_id) DO NOTHING" in sql
+  assert "UPDATE shots SET like_count" in sql
+  assert "UPDATE users SET last_like_at" in sql
@@ -0,0 +1,86 @@
+import pytest
+import pytest_asyncio
+import fakeredis.aioredis
+from redis.exceptions import ConnectionError
+
+from Back.core import jobs
+from Back.core.storage import get_storage
+from Back.core.jobs import job, enqueue, ensure_group, run_once, DEAD_STREAM, JOB_STREAM, JOB_MAX_ATTEMPTS
+from Back.tests.conftest import fake_redis
+from Back.tests.test_storage import make_png
+
+calls = []
+
+@job("test_flaky")
+async def flaky(value: int, fail_times: int):
+  calls.append(value)
+  if len(calls) <= fail_times:
+    raise RuntimeError("storage unavailable")
+
+
+@pytest_asyncio.fixture
+async def redis():
+  calls.clear()
+  client = fakeredis.aioredis.FakeRedis() # bytes replies, like the app's pool
+  await ensure_group(client)
+  return client
+
+
+@pytest.mark.asyncio
+async def test_job_runs_once(redis):
+  job_id = await enqueue(redis, "test_flaky", value=1, fail_times=0)
+
+  assert await run_once(redis, "w1") == 1
+  assert calls == [1]
+  assert await redis.xlen(JOB_STREAM) == 0 # acked and deleted
+  assert await redis.exists(f"{jobs.DONE_PREFIX}{job_id}")
+
+  # Delivered again (worker died before the ack) -> not run twice
+  await redis.xadd(JOB_STREAM, {"id": job_id, "name": "test_flaky", "payload": '{"value": 1, "fail_times": 0}'})
+  assert await run_once(redis, "w1") == 1
+  assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_retried_then_dead_lettered(redis):
+  # 1- Fails once, the retry (claimed by another worker) succeeds
+  await enqueue(redis, "test_flaky", value=2, fail_times=1)
+  await run_once(redis, "w1")
+  assert await run_once(redis, "w2", retry_seconds=60) == 0 # not idle long enough yet
+  assert await run_once(redis, "w2", retry_seconds=0) == 1
+  assert calls == [2, 2]
+  assert await redis.xlen(JOB_STREAM) == 0
+
+  # 2- Always fails -> dead letter after JOB_MAX_ATTEMPTS, with the error
+  calls.clear()
+  await enqueue(redis, "test_flaky", value=3, fail_times=100)
+  await run_once(redis, "w1")
+  for _ in range(JOB_MAX_ATTEMPTS - 1):
+    await run_once(redis, "w1", retry_seconds=0)
+
+  assert len(calls) == JOB_MAX_ATTEMPTS
+  assert await redis.xlen(JOB_STREAM) == 0
+  [(_, dead)] = await redis.xrange(DEAD_STREAM)
+  assert dead[b"name"] == b"test_flaky"
+  assert dead[b"attempts"] == str(JOB_MAX_ATTEMPTS).encode()
+  assert b"storage unavailable" in dead[b"error"]
+
+  # 3- Unknown job -> dead letter right away
+  await enqueue(redis, "no_such_job")
+  await run_once(redis, "w1")
+  assert await redis.xlen(DEAD_STREAM) == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_falls_back_when_queue_is_down(client, monkeypatch):
+  register = await client.post("/auth/register", json={"username": "offline", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+  response = await client.post("/post", data={"caption": "x"}, files={"image": ("a.png", make_png(200, 200), "image/png")}, headers=headers)
+
+  # XADD refused: nothing queued, the files still go after the response
+  async def refuse(*args, **kwargs):
+    raise ConnectionError("stream unavailable")
+
+  monkeypatch.setattr(fake_redis, "xadd", refuse)
+  assert (await client.delete(f"/shot/{response.json()['shot_id']}/delete", headers=headers)).status_code == 200
+  assert get_storage().files == {}
@@ -0,0 +1,85 @@
+import json
+import pytest
+
+from Back.core.broadcast import dispatch
+from Back.services import live_feed
+from Back.services.live_feed import event_stream, connections, FEED_EVENTS_CHANNEL
+from Back.tests.conftest import fake_redis
+
+
+def parse(chunk: str) -> dict:
+  fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+  fields["data"] = json.loads(fields["data"])
+  return fields
+
+
+async def forward(pubsub):
+  """What the broadcast listener of a worker does with the published events"""
+  for _ in range(10): # None for the subscribe confirmation too, not only at the end
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.01)
+    if message is not None:
+      await dispatch(message["channel"], message["data"])
+
+
+@pytest.mark.asyncio
+async def test_feed_writes_are_pushed_and_resumable(client):
+  pubsub = fake_redis.pubsub()
+  await pubsub.subscribe(FEED_EVENTS_CHANNEL)
+
+  stream = event_stream(fake_redis)
+  assert (await anext(stream)).startswith("retry:")
+  assert connections() == 1
+
+  # 1- A post and a like reach the open stream
+  register = await client.post("/auth/register", json={"username": "live", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+  shot_id = (await client.post("/post", data={"caption": "Live!"}, headers=headers)).json()["shot_id"]
+  fan = await client.post("/auth/register", json={"username": "fan", "password": "password123"})
+  await client.post(f"/shot/{shot_id}/like", headers={"Authorization": f"Bearer {fan.json()['access_token']}"})
+  await forward(pubsub)
+
+  created = parse(await anext(stream))
+  assert created["event"] == "shot_created"
+  assert created["data"]["id"] == shot_id
+  assert created["data"]["owner"] == "live"
+  assert created["data"]["caption"] == "Live!"
+
+  liked = parse(await anext(stream))
+  assert liked["event"] == "shot_liked"
+  assert liked["data"] == {"shot_id": shot_id}
+
+  await stream.aclose()
+  assert connections() == 0
+
+  # 2- Reconnect with Last-Event-ID -> only what came after it
+  resumed = event_stream(fake_redis, last_event_id=created["id"])
+  await anext(resumed)
+  assert parse(await anext(resumed))["id"] == liked["id"]
+  await resumed.aclose()
+
+  # 3- Unknown id -> reset, the client reloads the feed
+  lost = event_stream(fake_redis, last_event_id="not-an-id")
+  await anext(lost)
+  assert parse(await anext(lost))["event"] == "reset"
+  await lost.aclose()
+
+  await pubsub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_client_is_dropped_and_idle_gets_heartbeats(monkeypatch):
+  monkeypatch.setattr(live_feed, "SSE_QUEUE_SIZE", 2)
+  monkeypatch.setattr(live_feed, "SSE_HEARTBEAT_SECONDS", 0.01)
+
+  stream = event_stream(fake_redis)
+  await anext(stream)
+
+  # 1- Nothing happens -> heartbeat comment
+  assert await anext(stream) == ": ping\n\n"
+
+  # 2- More events than its queue holds -> what fits is sent, then the stream ends (EventSource resumes)
+  for i in range(5):
+    await dispatch(FEED_EVENTS_CHANNEL, f"1-{i} shot_liked {{\"shot_id\": \"{i}\"}}")
+
+  assert [parse(chunk)["id"] async for chunk in stream] == ["1-0", "1-1"]
+  assert connections() == 0
@@ -0,0 +1,116 @@
+import os
+import sys
+import subprocess
+
+import pytest
+import fakeredis
+import fakeredis.aioredis
+import redis.asyncio as redis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from Back.core.database import create_engine_for
+from prometheus_client import REGISTRY
+
+from Back.core.metrics import MetricsMiddleware, render_metrics
+from Back.core.redis_client import InstrumentedRedis
+
+
+def sample(text: str, line_start: str) -> float:
+  """Value of the first metric line starting with `line_start`"""
+  for line in text.splitlines():
+    if line.startswith(line_start):
+      return float(line.rsplit(" ", 1)[1])
+  return 0.0
+
+
+@pytest.mark.asyncio
+async def test_metrics_use_route_templates(client):
+  before = (await client.get("/metrics")).text
+
+  await client.get("/shots")
+  await client.get("/shot/not-a-uuid/comments")
+
+  text = (await client.get("/metrics")).text
+  shots = 'http_requests_total{method="GET",route="/shots",status="200"}'
+  comments = 'http_requests_total{method="GET",route="/shot/{shot_id}/comments",status="400"}'
+
+  assert sample(text, shots) == sample(before, shots) + 1
+  assert sample(text, comments) == sample(before, comments) + 1
+  assert "not-a-uuid" not in text # ids never become labels
+  assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/shots"}' in text
+
+
+
+@pytest.mark.asyncio
+async def test_live_feed_stream_is_not_timed():
+  open_streams = []
+
+  async def stream(scope, receive, send):
+    open_streams.append(REGISTRY.get_sample_value("http_streams_open"))
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+  async def send(message):
+    pass
+
+  labels = {"method": "GET", "route": "unmatched"}
+  timed = REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0
+  counted = REGISTRY.get_sample_value("http_requests_total", {**labels, "status": "200"}) or 0
+
+  await MetricsMiddleware(stream)({"type": "http", "path": "/shots/stream", "method": "GET"}, None, send)
+
+  # Counted, in its own gauge while open, out of the latency histogram
+  assert open_streams == [1]
+  assert REGISTRY.get_sample_value("http_streams_open") == 0
+  assert (REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0) == timed
+  assert REGISTRY.get_sample_value("http_requests_total", {**labels, "status": "200"}) == counted + 1
+
+@pytest.mark.asyncio
+async def test_redis_commands_are_timed():
+  pool = redis.ConnectionPool(connection_class=fakeredis.aioredis.FakeConnection, server=fakeredis.FakeServer())
+  client = InstrumentedRedis(connection_pool=pool)
+
+  before = sample(render_metrics()[0].decode(), 'redis_command_duration_seconds_count{command="GET"}')
+
+  await client.get("counter")
+  await client.get("counter")
+
+  after = sample(render_metrics()[0].decode(), 'redis_command_duration_seconds_count{command="GET"}')
+  assert after == before + 2
+  await client.aclose()
+
+
+def test_multiprocess_workers_are_summed(tmp_path):
+  env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+  worker = (
+    "from Back.core.metrics import REQUESTS;"
+    "REQUESTS.labels('GET', '/shots', '200').inc()"
+  )
+
+  # 1- Two "workers" count one request each
+  for _ in range(2):
+    subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+
+  # 2- Any worker answering /metrics sees both
+  scrape = "from Back.core.metrics import render_metrics; print(render_metrics()[0].decode())"
+  text = subprocess.run([sys.executable, "-c", scrape], env=env, check=True, capture_output=True, text=True).stdout
+
+  assert sample(text, 'http_requests_total{method="GET",route="/shots",status="200"}') == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_checkout_is_timed_and_lazy(tmp_path):
+  engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+  before = sample(render_metrics()[0].decode(), "db_pool_checkout_seconds_count")
+
+  async with async_sessionmaker(engine)() as session:
+    # 1- A session that runs nothing never takes a connection
+    assert engine.pool.checkedout() == 0
+
+    # 2- The first query does, and the checkout is timed
+    await session.execute(text("SELECT 1"))
+    assert engine.pool.checkedout() == 1
+
+  assert sample(render_metrics()[0].decode(), "db_pool_checkout_seconds_count") == before + 1
+  await engine.dispose()
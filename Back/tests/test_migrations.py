@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text, inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from Back.core.models import Base
+from Back.core.migrations import run_migrations, LATEST_VERSION
+
+OLD_SCHEMA = [
+  "CREATE TABLE users (id CHAR(32) PRIMARY KEY, username VARCHAR(24), avatar_url VARCHAR, hashed_password VARCHAR NOT NULL, "
+  "last_post_at DATETIME, last_like_at DATETIME, last_comment_at DATETIME)",
+  "CREATE TABLE shots (id CHAR(32) PRIMARY KEY, caption VARCHAR(50), created_at DATETIME, image_url VARCHAR, user_id CHAR(32))",
+  "CREATE TABLE comments (id CHAR(32) PRIMARY KEY, content VARCHAR(100), user_id CHAR(32), shot_id CHAR(32))",
+  "CREATE TABLE likes (id CHAR(32) PRIMARY KEY, user_id CHAR(32), shot_id CHAR(32))",
+  "INSERT INTO users (id, username, hashed_password) VALUES ('u1', 'old', 'x')",
+  "INSERT INTO shots (id, caption, created_at, user_id) VALUES ('s1', 'old shot', '2025-01-01 00:00:00', 'u1')",
+  "INSERT INTO likes VALUES ('l1', 'u1', 's1'), ('l2', 'u1', 's1')", # duplicate like from the old days
+  "INSERT INTO comments VALUES ('c1', 'old comment', 'u1', 's1')", # comments had no date
+]
+
+@pytest.mark.asyncio
+async def test_migrations_upgrade_old_database(tmp_path):
+  engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+
+  # 1- Database from before the migrations existed
+  async with engine.begin() as conn:
+    for statement in OLD_SCHEMA:
+      await conn.execute(text(statement))
+
+  # 2- Same steps as create_db_and_tables(), twice to check it is idempotent
+  for _ in range(2):
+    async with engine.begin() as conn:
+      await conn.run_sync(Base.metadata.create_all)
+      assert await conn.run_sync(run_migrations) == LATEST_VERSION
+
+  # 3- New columns, indexes and cleaned up data
+  async with engine.connect() as conn:
+    indexes = await conn.run_sync(lambda c: [i["name"] for i in inspect(c).get_indexes("likes")])
+    assert "uq_likes_user_id_shot_id" in indexes
+
+    # likes/comments rebuilt with ON DELETE CASCADE, rows kept
+    for table in ("likes", "comments"):
+      foreign_keys = await conn.run_sync(lambda c: inspect(c).get_foreign_keys(table))
+      assert [fk["options"].get("ondelete") for fk in foreign_keys if fk["constrained_columns"] == ["shot_id"]] == ["CASCADE"]
+    assert (await conn.execute(text("SELECT COUNT(*) FROM likes"))).scalar() == 1
+
+    row = (await conn.execute(text("SELECT like_count, comment_count FROM shots"))).one()
+    assert tuple(row) == (1, 1)
+
+    comment_date = (await conn.execute(text("SELECT created_at FROM comments"))).scalar()
+    assert str(comment_date).startswith("2025-01-01")
+
+  await engine.dispose()
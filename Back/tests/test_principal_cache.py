@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import event, select
+
+from Back.core.models import User
+from Back.core.broadcast import dispatch
+from Back.services.principal_cache import INVALIDATE_CHANNEL
+from Back.tests.conftest import engine
+
+@pytest.fixture
+def user_queries():
+  """Collects every SQL statement that reads the users table"""
+  statements = []
+
+  def before_execute(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+      statements.append(statement)
+
+  event.listen(engine.sync_engine, "before_cursor_execute", before_execute)
+  yield statements
+  event.remove(engine.sync_engine, "before_cursor_execute", before_execute)
+
+
+async def login(client, username):
+  await client.post("/auth/register", json={"username": username, "password": "password123"})
+  res = await client.post("/auth/login", data={"username": username, "password": "password123"})
+  return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_identity_is_cached_between_requests(client, session, user_queries):
+  headers = await login(client, "cacheduser")
+  user_queries.clear()
+
+  # 1- First request loads the user, the next ones don't
+  for _ in range(3):
+    assert (await client.get("/myshots", headers=headers)).status_code == 200
+
+  assert len(user_queries) == 1
+
+  # 2- Another worker changed the user -> reloaded once
+  user = (await session.execute(select(User).where(User.username == "cacheduser"))).scalars().one()
+  user_queries.clear()
+  session.expunge_all() # like a fresh request session
+
+  await dispatch(INVALIDATE_CHANNEL, str(user.id).encode()) # what the pub/sub listener does
+
+  await client.get("/myshots", headers=headers)
+  assert len(user_queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_the_cached_user(client, session, user_queries):
+  headers = await login(client, "writer")
+  await client.get("/myshots", headers=headers)
+  user_queries.clear()
+
+  # Posting changes last_post_at -> the next request reads the fresh row
+  assert (await client.post("/post", data={"caption": "hi"}, headers=headers)).status_code == 200
+  session.expunge_all()
+  await client.get("/myshots", headers=headers)
+
+  assert len(user_queries) == 1
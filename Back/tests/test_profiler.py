@@ -0,0 +1,61 @@
+import pytest
+from datetime import datetime
+
+from sqlalchemy import select
+
+from Back.core import profiler
+from Back.core.models import User, Shot, Comment
+from Back.core.profiler import profile_queries
+
+
+async def seed_feed(session, shots: int = 10):
+  """Shots from different owners, each with comments from different users"""
+  users = [User(username=f"user{i}", hashed_password="x") for i in range(shots)]
+  session.add_all(users)
+  await session.flush()
+
+  feed = [Shot(caption=f"shot {i}", user_id=users[i].id, created_at=datetime(2025, 1, 1, i)) for i in range(shots)]
+  session.add_all(feed)
+  await session.flush()
+
+  session.add_all([
+    Comment(content="nice", user_id=users[(i + j) % shots].id, shot_id=shot.id)
+    for i, shot in enumerate(feed) for j in range(2)
+  ])
+  await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_feed_query_count_does_not_grow_with_the_page(client, session, max_queries):
+  await seed_feed(session)
+
+  # shots (+ owners) and the comment previews (+ owners), whatever the page size
+  with max_queries(3):
+    res = await client.get("/shots")
+
+  assert len(res.json()) == 10
+
+
+@pytest.mark.asyncio
+async def test_debug_headers_and_n_plus_one_log(client, session, monkeypatch, capsys):
+  await seed_feed(session, shots=6)
+
+  # 1- Headers only when turned on
+  assert "X-DB-Queries" not in (await client.get("/shots")).headers
+
+  monkeypatch.setattr(profiler, "PROFILE_HEADERS", True)
+  res = await client.get(f"/shot/{(await session.scalar(select(Shot.id).limit(1)))}/comments")
+  assert res.headers["X-DB-Queries"] == "1"
+  assert float(res.headers["X-DB-Time-Ms"]) >= 0
+
+  # 2- One query per shot is reported as a possible N+1
+  with profile_queries() as profile:
+    for shot_id in (await session.scalars(select(Shot.id))).all():
+      await session.scalar(select(Comment.content).where(Comment.shot_id == shot_id).limit(1))
+
+  assert profile.count == 7
+  [(statement, times)] = profile.repeated()
+  assert times == 6 and "FROM comments" in statement
+
+  profiler._log("GET /test", profile, 0.0)
+  assert "Possible N+1 in GET /test: 6x" in capsys.readouterr().out
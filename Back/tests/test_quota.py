@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+import fakeredis.aioredis
+from fastapi import HTTPException
+
+from Back.core.models import User
+from Back.services import quota
+from Back.services.quota import consume_daily_quota, daily_quota
+
+@pytest.fixture
+def redis():
+  return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.mark.asyncio
+async def test_only_one_parallel_action_per_day(redis):
+  user = User(id=uuid.uuid4(), username="racer")
+
+  results = await asyncio.gather(*[consume_daily_quota(user, "like", redis) for _ in range(10)])
+
+  assert results.count(True) == 1
+
+  # Expires at the next UTC midnight
+  (key,) = await redis.keys("quota:like:*")
+  assert 0 < await redis.ttl(key) <= 24 * 3600
+
+
+@pytest.mark.asyncio
+async def test_database_column_wins_when_redis_lost_the_key(redis):
+  # Redis was flushed but the users row says "already liked today"
+  user = User(id=uuid.uuid4(), username="flushed", last_like_at=datetime.now(timezone.utc))
+
+  assert not await consume_daily_quota(user, "like", redis)
+  assert await consume_daily_quota(user, "comment", redis)
+
+
+@pytest.mark.asyncio
+async def test_failed_action_gives_the_quota_back(redis):
+  user = User(id=uuid.uuid4(), username="unlucky")
+
+  # 1- The action fails after the quota was taken (shot not found...)
+  with pytest.raises(HTTPException):
+    async with daily_quota(user, "post", redis):
+      raise HTTPException(status_code=404)
+
+  # 2- Still allowed once
+  async with daily_quota(user, "post", redis):
+    pass
+
+  with pytest.raises(HTTPException) as error:
+    async with daily_quota(user, "post", redis):
+      pass
+  assert error.value.status_code == 429
+  assert "already made your post" in error.value.detail
+
+
+@pytest.mark.asyncio
+async def test_refund_after_midnight_goes_to_the_day_consumed(redis, monkeypatch):
+  user = User(id=uuid.uuid4(), username="nightowl")
+  day = datetime.now(timezone.utc).date() + timedelta(days=1) # future: EXPIREAT in the past deletes the key
+  before = datetime(day.year, day.month, day.day, 23, 59, 59, tzinfo=timezone.utc)
+  after = before + timedelta(seconds=2)
+
+  # 1- Consumed at 23:59:59, fails after midnight
+  monkeypatch.setattr(quota, "_now", lambda: before)
+  with pytest.raises(HTTPException):
+    async with daily_quota(user, "like", redis):
+      monkeypatch.setattr(quota, "_now", lambda: after)
+      raise HTTPException(status_code=404)
+
+  # 2- The refund went to that day, the next one still has exactly one action
+  assert await redis.get(f"quota:like:{user.id}:{before.date().isoformat()}") == "0"
+  assert await consume_daily_quota(user, "like", redis)
+  assert not await consume_daily_quota(user, "like", redis)
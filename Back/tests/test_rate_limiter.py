@@ -0,0 +1,58 @@
+import pytest
+import asyncio
+import uuid
+import fakeredis.aioredis
+from fastapi import HTTPException
+
+from Back.services.rate_limiter import (
+  FixedWindow, SlidingWindow, TokenBucket, parse_policy, check_rate_limit
+)
+
+@pytest.fixture
+def redis():
+  return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.mark.asyncio
+async def test_cooldown_lets_only_one_parallel_request_through(redis):
+  user_id = uuid.uuid4()
+
+  results = await asyncio.gather(
+    *[check_rate_limit("like", user_id, redis) for _ in range(10)],
+    return_exceptions=True
+  )
+
+  assert results.count(True) == 1
+  blocked = [r for r in results if isinstance(r, HTTPException)]
+  assert len(blocked) == 9
+  assert blocked[0].status_code == 429
+  assert blocked[0].headers["Retry-After"] == "5"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [FixedWindow(3, 60), SlidingWindow(3, 60), TokenBucket(3, 0.01)])
+async def test_policies_allow_up_to_the_limit(redis, policy):
+  hits = [await policy.hit(redis, "ratelimit:test") for _ in range(5)]
+
+  assert [allowed for allowed, _ in hits] == [True, True, True, False, False]
+  assert all(retry > 0 for _, retry in hits[3:])
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_frees_up_after_the_window(redis):
+  policy = SlidingWindow(1, 0.2)
+
+  assert (await policy.hit(redis, "ratelimit:slide"))[0]
+  assert not (await policy.hit(redis, "ratelimit:slide"))[0]
+
+  await asyncio.sleep(0.25)
+  assert (await policy.hit(redis, "ratelimit:slide"))[0]
+
+
+def test_parse_policy():
+  policy = parse_policy("token_bucket:5/0.5")
+  assert isinstance(policy, TokenBucket)
+  assert (policy.capacity, policy.rate) == (5, 0.5)
+
+  with pytest.raises(ValueError):
+    parse_policy("leaky:1")
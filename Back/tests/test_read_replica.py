@@ -0,0 +1,110 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from Back.app import app
+from Back.core import database
+from Back.core.database import get_db, get_read_db, create_engine_for
+from Back.core.models import Base, User
+from Back.tests.conftest import fake_redis
+
+
+@pytest_asyncio.fixture
+async def primary_and_replica(client, tmp_path, monkeypatch):
+  """Two SQLite files: the replica only has what we copy into it (a replica that is behind)"""
+  engines = [create_engine_for(f"sqlite+aiosqlite:///{tmp_path / name}.db") for name in ("primary", "replica")]
+  for engine in engines:
+    async with engine.begin() as conn:
+      await conn.run_sync(Base.metadata.create_all)
+
+  primary, replica = (async_sessionmaker(engine, expire_on_commit=False) for engine in engines)
+  monkeypatch.setattr(database, "get_async_session", primary)
+  monkeypatch.setattr(database, "get_read_async_session", replica)
+
+  # the real dependencies this time
+  app.dependency_overrides.pop(get_db)
+  app.dependency_overrides.pop(get_read_db)
+
+  yield primary, replica
+
+  for engine in engines:
+    await engine.dispose()
+
+
+async def copy_user(replica, username: str):
+  """Replication of the users table only, the shots are 'not there yet'"""
+  async with database.get_async_session() as db:
+    user = (await db.execute(User.__table__.select().where(User.username == username))).one()
+  async with replica() as db:
+    await db.execute(User.__table__.insert().values(**user._mapping))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_the_replica_except_after_own_writes(client, primary_and_replica):
+  _, replica = primary_and_replica
+
+  # 1- A user writes a shot (primary)
+  await client.post("/auth/register", json={"username": "writer", "password": "password123"})
+  token = (await client.post("/auth/login", data={"username": "writer", "password": "password123"})).json()["access_token"]
+  writer = {"Authorization": f"Bearer {token}"}
+  await copy_user(replica, "writer")
+
+  assert (await client.post("/post", data={"caption": "fresh"}, headers=writer)).status_code == 200
+
+  # 2- Anyone else reads the replica, which doesn't have it yet: not cached, no ETag
+  res = await client.get("/shots")
+  assert res.json() == []
+  assert "ETag" not in res.headers
+
+  # 3- The writer reads their own write (primary), the same second
+  res = await client.get("/shots", headers=writer)
+  assert [shot["caption"] for shot in res.json()] == ["fresh"]
+  assert [shot["caption"] for shot in (await client.get("/myshots", headers=writer)).json()] == ["fresh"]
+
+  # 4- Stickiness over -> replica again
+  await fake_redis.delete(f"{database.STICKY_PREFIX}writer")
+  assert (await client.get("/myshots", headers=writer)).json() == []
+
+
+def test_pool_settings_from_env(monkeypatch):
+  monkeypatch.setenv("DB_POOL_SIZE", "20")
+  monkeypatch.setenv("DB_POOL_PRE_PING", "1")
+  monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+
+  options = database.engine_options("postgresql+asyncpg://u:p@db/oneshot")
+  assert options["pool_size"] == 20 and options["pool_pre_ping"] is True
+  assert options["connect_args"] == {"prepared_statement_cache_size": 0}
+
+  # in memory SQLite has no pool to size
+  assert "pool_size" not in database.engine_options("sqlite+aiosqlite:///:memory:")
+
+  # SQLite writers wait for the lock longer than sqlite3's 5s
+  assert database.engine_options("sqlite+aiosqlite:///./oneshot.db")["connect_args"] == {"timeout": 30.0}
+
+
+@pytest.mark.asyncio
+async def test_one_connection_per_request_without_replica(client, tmp_path, monkeypatch):
+  """get_current_user + get_read_db in one request, pool of a single connection"""
+  monkeypatch.setenv("DB_POOL_SIZE", "1")
+  monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+  monkeypatch.setenv("DB_POOL_TIMEOUT", "2")
+
+  engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path / 'primary'}.db")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+
+  monkeypatch.setattr(database, "get_async_session", async_sessionmaker(engine, expire_on_commit=False))
+  monkeypatch.setattr(database, "get_read_async_session", None)
+  app.dependency_overrides.pop(get_db)
+  app.dependency_overrides.pop(get_read_db)
+
+  register = await client.post("/auth/register", json={"username": "single", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+  assert (await client.post("/post", data={"caption": "one"}, headers=headers)).status_code == 200
+
+  assert (await client.get("/myshots", headers=headers)).status_code == 200
+  assert (await client.get("/shot/not-a-uuid/comments")).status_code == 400
+  assert engine.pool.checkedout() == 0
+
+  await engine.dispose()
@@ -1,5 +1,13 @@
 import pytest
 import asyncio
+from datetime import datetime, timedelta
+
+from pydantic import TypeAdapter
+
+from Back.core.models import User, Shot, Like
+from Back.core.schemas import ShotOut
+from Back.services.counters import reconcile_counters
+from Back.services.pagination import next_cursor
 
 @pytest.mark.asyncio
 async def test_upload_shot(client):
@@ -47,3 +55,123 @@ async def test_daily_limit(client):
 
   assert res2.status_code == 429
   assert "already made your post" in res2.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_feed_cursor_pagination(client, session):
+  """Walk the feed with the cursor and compare with the old page path"""
+
+  # 1- Seed one user with 5 shots (two of them share the same created_at)
+  owner = User(username="pageuser", hashed_password="x")
+  session.add(owner)
+  await session.flush()
+
+  base_time = datetime(2025, 1, 1)
+  for i, minutes in enumerate([0, 1, 2, 2, 3]):
+    session.add(Shot(caption=f"shot {i}", user_id=owner.id, created_at=base_time + timedelta(minutes=minutes)))
+  await session.commit()
+
+  # 2- Follow the cursor until the last page
+  seen = []
+  cursor = None
+  while True:
+    params = {"limit": 2}
+    if cursor:
+      params["cursor"] = cursor
+
+    res = await client.get("/shots", params=params)
+    assert res.status_code == 200
+
+    seen += [shot["id"] for shot in res.json()]
+    cursor = res.headers.get("X-Next-Cursor")
+    if not cursor:
+      break
+
+  # 3- Every shot once, newest first
+  assert len(seen) == 5
+  assert len(set(seen)) == 5
+
+  page_1 = (await client.get("/shots", params={"page": 1, "limit": 2})).json()
+  assert [shot["id"] for shot in page_1] == seen[:2]
+
+  # 4- Garbage cursor
+  res = await client.get("/shots", params={"cursor": "not-a-cursor"})
+  assert res.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_like_updates_counter(client, session):
+  # 1- A shot from someone else
+  owner = User(username="likedowner", hashed_password="x")
+  session.add(owner)
+  await session.flush()
+  shot = Shot(caption="like me", user_id=owner.id)
+  session.add(shot)
+  await session.commit()
+
+  # 2- Like it
+  await client.post("/auth/register", json={"username": "liker", "password": "password123"})
+  login_res = await client.post("/auth/login", data={"username": "liker", "password": "password123"})
+  headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+  res = await client.post(f"/shot/{shot.id}/like", headers=headers)
+  assert res.status_code == 200
+
+  # 3- The feed reads the counter
+  feed = (await client.get("/shots")).json()
+  assert feed[0]["like_count"] == 1
+  assert feed[0]["comment_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_reconcile_counters(session):
+  # 1- Shot with 2 likes but a drifted counter
+  owner = User(username="driftowner", hashed_password="x")
+  fan = User(username="driftfan", hashed_password="x")
+  session.add_all([owner, fan])
+  await session.flush()
+  shot = Shot(caption="drift", user_id=owner.id, like_count=7)
+  session.add(shot)
+  await session.flush()
+  session.add_all([Like(user_id=owner.id, shot_id=shot.id), Like(user_id=fan.id, shot_id=shot.id)])
+  await session.commit()
+
+  # 2- Reconcile
+  assert await reconcile_counters(session) == 1
+
+  await session.refresh(shot)
+  assert shot.like_count == 2
+  assert shot.comment_count == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_matches_response_models(client, session):
+  owner = User(username="typed", hashed_password="x", avatar_url="/uploads/me.png")
+  session.add(owner)
+  await session.flush()
+  shot = Shot(caption="typed shot", user_id=owner.id, image_variants={"320": "/uploads/x_320.webp"})
+  session.add(shot)
+  await session.commit()
+
+  res = await client.get("/shots")
+  assert res.headers["content-type"] == "application/json"
+
+  # Same JSON shape as before (strings for ids and dates), checked against the models
+  item = TypeAdapter(list[ShotOut]).validate_python(res.json())[0]
+  assert item.id == shot.id and item.owner_id == owner.id
+  assert res.json()[0]["created_at"] == shot.created_at.isoformat()
+  assert item.owner_avatar == "/uploads/me.png"
+
+
+@pytest.mark.asyncio
+async def test_feed_rejects_bad_page_and_limit(client):
+  register = await client.post("/auth/register", json={"username": "pager", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+  for route in ["/shots", "/myshots"]:
+    for params in ["limit=0", "limit=-1", "limit=101", "page=0", "page=-3"]:
+      assert (await client.get(f"{route}?{params}", headers=headers)).status_code == 422, f"{route}?{params}"
+
+    assert (await client.get(f"{route}?limit=1&page=1", headers=headers)).status_code == 200
+
+  assert next_cursor([], 0) is None
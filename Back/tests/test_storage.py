@@ -0,0 +1,261 @@
+import io
+import uuid
+import pytest
+import boto3
+import httpx
+from boto3.s3.transfer import TransferConfig
+
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Back.core.models import User, Like, Comment, StoredObject
+from Back.core.storage import StorageBackend, MemoryStorage, LocalStorage, S3Storage, UploadsStaticFiles, IMMUTABLE_CACHE_CONTROL, get_storage, migrate_layout
+from Back.tests.test_images import make_jpeg_with_exif
+
+def make_png(width: int, height: int) -> bytes:
+  buffer = io.BytesIO()
+  Image.new("RGB", (width, height), "orange").save(buffer, format="PNG")
+  return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_memory_and_local_storage(tmp_path):
+  for storage in [MemoryStorage(), LocalStorage(directory=str(tmp_path), url_prefix="/uploads")]:
+    url = await storage.save(io.BytesIO(b"image bytes"), "a.png", "image/png")
+
+    assert url.endswith("/a.png")
+    assert await storage.read("a.png") == b"image bytes"
+
+    await storage.delete("a.png")
+    await storage.delete("a.png") # deleting twice is fine
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_against_local_stand_in():
+  """moto plays the S3/R2 server"""
+  moto = pytest.importorskip("moto")
+
+  with moto.mock_aws():
+    boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="shots")
+
+    storage = S3Storage(
+      bucket="shots",
+      public_url="https://cdn.test",
+      endpoint_url=None, # default AWS endpoint, intercepted by moto
+      access_key="test",
+      secret_key="test",
+    )
+
+    # 1- Small file (single request)
+    url = await storage.save(io.BytesIO(b"small"), "small.png", "image/png")
+    assert url == "https://cdn.test/small.png"
+    assert await storage.read("small.png") == b"small"
+
+    # 2- Big file (multipart upload)
+    storage.transfer_config = TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024)
+    big = b"x" * (11 * 1024 * 1024)
+    await storage.save(io.BytesIO(big), "big.png", "image/png")
+    assert await storage.read("big.png") == big
+
+    await storage.delete("small.png")
+
+
+@pytest.mark.asyncio
+async def test_post_image_goes_through_storage(client):
+  await client.post("/auth/register", json={"username": "photographer", "password": "password123"})
+  login_res = await client.post("/auth/login", data={"username": "photographer", "password": "password123"})
+  headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+  response = await client.post(
+    "/post",
+    data={"caption": "With image"},
+    files={"image": ("photo.png", make_png(800, 600), "image/png")},
+    headers=headers
+  )
+
+  assert response.status_code == 200
+  image_url = response.json()["image_url"]
+  assert image_url.startswith("/memory/")
+
+  key = image_url.removeprefix("/memory/")
+  assert (await get_storage().read(key)).startswith(b"\x89PNG")
+
+  # Variants are stored next to the original
+  variants = response.json()["image_variants"]
+  assert set(variants) == {"320", "640", "1080"} # "1080" stays 800px wide, never upscaled
+  assert (await get_storage().read(variants["320"].removeprefix("/memory/")))[8:12] == b"WEBP"
+
+  # Not an image at all
+  res = await client.post(
+    "/profile/avatar",
+    files={"pfp_image": ("avatar.png", b"definitely not a png", "image/png")},
+    headers=headers
+  )
+  assert res.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_delete_shot_cascades_and_removes_files(client, session, run_jobs):
+  register = await client.post("/auth/register", json={"username": "deleter", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+  response = await client.post(
+    "/post",
+    data={"caption": "Soon gone"},
+    files={"image": ("photo.png", make_png(400, 300), "image/png")},
+    headers=headers
+  )
+  shot_id = uuid.UUID(response.json()["shot_id"])
+  storage = get_storage()
+  assert len(storage.files) == 1 + len(response.json()["image_variants"]) # original + variants
+
+  # 1- Likes and comments of other users
+  fans = [User(username=f"fan{i}", hashed_password="x") for i in range(3)]
+  session.add_all(fans)
+  await session.flush()
+  session.add_all([Like(user_id=fan.id, shot_id=shot_id) for fan in fans])
+  session.add_all([Comment(content="nice", user_id=fan.id, shot_id=shot_id) for fan in fans])
+  await session.commit()
+
+  # 2- Not the owner -> 403, unknown shot -> 404
+  stranger = await client.post("/auth/register", json={"username": "stranger", "password": "password123"})
+  stranger_headers = {"Authorization": f"Bearer {stranger.json()['access_token']}"}
+  assert (await client.delete(f"/shot/{shot_id}/delete", headers=stranger_headers)).status_code == 403
+  assert (await client.delete(f"/shot/{uuid.uuid4()}/delete", headers=headers)).status_code == 404
+
+  # 3- Owner -> the database deletes the children, files removed by the job queue
+  assert (await client.delete(f"/shot/{shot_id}/delete", headers=headers)).status_code == 200
+  assert await run_jobs() == 1
+
+  assert await session.scalar(select(func.count()).select_from(Like)) == 0
+  assert await session.scalar(select(func.count()).select_from(Comment)) == 0
+  assert storage.files == {}
+
+
+
+@pytest.mark.asyncio
+async def test_failed_post_removes_its_uploads(client, session, run_jobs, monkeypatch):
+  register = await client.post("/auth/register", json={"username": "unlucky", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+  # 1- Files uploaded, then the commit fails
+  async def broken_commit(self):
+    raise RuntimeError("database went away")
+
+  monkeypatch.setattr(AsyncSession, "commit", broken_commit)
+  with pytest.raises(RuntimeError):
+    await client.post("/post", data={"caption": "x"}, files={"image": ("a.png", make_png(300, 200), "image/png")}, headers=headers)
+  monkeypatch.undo()
+  await session.rollback() # what closing the request's session does (the tests share it)
+
+  # 2- No row points to them -> deleted by the job queue
+  assert get_storage().files != {}
+  assert await run_jobs() == 1
+  assert get_storage().files == {}
+  assert await session.scalar(select(func.count()).select_from(StoredObject)) == 0
+
+@pytest.mark.asyncio
+async def test_same_image_is_stored_once(client, session, run_jobs):
+  image = make_png(500, 400)
+  storage = get_storage()
+
+  # 1- Two users post the same bytes -> same files, processed and uploaded once
+  shots = []
+  for username in ["twin1", "twin2"]:
+    register = await client.post("/auth/register", json={"username": username, "password": "password123"})
+    headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+    response = await client.post("/post", data={"caption": "Same"}, files={"image": ("a.png", image, "image/png")}, headers=headers)
+    shots.append((response.json(), headers))
+
+  (first, first_headers), (second, second_headers) = shots
+  assert first["image_url"] == second["image_url"]
+  assert first["image_variants"] == second["image_variants"]
+  assert len(storage.files) == 1 + len(first["image_variants"])
+  assert await session.scalar(select(StoredObject.ref_count)) == 2
+
+  # 2- One deleted -> the other still needs the files
+  assert (await client.delete(f"/shot/{first['shot_id']}/delete", headers=first_headers)).status_code == 200
+  assert await run_jobs() == 0 # nothing to delete, nothing queued
+  assert len(storage.files) == 1 + len(first["image_variants"])
+  session.expire_all()
+  assert await session.scalar(select(StoredObject.ref_count)) == 1
+
+  # 3- Last one deleted -> files and index row gone
+  assert (await client.delete(f"/shot/{second['shot_id']}/delete", headers=second_headers)).status_code == 200
+  assert await run_jobs() == 1
+  assert storage.files == {}
+  assert await session.scalar(select(func.count()).select_from(StoredObject)) == 0
+
+
+@pytest.mark.asyncio
+async def test_local_uploads_sharded_and_served(tmp_path):
+  hashed = "ab" * 32
+  local = LocalStorage(directory=str(tmp_path), url_prefix="/uploads")
+
+  # 1- New files go to their shard folder, variants next to the original
+  await local.save(io.BytesIO(b"original"), f"{hashed}.png", "image/png")
+  await local.save(io.BytesIO(b"0123456789"), f"{hashed}_320.webp", "image/webp")
+  assert (tmp_path / "ab" / "ab" / f"{hashed}_320.webp").exists()
+
+  # 2- A file from the flat layout still resolves, then the migration moves it
+  (tmp_path / "legacy.png").write_bytes(b"png")
+  assert await local.read("legacy.png") == b"png"
+
+  uploads = Starlette(routes=[Mount("/uploads", UploadsStaticFiles(directory=str(tmp_path)))])
+  transport = httpx.ASGITransport(app=uploads)
+  async with httpx.AsyncClient(transport=transport, base_url="http://test") as static:
+    assert (await static.get("/uploads/legacy.png")).content == b"png"
+    assert migrate_layout(str(tmp_path)) == 1
+    assert migrate_layout(str(tmp_path)) == 0
+    legacy = await static.get("/uploads/legacy.png")
+    assert legacy.content == b"png"
+    assert "immutable" not in legacy.headers.get("cache-control", "") # same name could get other bytes
+
+    # 3- Hashed files: immutable, strong ETag, ranges, 304
+    variant = await static.get(f"/uploads/{hashed}_320.webp")
+    assert variant.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert variant.headers["etag"] == f'"{hashed}_320.webp"'
+
+    partial = await static.get(f"/uploads/{hashed}_320.webp", headers={"Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.content == b"2345"
+
+    revalidated = await static.get(f"/uploads/{hashed}_320.webp", headers={"If-None-Match": variant.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    # 4- ?w= on the original -> precomputed variant, original when that width doesn't exist
+    assert (await static.get(f"/uploads/{hashed}.png?w=320")).content == b"0123456789"
+    assert (await static.get(f"/uploads/{hashed}.png?w=999")).content == b"original"
+    assert (await static.get("/uploads/missing.png")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stored_original_has_no_exif(client):
+  register = await client.post("/auth/register", json={"username": "gps", "password": "password123"})
+  headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+
+  response = await client.post(
+    "/post",
+    data={"caption": "Holiday"},
+    files={"image": ("photo.jpg", make_jpeg_with_exif(800, 600, orientation=1), "image/jpeg")},
+    headers=headers
+  )
+  assert response.status_code == 200
+
+  stored = await get_storage().read(response.json()["image_url"].removeprefix("/memory/"))
+  assert stored.startswith(b"\xff\xd8\xff")
+  assert len(Image.open(io.BytesIO(stored)).getexif()) == 0
+  assert b"Exif" not in stored and b"SecretPhoneMaker" not in stored
+
+
+def test_incomplete_backend_fails_when_created():
+  class NoDelete(StorageBackend):
+    async def _save(self, fileobj, key, content_type): ...
+    async def read(self, key): ...
+    def url_for(self, key): ...
+
+  with pytest.raises(TypeError, match="delete"):
+    NoDelete()
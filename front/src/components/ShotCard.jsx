@@ -6,7 +6,8 @@ const API_URL = import.meta.env.VITE_API_URL;
 export default function ShotCard({ token, shot, currentUser, onDelete }) {
 
   const [currentLikes, setCurrentLikes] = useState(shot.like_count);
-  const [currentComments, setCurrentComments] = useState(shot.comments);
+  const [currentComments, setCurrentComments] = useState(shot.comments); // only the latest few come with the feed
+  const [commentCount, setCommentCount] = useState(shot.comment_count ?? shot.comments.length);
 
   const [isCommenting, setIsCommenting] = useState(false)
   const [commentText, setCommentText] = useState("")
@@ -80,6 +81,7 @@ export default function ShotCard({ token, shot, currentUser, onDelete }) {
         };
 
         setCurrentComments(prev => [...prev, newComment]);
+        setCommentCount(prev => prev + 1);
         setCommentText("");
         setIsCommenting(false);
       }
@@ -91,6 +93,28 @@ export default function ShotCard({ token, shot, currentUser, onDelete }) {
       setLoading(false);
     }
   }
+  // function to load every comment (the feed only has the latest ones)
+  const loadAllComments = async () => {
+    try {
+      let all = [];
+      let cursor = null;
+
+      // newest first, page by page (cursor in the X-Next-Cursor header)
+      do {
+        const params = cursor ? `?limit=100&cursor=${cursor}` : "?limit=100";
+        const response = await fetch(`${API_URL}/shot/${shot.id}/comments${params}`);
+        if (!response.ok) break;
+
+        all = all.concat(await response.json());
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
+
+      setCurrentComments(all.reverse()); // oldest first, like the preview
+    } catch (e) {
+      console.error(e);
+    }
+  }
+
   // Function to delete shot
   const handleDelete = async () => {
     if (!window.confirm("Are you sure you want to delete this shot?")) return;
@@ -214,12 +238,22 @@ export default function ShotCard({ token, shot, currentUser, onDelete }) {
           className="flex items-center gap-1 hover:text-blue-500 transition cursor-pointer"
         >
           <MessageCircle size={20} />
-          <span className="text-sm font-bold">{currentComments.length}</span>
+          <span className="text-sm font-bold">{commentCount}</span>
         </button>
       </div>
 
       {/* COMMENTS SECTION */}
       <div className="mt-3 bg-gray-50 rounded p-2 text-sm">
+        {/* Older comments are not in the feed */}
+        {commentCount > currentComments.length && (
+          <button
+            onClick={loadAllComments}
+            className="text-xs text-gray-400 hover:text-gray-600 mb-1 cursor-pointer"
+          >
+            View all {commentCount} comments
+          </button>
+        )}
+
         {/* List existing comments */}
         {currentComments.map((c, index) => (
           <div key={c.id || index} className="mb-1">
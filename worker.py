@@ -0,0 +1,29 @@
+import signal
+import asyncio
+
+from Back.core.jobs import run_worker
+from Back.core.redis_client import get_redis_client
+
+# Modules with @job handlers, imported so they register
+import Back.services.stored_images # noqa: F401
+
+
+async def run():
+  stop = asyncio.Event()
+  loop = asyncio.get_running_loop()
+  for sig in (signal.SIGINT, signal.SIGTERM):
+    loop.add_signal_handler(sig, stop.set) # finishes the current batch, then exits
+
+  client = get_redis_client()
+  try:
+    await run_worker(client, stop=stop)
+  finally:
+    await client.aclose()
+
+
+def main():
+  asyncio.run(run())
+
+
+if __name__ == "__main__":
+  main()